@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
-from app.models.alert import Alert, AlertRule, AlertHistory
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Dict, Optional
+from app.models.alert import Alert, AlertRule, AlertHistory, AlertLevel
 from app.services.alert_service import AlertService
 from app.services.notification_service import NotificationService
 from app.api.auth import get_current_user
@@ -16,9 +16,24 @@ async def get_alert_rules(current_user: User = Depends(get_current_user)):
     return alert_service.default_rules
 
 @router.get("/history", response_model=AlertHistory)
-async def get_alert_history(current_user: User = Depends(get_current_user)):
-    """获取预警历史"""
-    return await alert_service.get_alert_history(current_user.id)
+async def get_alert_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    status: Optional[str] = None,
+    level: Optional[AlertLevel] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """获取预警历史（游标分页）"""
+    try:
+        return await alert_service.get_alert_history(
+            current_user.id,
+            cursor=cursor,
+            limit=limit,
+            status=status,
+            level=level
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/resolve/{alert_id}", response_model=Alert)
 async def resolve_alert(
@@ -52,10 +67,10 @@ async def dismiss_alert(
 async def get_alert_summary(current_user: User = Depends(get_current_user)):
     """获取预警汇总报告"""
     try:
-        alert_history = await alert_service.get_alert_history(current_user.id)
+        alert_stats = await alert_service.get_alert_stats(current_user.id)
         success = await notification_service.send_alert_summary(
             current_user.id,
-            alert_history.dict()
+            alert_stats
         )
         if not success:
             raise HTTPException(status_code=500, detail="生成汇总报告失败")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
 from app.models.social_emotion import (
     SocialEmotionRecord, SocialEmotionAnalysis,
@@ -58,4 +58,17 @@ async def get_social_emotion_insights(
     """
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权查看其他用户的洞察")
-    return await social_emotion_service.get_social_emotion_insights(user_id) 
\ No newline at end of file
+    return await social_emotion_service.get_social_emotion_insights(user_id)
+
+@router.get("/relationships/{user_id}")
+async def get_relationships(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取与各联系人的关系质量、互惠度和度数
+    """
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权查看其他用户的关系")
+    return await social_emotion_service.get_relationships(user_id, limit)
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Dict, Optional
+from datetime import date, datetime, timedelta
 from app.models.user_behavior import (
     UserBehavior, BehaviorPattern, BehaviorInsight,
-    UserBehaviorProfile
+    UserBehaviorProfile, BehaviorType, FunnelQuery
 )
 from app.services.user_behavior_service import UserBehaviorService
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_current_active_admin
+from app.core.config import settings
+from app.core.serialization import model_response
 from app.models.user import User
 
 router = APIRouter()
@@ -24,7 +27,7 @@ async def record_behavior(
         behavior.user_id = current_user.id
         
         profile = await behavior_service.record_behavior(behavior)
-        return profile
+        return model_response(profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -54,6 +57,86 @@ async def get_behavior_patterns(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sessions/stats")
+async def get_session_stats(
+    days: int = Query(30, ge=1, le=365),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    获取最近days天的会话统计（每天会话数、会话时长中位数等）
+    """
+    try:
+        return await behavior_service.get_session_stats(current_user.id, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics/active-users")
+async def get_active_user_counts(
+    day: Optional[date] = Query(None, description="统计日期，默认为今天（UTC）"),
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    统计日活、周活、月活用户数（仅管理员）
+    """
+    try:
+        return await behavior_service.get_active_user_counts(day)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/metrics/population")
+async def get_population_report(
+    start: datetime = Query(..., description="起始时间（UTC，按小时对齐）"),
+    end: datetime = Query(..., description="结束时间（UTC，不含）"),
+    top_k: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    全体用户的近似行为统计（仅管理员）
+    """
+    if end <= start:
+        raise HTTPException(status_code=400, detail="结束时间必须晚于开始时间")
+    if end - start > timedelta(days=settings.BEHAVIOR_QUERY_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"查询区间不能超过{settings.BEHAVIOR_QUERY_MAX_DAYS}天")
+    
+    try:
+        return await behavior_service.get_population_report(start, end, top_k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/funnel")
+async def analyze_funnel(
+    query: FunnelQuery,
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    全体用户的漏斗分析（仅管理员）
+    """
+    if not 2 <= len(query.steps) <= 10:
+        raise HTTPException(status_code=400, detail="漏斗步骤数需在2到10之间")
+    if query.end <= query.start:
+        raise HTTPException(status_code=400, detail="结束时间必须晚于开始时间")
+    if query.end - query.start > timedelta(days=settings.BEHAVIOR_QUERY_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"查询区间不能超过{settings.BEHAVIOR_QUERY_MAX_DAYS}天")
+    
+    try:
+        return await behavior_service.analyze_funnel(query)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/predict-next")
+async def predict_next_behavior(
+    current: Optional[BehaviorType] = Query(None, description="当前行为，为空时使用最后一条记录的行为"),
+    top_k: int = Query(3, ge=1, le=13),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    根据行为转移模型预测下一个行为
+    """
+    try:
+        return await behavior_service.predict_next_behavior(current_user.id, current, top_k)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/profile", response_model=UserBehaviorProfile)
 async def get_behavior_profile(
     current_user: User = Depends(get_current_user)
@@ -63,6 +146,6 @@ async def get_behavior_profile(
     """
     try:
         profile = await behavior_service._get_user_behavior_profile(current_user.id)
-        return profile
+        return model_response(profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Dict, Optional
 from app.models.user_profile import (
     UserEmotionRecord, UserProfile, EmotionPrediction,
-    PersonalizedRecommendation
+    PersonalizedRecommendation, BatchEmotionPredictionRequest
 )
 from app.services.user_profile_service import UserProfileService
 from app.services.social_emotion_service import SocialEmotionService
 from app.services.alert_service import AlertService
 from app.services.user_behavior_service import UserBehaviorService
+from app.services.comprehensive_profile_service import ComprehensiveProfileService
+from app.services.emotion_predictor import ModelUnavailableError, emotion_predictor
+from app.services.feature_store import feature_store
+from app.services.profile_snapshots import snapshot_store
 from app.core.auth import get_current_user
+from app.api.auth import get_current_active_admin
+from app.core.config import settings
+from app.core.serialization import model_response
 from app.models.user import User
 
 router = APIRouter()
@@ -16,10 +23,18 @@ user_profile_service = UserProfileService()
 social_emotion_service = SocialEmotionService()
 alert_service = AlertService()
 user_behavior_service = UserBehaviorService()
+comprehensive_profile_service = ComprehensiveProfileService(
+    user_profile_service,
+    social_emotion_service,
+    alert_service,
+    user_behavior_service
+)
+snapshot_store.set_builder(comprehensive_profile_service.get_comprehensive_profile)
 
 @router.post("/emotion-record", response_model=UserProfile)
 async def record_emotion(
     emotion_record: UserEmotionRecord,
+    sync: Optional[bool] = Query(None, description="是否同步重算派生数据后再返回（默认在后台合并重算）"),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -28,22 +43,27 @@ async def record_emotion(
     try:
         profile = await user_profile_service.update_user_profile(
             current_user.id,
-            emotion_record
+            emotion_record,
+            sync=sync
         )
-        return profile
+        return model_response(profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/profile", response_model=UserProfile)
 async def get_user_profile(
+    refresh: bool = Query(False, description="存在待更新的派生数据时先同步重算"),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取用户画像
     """
     try:
-        profile = await user_profile_service._get_user_profile(current_user.id)
-        return profile
+        if refresh:
+            profile = await user_profile_service.refresh_user_profile(current_user.id)
+        else:
+            profile = await user_profile_service._get_user_profile(current_user.id)
+        return model_response(profile)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -61,6 +81,46 @@ async def predict_emotion(
             context
         )
         return prediction
+    except ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/predict-emotion/batch", response_model=Dict[str, EmotionPrediction])
+async def predict_emotions(
+    request: BatchEmotionPredictionRequest,
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    批量预测多个用户当前情绪（一次模型调用完成打分，仅管理员；没有画像的用户不在结果中）
+    """
+    if len(request.user_ids) > settings.EMOTION_PREDICTION_MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多预测 {settings.EMOTION_PREDICTION_MAX_BATCH} 个用户"
+        )
+    try:
+        return await user_profile_service.predict_emotions(
+            request.user_ids,
+            request.context
+        )
+    except ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/predict-emotion/all", response_model=Dict[str, EmotionPrediction])
+async def predict_all_emotions(
+    context: Dict,
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    为特征库中的全部用户预测情绪（整表特征一次读出、一次打分，仅管理员）
+    """
+    try:
+        return await user_profile_service.predict_all_emotions(context)
+    except ModelUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -94,103 +154,54 @@ async def get_emotional_stability(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/metrics/update-queue")
+async def get_update_queue_metrics(
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    获取画像更新分片队列指标（各分片队列深度、处理数量）和后台重算的合并统计（仅管理员）
+    """
+    return user_profile_service.get_update_metrics()
+
+@router.get("/metrics/snapshots")
+async def get_snapshot_metrics(
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    获取综合画像快照的新鲜度指标（待重建用户数、数据变化到快照更新的延迟分布，仅管理员）
+    """
+    return snapshot_store.get_metrics()
+
+@router.get("/metrics/prediction")
+async def get_prediction_metrics(
+    current_user: User = Depends(get_current_active_admin)
+):
+    """
+    获取情绪预测模型信息（是否加载、版本、训练元数据）和特征库指标（缓存用户数、读写次数，仅管理员）
+    """
+    return {
+        "model": emotion_predictor.get_info(),
+        "features": feature_store.get_metrics()
+    }
+
 @router.get("/comprehensive/{user_id}")
 async def get_comprehensive_user_profile(
     user_id: str,
+    fresh: bool = Query(False, description="为true时跳过快照，立即重建后返回"),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取综合用户画像，包含所有功能的数据整合
+
+    默认读取物化快照（数据变化后在后台重建），snapshot字段给出版本、刷新时间和是否有待重建的变化
     """
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权查看其他用户的画像")
-        
-    # 获取基础用户画像
-    profile = await user_profile_service._get_user_profile(user_id)
-    
-    # 获取社交情绪数据
-    social_emotion_analysis = await social_emotion_service.analyze_social_emotion(user_id)
-    social_emotion_insights = await social_emotion_service.get_social_emotion_insights(user_id)
-    
-    # 获取风险预警数据
-    alerts = await alert_service.get_user_alerts(user_id)
-    risk_level = await alert_service.calculate_user_risk_level(user_id)
-    
-    # 获取行为分析数据
-    behavior_insights = await user_behavior_service.get_behavior_insights(user_id)
-    behavior_patterns = await user_behavior_service.get_behavior_patterns(user_id)
     
-    # 整合到用户画像
-    profile.social_profile = {
-        "social_emotion_score": social_emotion_analysis.social_emotion_score,
-        "social_engagement": social_emotion_analysis.social_engagement,
-        "social_network_size": social_emotion_analysis.social_network_size,
-        "interaction_patterns": social_emotion_analysis.interaction_patterns,
-        "emotional_contagion": social_emotion_analysis.emotional_contagion,
-        "social_support": social_emotion_insights.social_support,
-        "social_stress": social_emotion_insights.social_stress,
-        "relationship_quality": social_emotion_insights.relationship_quality
-    }
-    
-    profile.risk_profile = {
-        "alert_level": risk_level,
-        "active_alerts": len([a for a in alerts if a.status == "active"]),
-        "risk_factors": [
-            {
-                "type": alert.rule_id,
-                "level": alert.level,
-                "description": alert.message
-            }
-            for alert in alerts if alert.status == "active"
-        ],
-        "protective_factors": [
-            {
-                "type": "strong_social_support" if profile.social_profile["social_support"] > 0.7 else "moderate_social_support",
-                "level": "high" if profile.social_profile["social_support"] > 0.7 else "medium",
-                "description": "有良好的社交支持网络" if profile.social_profile["social_support"] > 0.7 else "有一定的社交支持网络"
-            }
-        ]
-    }
-    
-    profile.behavior_profile = {
-        "active_hours": behavior_patterns.active_hours,
-        "preferred_activities": behavior_patterns.preferred_activities,
-        "interaction_patterns": behavior_patterns.interaction_patterns
-    }
-    
-    # 生成推荐
-    context = {
-        "social_score": profile.social_profile["social_emotion_score"],
-        "risk_level": profile.risk_profile["alert_level"],
-        "active_hours": profile.behavior_profile["active_hours"]
-    }
-    recommendations = await user_profile_service.generate_recommendations(user_id, context)
-    
-    # 构建完整响应
-    response = {
-        "user_id": profile.user_id,
-        "basic_info": {
-            "age": 28,  # 假设数据
-            "gender": "male",  # 假设数据
-            "occupation": "软件工程师",  # 假设数据
-            "location": "北京"  # 假设数据
-        },
-        "emotional_profile": {
-            "current_emotion": profile.current_emotion.emotion_type if profile.current_emotion else "neutral",
-            "emotion_stability": profile.emotional_stability,
-            "dominant_emotions": profile.emotion_pattern.triggers,
-            "emotion_trend": profile.emotion_pattern.daily_pattern
-        },
-        "social_profile": profile.social_profile,
-        "behavior_profile": profile.behavior_profile,
-        "risk_profile": profile.risk_profile,
-        "recommendations": {
-            "emotional_health": [r.content for r in recommendations if r.type == "emotional"],
-            "social_health": [r.content for r in recommendations if r.type == "social"],
-            "behavior_improvement": [r.content for r in recommendations if r.type == "behavior"],
-            "risk_prevention": [r.content for r in recommendations if r.type == "risk"]
-        },
-        "last_updated": profile.last_updated
-    }
-    
-    return response 
\ No newline at end of file
+    try:
+        if fresh:
+            return await snapshot_store.refresh(user_id)
+        # 快照由各部分并发获取、单独限时构建，慢的部分在sections中标记为timeout
+        return await snapshot_store.get(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
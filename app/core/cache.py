@@ -0,0 +1,168 @@
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import time
+
+
+class LRUTTLCache:
+    """进程内LRU缓存，每个条目带过期时间"""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        # 标记为最近使用
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+
+        # 超出容量时淘汰最久未使用的条目
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class LocalSharedCache:
+    """
+    共享缓存层的本地实现
+
+    接口与Redis等外部缓存保持一致（异步、按TTL过期、只存可序列化数据），
+    用于测试和单实例部署
+    """
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: Any, ttl_seconds: float):
+        self._data[key] = (time.monotonic() + ttl_seconds, value)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+
+class ReadThroughCache:
+    """
+    读穿透缓存
+
+    先查进程内缓存，再查共享缓存，最后调用加载函数；
+    同一个key的并发未命中只会触发一次加载（single-flight）。
+    """
+
+    def __init__(self, local: LRUTTLCache, shared: Optional[LocalSharedCache] = None,
+                 serialize: Optional[Callable[[Any], Any]] = None,
+                 deserialize: Optional[Callable[[Any], Any]] = None):
+        self.local = local
+        self.shared = shared
+        self.serialize = serialize or (lambda value: value)
+        self.deserialize = deserialize or (lambda value: value)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 加载进行中的key每次失效都会递增版本号，防止失效前发起的加载把旧数据写回缓存；
+        # 加载结束即移除，大小不超过进行中的加载数
+        self._versions: Dict[str, int] = {}
+        self.stats = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "loads": 0,
+            "invalidations": 0
+        }
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value
+
+        # 已有相同key的加载在进行中，直接等待其结果
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        version = self._versions.get(key, 0)
+
+        try:
+            value = await self._load(key, loader)
+            if self._versions.get(key, 0) == version:
+                self.local.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现"Future exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self._versions.pop(key, None)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        if self.shared is not None:
+            cached = await self.shared.get(key)
+            if cached is not None:
+                self.stats["shared_hits"] += 1
+                return self.deserialize(cached)
+
+        self.stats["loads"] += 1
+        value = await loader()
+
+        if self.shared is not None and value is not None:
+            await self.shared.set(key, self.serialize(value), self.local.ttl_seconds)
+        return value
+
+    async def invalidate(self, key: str):
+        if key in self._inflight:
+            self._versions[key] = self._versions.get(key, 0) + 1
+        self.stats["invalidations"] += 1
+        self.local.delete(key)
+        if self.shared is not None:
+            await self.shared.delete(key)
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "size": len(self.local),
+            "inflight": len(self._inflight),
+            "timestamp": datetime.utcnow().isoformat()
+        }
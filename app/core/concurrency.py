@@ -0,0 +1,333 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import multiprocessing
+import os
+import time
+import zlib
+
+
+class ShardedKeyExecutor:
+    """
+    按key分片的串行执行器
+
+    key通过稳定哈希映射到固定分片，每个分片由一个worker按提交顺序依次执行任务，
+    因此同一key的任务严格有序，不同分片之间的任务并发执行。
+    """
+
+    def __init__(self, num_shards: int = 16, name: str = "executor"):
+        self.num_shards = num_shards
+        self.name = name
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._metrics = [self._empty_metrics() for _ in range(num_shards)]
+
+    def _empty_metrics(self) -> Dict:
+        return {
+            "processed": 0,
+            "failed": 0,
+            "max_queue_depth": 0,
+            "last_processed_at": None
+        }
+
+    def shard_for(self, key: str) -> int:
+        """计算key所属分片（跨进程稳定，不受PYTHONHASHSEED影响）"""
+        return zlib.crc32(key.encode("utf-8")) % self.num_shards
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+
+        # 首次提交或事件循环变化时启动worker
+        self._loop = loop
+        self._queues = [asyncio.Queue() for _ in range(self.num_shards)]
+        self._workers = [
+            loop.create_task(self._run_shard(shard_id))
+            for shard_id in range(self.num_shards)
+        ]
+
+    async def submit(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """提交任务并等待其结果"""
+        self._ensure_started()
+
+        shard_id = self.shard_for(key)
+        queue = self._queues[shard_id]
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((func, future))
+
+        metrics = self._metrics[shard_id]
+        metrics["max_queue_depth"] = max(metrics["max_queue_depth"], queue.qsize())
+
+        return await future
+
+    async def _run_shard(self, shard_id: int):
+        queue = self._queues[shard_id]
+        metrics = self._metrics[shard_id]
+
+        while True:
+            func, future = await queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                try:
+                    result = await func()
+                except Exception as e:
+                    metrics["failed"] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                metrics["processed"] += 1
+                metrics["last_processed_at"] = datetime.utcnow()
+            finally:
+                queue.task_done()
+
+    def get_metrics(self) -> Dict:
+        """获取各分片的队列深度和处理统计"""
+        shards = []
+        for shard_id in range(self.num_shards):
+            queue_depth = self._queues[shard_id].qsize() if self._queues else 0
+            shards.append({
+                "shard_id": shard_id,
+                "queue_depth": queue_depth,
+                **self._metrics[shard_id]
+            })
+
+        return {
+            "name": self.name,
+            "num_shards": self.num_shards,
+            "total_queue_depth": sum(shard["queue_depth"] for shard in shards),
+            "shards": shards
+        }
+
+
+class KeyedDebouncer:
+    """
+    按key合并的延迟任务
+
+    同一key在延迟窗口内多次调度只执行一次回调，窗口从第一次调度开始计算，
+    因此任务最多延迟delay秒，不会因持续调度而无限推迟。
+    """
+
+    def __init__(self, delay_seconds: float, name: str = "debouncer"):
+        self.delay_seconds = delay_seconds
+        self.name = name
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._metrics = {
+            "scheduled": 0,
+            "coalesced": 0,
+            "fired": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "last_fired_at": None
+        }
+
+    def schedule(self, key: str, callback: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        调度key的回调；key已有待执行的任务时直接合并
+
+        返回是否新建了任务
+        """
+        if key in self._pending:
+            self._metrics["coalesced"] += 1
+            return False
+
+        self._metrics["scheduled"] += 1
+        self._pending[key] = asyncio.get_running_loop().create_task(self._fire(key, callback))
+        return True
+
+    def cancel(self, key: str) -> bool:
+        """取消key尚未执行的任务（例如调用方已同步完成了同样的工作）"""
+        task = self._pending.pop(key, None)
+        if task is None:
+            return False
+        task.cancel()
+        self._metrics["cancelled"] += 1
+        return True
+
+    def is_pending(self, key: str) -> bool:
+        return key in self._pending
+
+    async def _fire(self, key: str, callback: Callable[[], Awaitable[Any]]):
+        await asyncio.sleep(self.delay_seconds)
+        # 先移出等待表，回调执行期间的新调度会开启下一个窗口
+        if self._pending.get(key) is asyncio.current_task():
+            del self._pending[key]
+
+        try:
+            await callback()
+        except Exception as e:
+            self._metrics["failed"] += 1
+            print(f"{self.name} 延迟任务执行失败 ({key}): {str(e)}")
+        else:
+            self._metrics["fired"] += 1
+        self._metrics["last_fired_at"] = datetime.utcnow()
+
+    def get_metrics(self) -> Dict:
+        """获取待执行任务数和合并统计"""
+        return {
+            "name": self.name,
+            "delay_seconds": self.delay_seconds,
+            "pending": len(self._pending),
+            **self._metrics
+        }
+
+
+async def gather_sections(sections: Dict[str, Awaitable[Any]],
+                          timeout_seconds: float) -> Tuple[Dict[str, Any], Dict[str, Dict]]:
+    """
+    并发执行多个相互独立的部分，每个部分单独限时
+
+    返回(结果, 状态)：超时或出错的部分不在结果中，状态里记录
+    status（ok/timeout/error）、耗时和错误信息，调用方据此返回部分结果
+    """
+    async def run(name: str, awaitable: Awaitable[Any]):
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(awaitable, timeout=timeout_seconds)
+            status = {"status": "ok"}
+        except asyncio.TimeoutError:
+            result = None
+            status = {"status": "timeout", "error": f"超过{timeout_seconds}秒未完成"}
+        except Exception as e:
+            result = None
+            status = {"status": "error", "error": str(e)}
+        status["elapsed_ms"] = round((time.monotonic() - started) * 1000, 1)
+        return name, result, status
+
+    results: Dict[str, Any] = {}
+    statuses: Dict[str, Dict] = {}
+    for name, result, status in await asyncio.gather(
+        *(run(name, awaitable) for name, awaitable in sections.items())
+    ):
+        statuses[name] = status
+        if status["status"] == "ok":
+            results[name] = result
+    return results, statuses
+
+
+class CpuExecutor:
+    """
+    CPU密集任务的进程池执行器
+
+    任务函数和参数需可pickle（模块级函数、numpy数组、pydantic模型等），在子进程中执行，
+    不占用事件循环，也不受GIL限制；同时执行的任务数受max_concurrent限制，超出的任务排队等待。
+    调用方超时取消等待时，子进程中的任务仍会执行完，执行完才释放名额。
+    """
+
+    def __init__(self, max_workers: int = 0, max_concurrent: int = 4, name: str = "cpu"):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent
+        self.name = name
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "waiting": 0,
+            "running": 0,
+            "max_waiting": 0
+        }
+        # 任务名 -> 次数、耗时统计
+        self._task_metrics: Dict[str, Dict] = {}
+
+    def _ensure_started(self):
+        if self._pool is None:
+            # 使用spawn启动子进程，避免在持有数据库连接线程的进程中fork
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+    async def run(self, func: Callable[..., Any], *args, task_name: Optional[str] = None) -> Any:
+        """在进程池中执行func(*args)并等待结果"""
+        self._ensure_started()
+        name = task_name or func.__name__
+        stats = self._task_metrics.setdefault(name, {
+            "count": 0,
+            "failed": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "total_wait_seconds": 0.0
+        })
+
+        self._metrics["submitted"] += 1
+        self._metrics["waiting"] += 1
+        self._metrics["max_waiting"] = max(self._metrics["max_waiting"], self._metrics["waiting"])
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._metrics["waiting"] -= 1
+
+        started = time.perf_counter()
+        stats["total_wait_seconds"] += started - queued_at
+        self._metrics["running"] += 1
+        try:
+            future = self._loop.run_in_executor(self._pool, func, *args)
+        except Exception as e:
+            self._metrics["running"] -= 1
+            self._semaphore.release()
+            self._discard_broken_pool(e)
+            raise
+
+        def finished(done: asyncio.Future):
+            elapsed = time.perf_counter() - started
+            self._metrics["running"] -= 1
+            self._semaphore.release()
+            stats["count"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+            if done.cancelled() or done.exception() is not None:
+                self._metrics["failed"] += 1
+                stats["failed"] += 1
+                if not done.cancelled():
+                    self._discard_broken_pool(done.exception())
+            else:
+                self._metrics["completed"] += 1
+
+        future.add_done_callback(finished)
+        # shield：调用方被取消时不取消进程中的任务，名额在任务真正结束时释放
+        return await asyncio.shield(future)
+
+    def _discard_broken_pool(self, error: BaseException):
+        # 子进程异常退出后进程池不可再用，下次提交时重新创建
+        if isinstance(error, BrokenProcessPool) and self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._metrics["pool_restarts"] = self._metrics.get("pool_restarts", 0) + 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_metrics(self) -> Dict:
+        """获取排队/执行中的任务数和各任务的耗时统计"""
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "max_concurrent": self.max_concurrent,
+            **self._metrics,
+            "tasks": {
+                name: {
+                    "count": stats["count"],
+                    "failed": stats["failed"],
+                    "avg_seconds": round(stats["total_seconds"] / stats["count"], 4) if stats["count"] else None,
+                    "max_seconds": round(stats["max_seconds"], 4),
+                    "avg_wait_seconds": round(stats["total_wait_seconds"] / stats["count"], 4) if stats["count"] else None
+                }
+                for name, stats in self._task_metrics.items()
+            }
+        }
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # 基础配置
@@ -15,6 +15,56 @@ class Settings(BaseSettings):
     MODEL_NAME: str = "bert-base-chinese"
     MAX_LENGTH: int = 512
     
+    # 情绪预测模型配置（由 python -m app.jobs.train_emotion_model 训练生成）
+    EMOTION_MODEL_DIR: str = "models/emotion_predictor"
+    EMOTION_MODEL_VERSION: Optional[str] = None  # 为空时加载LATEST指向的版本
+    EMOTION_PREDICTION_MAX_BATCH: int = 500  # 批量预测单次最多用户数
+    FEATURE_STORE_CACHE_SIZE: int = 100000  # 进程内缓存的用户特征向量数
+    FEATURE_STORE_CACHE_TTL_SECONDS: float = 300.0
+    
+    # 用户画像缓存配置
+    PROFILE_CACHE_ENABLED: bool = True
+    PROFILE_CACHE_MAX_SIZE: int = 1024
+    PROFILE_CACHE_TTL_SECONDS: float = 60.0
+    PROFILE_CACHE_SHARED_ENABLED: bool = False  # 是否启用共享缓存层
+    PROFILE_INVALIDATION_POLL_SECONDS: float = 5.0  # 轮询离线任务发布的画像缓存失效通知的间隔
+    
+    # 触发因素分析配置
+    TRIGGER_DICTIONARY_PATH: Optional[str] = None  # 自定义分词词典（每行一个词）
+    TRIGGER_INDEX_MAX_TERMS: int = 500  # 每个用户触发因素索引保留的词数（按出现次数保留最高的）
+    
+    # 画像关键词扩展（JSON格式：{"类别": ["关键词", ...]}；修改后各用户的关键词索引在下次更新时重建）
+    EXTRA_ACTIVITY_KEYWORDS: Dict[str, List[str]] = {}
+    EXTRA_COPING_KEYWORDS: Dict[str, List[str]] = {}
+    
+    # 用户画像更新配置
+    PROFILE_UPDATE_SHARDS: int = 16  # 按用户分片的更新队列数量
+    PROFILE_RECOMPUTE_DEBOUNCE_SECONDS: float = 2.0  # 派生数据后台重算的合并窗口
+    PROFILE_RECOMPUTE_SYNC: bool = False  # 为True时每条记录写入后同步重算派生数据
+    COMPREHENSIVE_SECTION_TIMEOUT_SECONDS: float = 2.0  # 综合画像中每个部分的超时时间
+    COMPREHENSIVE_SNAPSHOT_DEBOUNCE_SECONDS: float = 5.0  # 数据变化后合并重建综合画像快照的窗口
+    COMPREHENSIVE_SNAPSHOT_FRESHNESS_SLA_SECONDS: float = 30.0  # 快照新鲜度目标（数据变化到快照更新）
+    
+    # CPU密集任务配置
+    CPU_EXECUTOR_WORKERS: int = 0  # CPU密集分析任务的进程数（0表示CPU核数）
+    CPU_EXECUTOR_MAX_CONCURRENT_TASKS: int = 4  # 同时执行的CPU密集任务上限，超出的排队
+    
+    # 用户行为分析配置
+    BEHAVIOR_SESSION_GAP_MINUTES: float = 30.0  # 超过该不活跃间隔即开启新会话
+    BEHAVIOR_COOCCURRENCE_WINDOW_MINUTES: float = 30.0  # 行为交互图中视为共现的时间窗口
+    BEHAVIOR_CLUSTER_FIT_WINDOW: int = 1000  # 没有聚类模型时，首次完整聚类使用的最近行为数
+    BEHAVIOR_TRANSITION_HALF_LIFE_HOURS: Optional[float] = None  # 行为转移计数的衰减半衰期（为空时不衰减）
+    BEHAVIOR_HISTORY_MAX_EVENTS: int = 1000  # 行为画像中保留的最近行为数
+    BEHAVIOR_HISTORY_MAX_AGE_DAYS: int = 30  # 行为画像中保留的最长天数
+    BEHAVIOR_ARCHIVE_BATCH_SIZE: int = 100  # 超出保留范围的行为攒够该数量后一次移入归档
+    BEHAVIOR_SKETCH_FLUSH_SECONDS: float = 10.0  # 全体行为草图写入数据库的合并窗口
+    BEHAVIOR_SKETCH_RETAIN_HOURS: int = 2  # 内存中保留的最近小时草图数，更早的写入后即释放
+    BEHAVIOR_QUERY_MAX_DAYS: int = 31  # 全体行为统计和漏斗分析单次查询的最长区间（天）
+    
+    # 社交关系图配置
+    SOCIAL_GRAPH_REFRESH_SECONDS: float = 5.0  # 关系图读取新互动记录的最短间隔
+    SOCIAL_GRAPH_HALF_LIFE_DAYS: float = 30.0  # 互动权重随时间衰减的半衰期
+    
     # JWT配置
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
@@ -0,0 +1,29 @@
+from typing import Any
+import orjson
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
+
+
+class NumpyORJSONResponse(ORJSONResponse):
+    """
+    应用的默认响应类：用orjson序列化，numpy标量和数组直接输出
+
+    各服务返回的统计值应在生成处转换为Python类型，这里只是兜底，避免个别遗漏的numpy值导致500
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> Response:
+    """
+    直接用pydantic-core把模型序列化为JSON响应
+
+    返回Response时FastAPI不会再按response_model重新校验和编码，
+    适用于画像等体积较大的响应。
+    """
+    return Response(
+        content=model.model_dump_json(),
+        status_code=status_code,
+        media_type="application/json"
+    )
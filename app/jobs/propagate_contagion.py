@@ -0,0 +1,114 @@
+"""
+在社交互动图上计算情绪传染
+
+读取全部社交互动记录，构建与线上相同的加权互动图（SocialGraphIndex），每个用户取最近
+--signal-days天自身互动的平均情绪（情绪权重 × 强度，-1到1）作为情绪信号，用向量化的
+稀疏矩阵-向量乘法迭代传播，得到每个用户的：
+- 暴露度（exposure）：周围用户的情绪经传播后与自身情绪的加权结果，-1到1；
+- 影响力（influence）：该用户的情绪在所有用户暴露度中所占的总份额，全体平均为1。
+
+结果按批写入social_contagion集合，社交情绪洞察接口读取；同时把这些用户已有的综合画像快照
+标记为待重建，读取时在后台重建。建议定期（如每天）在低峰期运行。
+
+用法：
+    python -m app.jobs.propagate_contagion [--damping 0.85] [--signal-days 30]
+"""
+from datetime import datetime, timedelta
+from typing import Dict
+import argparse
+import asyncio
+import time
+import numpy as np
+from app.core.config import settings
+from app.services.emotion_contagion import DEFAULT_DAMPING, propagate
+from app.services.profile_snapshots import snapshot_store
+from app.services.social_emotion_service import SocialEmotionService
+from app.services.social_graph import SocialGraphIndex
+
+
+async def load_signals(db, emotion_weights: Dict[str, float], since: datetime) -> Dict[str, float]:
+    """每个用户自since以来互动的平均情绪（由数据库按用户聚合）"""
+    cursor = db.social_emotion_records.aggregate([
+        {"$match": {"timestamp": {"$gte": since}}},
+        {"$group": {
+            "_id": "$user_id",
+            "signal": {"$avg": {"$multiply": [
+                {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$emotion_type", emotion]}, "then": weight}
+                        for emotion, weight in emotion_weights.items()
+                    ],
+                    "default": 0.0
+                }},
+                "$intensity"
+            ]}}
+        }}
+    ])
+    return {document["_id"]: document["signal"] async for document in cursor}
+
+
+async def run(damping: float, signal_days: int, batch_size: int) -> Dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import UpdateOne
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.MONGODB_DB_NAME]
+    service = SocialEmotionService()
+    stats: Dict = {}
+
+    started = time.perf_counter()
+    graph = SocialGraphIndex()
+    await graph.ensure_fresh(service.interaction_weights)
+    now = datetime.now()
+    users, indptr, indices, weights = graph.csr((now - datetime(1970, 1, 1)).total_seconds())
+    signals = await load_signals(db, service.emotion_weights, now - timedelta(days=signal_days))
+    signal = np.array([signals.get(user_id) or 0.0 for user_id in users], dtype=np.float64)
+    stats["users"] = len(users)
+    stats["edges"] = int(len(indices))
+    stats["load_seconds"] = time.perf_counter() - started
+    print(f"已读取互动图：{stats['users']} 个用户，{stats['edges']} 条边，用时 {stats['load_seconds']:.1f} 秒")
+
+    started = time.perf_counter()
+    exposure, influence, iterations = propagate(indptr, indices, weights, signal, damping)
+    stats["iterations"] = iterations
+    stats["compute_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    computed_at = datetime.utcnow()
+    for offset in range(0, len(users), batch_size):
+        batch_users = users[offset:offset + batch_size]
+        await db.social_contagion.bulk_write([
+            UpdateOne(
+                {"user_id": users[i]},
+                {"$set": {
+                    "signal": float(signal[i]),
+                    "exposure": float(exposure[i]),
+                    "influence": float(influence[i]),
+                    "computed_at": computed_at
+                }},
+                upsert=True
+            )
+            for i in range(offset, min(offset + batch_size, len(users)))
+        ], ordered=False)
+        await snapshot_store.mark_stored_stale(batch_users)
+    stats["write_seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在社交互动图上计算情绪传染（暴露度和影响力）")
+    parser.add_argument("--damping", type=float, default=DEFAULT_DAMPING, help="传播系数（0-1）")
+    parser.add_argument("--signal-days", type=int, default=30, help="情绪信号使用的最近天数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批写入的用户数")
+    args = parser.parse_args()
+    if not 0 <= args.damping < 1:
+        parser.error("--damping 需在[0, 1)之间")
+
+    stats = asyncio.run(run(args.damping, args.signal_days, args.batch_size))
+    print(f"完成：{stats['users']} 个用户，{stats['edges']} 条边，迭代 {stats['iterations']} 次")
+    print(f"读取 {stats['load_seconds']:.1f} 秒，计算 {stats['compute_seconds']:.1f} 秒，"
+          f"写回 {stats['write_seconds']:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+批量重算全部用户画像的派生数据
+
+分析逻辑变更后，从数据库中的原始情绪历史重新计算情绪模式、性格特征、兴趣偏好和情绪稳定性。
+按user_id顺序分批读取用户，用进程池在多个CPU核上并行计算（与线上相同的
+UserProfileService分析函数，累加状态和索引从完整历史重建），再按批bulk_write写回，
+同时更新特征库中的预测特征。
+
+每写完一批就把该批最后一个user_id记入检查点文件，中断后重新运行会从检查点继续；
+写回时只更新派生字段，且只在情绪历史没有变化时写入，任务运行期间新增了记录的用户
+由线上的增量路径继续处理（计入“跳过”）。每批写回后只为实际写入的用户更新预测特征、
+发布画像缓存失效通知（运行中的服务在PROFILE_INVALIDATION_POLL_SECONDS内丢弃这些用户的
+缓存画像和特征），并把他们的综合画像快照标记为待重建。建议在低峰期运行。
+
+用法：
+    python -m app.jobs.recompute_profiles [--workers 8] [--batch-size 200] [--restart]
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from app.core.config import settings
+from app.models.user_profile import UserProfile
+from app.services.cpu_tasks import DERIVED_PROFILE_FIELDS, recompute_profile_sections
+from app.services.emotion_features import stored_feature_vector
+
+DEFAULT_CHECKPOINT = "recompute_profiles.checkpoint.json"
+
+
+def recompute_batch(documents: List[Dict]) -> Tuple[List[Tuple], List[Tuple[str, str]], float]:
+    """
+    在子进程中重算一批用户画像
+
+    返回(结果, 失败, 计算耗时)；结果为(user_id, 情绪记录数, 派生字段, 特征向量)，
+    单个用户出错只记入失败，不影响同批其他用户
+    """
+    started = time.perf_counter()
+    results = []
+    failures = []
+    for document in documents:
+        user_id = document.get("user_id")
+        try:
+            profile = UserProfile.model_validate(document)
+            # 丢弃旧的累加状态和索引，从完整情绪历史重新计算
+            profile.accumulators = None
+            profile.trigger_index = None
+            profile.keyword_index = None
+            recompute_profile_sections(profile)
+
+            # 只写回派生字段；情绪历史、当前情绪等原始数据不写
+            data = profile.dict(by_alias=True)
+            results.append((
+                user_id,
+                len(profile.emotion_history),
+                {field: data[field] for field in DERIVED_PROFILE_FIELDS},
+                stored_feature_vector(profile)
+            ))
+        except Exception as e:
+            failures.append((user_id, str(e)))
+    return results, failures, time.perf_counter() - started
+
+
+def load_checkpoint(path: str) -> Optional[str]:
+    """读取检查点中最后完成的user_id"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f).get("last_user_id")
+
+
+def save_checkpoint(path: str, last_user_id: str, stats: Dict):
+    # 先写临时文件再替换，中断时不会留下写了一半的检查点
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "last_user_id": last_user_id,
+            "updated_at": datetime.utcnow().isoformat(),
+            "stats": stats
+        }, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def write_results(db, results: List[Tuple]) -> int:
+    """按批写回派生字段和预测特征，返回实际写入的用户数"""
+    from pymongo import UpdateOne
+    from app.services.feature_store import feature_store
+    from app.services.profile_invalidations import profile_invalidations
+    from app.services.profile_snapshots import snapshot_store
+
+    if not results:
+        return 0
+
+    operations = [
+        # 情绪历史长度不变才写入，避免覆盖任务运行期间到达的新记录对应的派生数据
+        UpdateOne(
+            {"user_id": user_id, f"emotion_history.{record_count}": {"$exists": False}},
+            {"$set": fields}
+        )
+        for user_id, record_count, fields, _ in results
+    ]
+    await db.user_profiles.bulk_write(operations, ordered=False)
+
+    # bulk_write只返回总数，按写回后的情绪历史长度确认哪些用户实际写入；
+    # 写入后又有新记录的用户也视为跳过，其特征和快照由线上路径更新
+    record_counts = {}
+    cursor = db.user_profiles.aggregate([
+        {"$match": {"user_id": {"$in": [user_id for user_id, _, _, _ in results]}}},
+        {"$project": {"_id": 0, "user_id": 1, "records": {"$size": {"$ifNull": ["$emotion_history", []]}}}}
+    ])
+    async for document in cursor:
+        record_counts[document["user_id"]] = document["records"]
+    applied = {
+        user_id: vector
+        for user_id, record_count, _, vector in results
+        if record_counts.get(user_id) == record_count
+    }
+
+    await feature_store.put_many(applied)
+    await profile_invalidations.publish(list(applied))
+    await snapshot_store.mark_stored_stale(list(applied))
+    return len(applied)
+
+
+async def run(workers: int, batch_size: int, checkpoint: str, restart: bool, limit: int) -> Dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.MONGODB_DB_NAME]
+
+    resume_from = None if restart else load_checkpoint(checkpoint)
+    query = {"user_id": {"$gt": resume_from}} if resume_from else {}
+    total = await db.user_profiles.count_documents(query)
+    if limit:
+        total = min(total, limit)
+    if resume_from:
+        print(f"从检查点继续：user_id > {resume_from}")
+    print(f"待处理用户: {total}，进程数: {workers}，批大小: {batch_size}")
+
+    stats = {
+        "users": 0,
+        "records": 0,
+        "written": 0,
+        "skipped": 0,
+        "failed": 0,
+        "read_seconds": 0.0,
+        "compute_seconds": 0.0,
+        "write_seconds": 0.0
+    }
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # 进行中的批次按读取顺序完成和写回，检查点之前的用户都已写入
+    in_flight = deque()
+
+    async def finish_oldest():
+        last_user_id, future = in_flight.popleft()
+        results, failures, compute_seconds = await future
+
+        write_started = time.perf_counter()
+        written = await write_results(db, results)
+        stats["write_seconds"] += time.perf_counter() - write_started
+
+        stats["users"] += len(results) + len(failures)
+        stats["records"] += sum(record_count for _, record_count, _, _ in results)
+        stats["written"] += written
+        stats["skipped"] += len(results) - written
+        stats["failed"] += len(failures)
+        stats["compute_seconds"] += compute_seconds
+        for user_id, error in failures:
+            print(f"用户 {user_id} 重算失败: {error}")
+
+        save_checkpoint(checkpoint, last_user_id, stats)
+        elapsed = time.perf_counter() - started
+        rate = stats["users"] / elapsed if elapsed > 0 else 0.0
+        eta = (total - stats["users"]) / rate if rate > 0 else 0.0
+        print(f"已处理 {stats['users']}/{total} 个用户（{rate:.1f} 用户/秒，"
+              f"失败 {stats['failed']}，跳过 {stats['skipped']}，预计剩余 {eta:.0f} 秒）")
+
+    # spawn启动的子进程不继承父进程的事件循环和数据库连接
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        cursor = db.user_profiles.find(query, {"_id": 0}).sort("user_id", 1).batch_size(batch_size)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        batch: List[Dict] = []
+        read_started = time.perf_counter()
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) < batch_size:
+                continue
+
+            stats["read_seconds"] += time.perf_counter() - read_started
+            in_flight.append((batch[-1]["user_id"], loop.run_in_executor(pool, recompute_batch, batch)))
+            batch = []
+            # 限制进行中的批次数，避免读取远快于计算时占用过多内存
+            while len(in_flight) >= workers * 2:
+                await finish_oldest()
+            read_started = time.perf_counter()
+
+        stats["read_seconds"] += time.perf_counter() - read_started
+        if batch:
+            in_flight.append((batch[-1]["user_id"], loop.run_in_executor(pool, recompute_batch, batch)))
+        while in_flight:
+            await finish_oldest()
+
+    stats["elapsed_seconds"] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量重算全部用户画像的派生数据")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="计算进程数")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批用户数")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="检查点文件")
+    parser.add_argument("--restart", action="store_true", help="忽略检查点，从头开始")
+    parser.add_argument("--limit", type=int, default=0, help="最多处理的用户数（0表示不限）")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args.workers, args.batch_size, args.checkpoint, args.restart, args.limit))
+
+    elapsed = stats["elapsed_seconds"]
+    print(f"完成：{stats['users']} 个用户，{stats['records']} 条情绪记录，用时 {elapsed:.1f} 秒")
+    print(f"写入 {stats['written']}，跳过 {stats['skipped']}（运行期间有新记录），失败 {stats['failed']}")
+    if elapsed > 0:
+        print(f"吞吐：{stats['users'] / elapsed:.1f} 用户/秒，{stats['records'] / elapsed:.1f} 记录/秒")
+    print(f"读取 {stats['read_seconds']:.1f} 秒，计算 {stats['compute_seconds']:.1f} 秒（各进程合计），"
+          f"写回 {stats['write_seconds']:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+离线训练情绪预测模型
+
+从数据库中的用户情绪历史构建特征矩阵，训练标准化器和随机森林分类器，
+保存为带版本号的模型文件（服务启动时加载LATEST指向的版本）。
+
+用法：
+    python -m app.jobs.train_emotion_model [--model-dir models/emotion_predictor] [--min-records 6]
+"""
+from typing import List, Tuple
+import argparse
+import asyncio
+import numpy as np
+from app.core.config import settings
+from app.models.user_profile import UserProfile
+from app.services.emotion_features import FEATURE_NAMES, training_samples
+from app.services.emotion_predictor import save_artifact
+
+
+async def load_training_data(min_records: int, max_users: int = 0) -> Tuple[np.ndarray, np.ndarray, int]:
+    """逐个读取用户画像并生成训练样本，返回(特征矩阵, 标签, 用户数)"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    db = client[settings.MONGODB_DB_NAME]
+
+    features: List[List[float]] = []
+    labels: List[int] = []
+    users = 0
+    cursor = db.user_profiles.find(
+        {f"emotion_history.{min_records - 1}": {"$exists": True}},
+        {"user_id": 1, "emotion_history": 1, "personality": 1}
+    )
+    async for document in cursor:
+        profile = UserProfile.model_validate(document)
+        user_features, user_labels = training_samples(profile)
+        features.extend(user_features)
+        labels.extend(user_labels)
+        users += 1
+        if max_users and users >= max_users:
+            break
+
+    return (
+        np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURE_NAMES)),
+        np.asarray(labels, dtype=np.int64),
+        users
+    )
+
+
+def train(features: np.ndarray, labels: np.ndarray, n_estimators: int, max_depth: int,
+          test_size: float, random_state: int):
+    """训练标准化器和分类器，返回(scaler, classifier, 留出集准确率)"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    holdout_accuracy = None
+    if test_size > 0:
+        train_x, test_x, train_y, test_y = train_test_split(
+            features, labels, test_size=test_size, random_state=random_state
+        )
+    else:
+        train_x, train_y = features, labels
+
+    scaler = StandardScaler().fit(train_x)
+    classifier = RandomForestClassifier(
+        n_estimators=n_estimators,
+        max_depth=max_depth or None,
+        n_jobs=-1,
+        random_state=random_state
+    )
+    classifier.fit(scaler.transform(train_x), train_y)
+
+    if test_size > 0:
+        holdout_accuracy = float(classifier.score(scaler.transform(test_x), test_y))
+        # 评估完成后用全部数据重新训练
+        scaler = StandardScaler().fit(features)
+        classifier.fit(scaler.transform(features), labels)
+
+    return scaler, classifier, holdout_accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练情绪预测模型")
+    parser.add_argument("--model-dir", default=settings.EMOTION_MODEL_DIR, help="模型输出目录")
+    parser.add_argument("--min-records", type=int, default=6, help="参与训练的用户至少需要的情绪记录数")
+    parser.add_argument("--max-users", type=int, default=0, help="最多读取的用户数（0表示不限）")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=0, help="树的最大深度（0表示不限）")
+    parser.add_argument("--test-size", type=float, default=0.2, help="留出评估集比例（0表示不评估）")
+    parser.add_argument("--random-state", type=int, default=42)
+    args = parser.parse_args()
+
+    features, labels, users = asyncio.run(load_training_data(args.min_records, args.max_users))
+    if len(labels) == 0 or len(np.unique(labels)) < 2:
+        raise SystemExit("训练数据不足：至少需要两种情绪类型的样本")
+
+    scaler, classifier, holdout_accuracy = train(
+        features, labels, args.n_estimators, args.max_depth, args.test_size, args.random_state
+    )
+    path = save_artifact(args.model_dir, scaler, classifier, {
+        "users": users,
+        "samples": int(len(labels)),
+        "holdout_accuracy": holdout_accuracy,
+        "n_estimators": args.n_estimators,
+        "max_depth": args.max_depth or None
+    })
+
+    print(f"训练样本: {len(labels)}（{users} 个用户）")
+    if holdout_accuracy is not None:
+        print(f"留出集准确率: {holdout_accuracy:.3f}")
+    print(f"模型已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
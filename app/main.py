@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.serialization import NumpyORJSONResponse
 from app.api import auth, emotion, user_profile, user_behavior, alert, social_emotion
 from app.core.config import settings
+from app.services.emotion_predictor import emotion_predictor
+from app.services.cpu_tasks import cpu_executor
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -27,7 +30,8 @@ app = FastAPI(
     version=settings.VERSION,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    default_response_class=NumpyORJSONResponse
 )
 
 # 配置CORS
@@ -47,6 +51,25 @@ app.include_router(user_behavior.router, prefix="/api/v1/behavior", tags=["用
 app.include_router(alert.router, prefix="/api/v1/alert", tags=["情绪预警"])
 app.include_router(social_emotion.router, prefix="/api/v1/social", tags=["社交情绪"])
 
+@app.on_event("startup")
+async def load_prediction_model():
+    # 情绪预测模型只在启动时加载一次；尚未训练时预测接口返回503
+    emotion_predictor.load()
+
+@app.on_event("startup")
+async def warm_social_graph():
+    # 社交关系图的首次全量加载在后台进行，不占用请求的超时时间
+    social_emotion.social_emotion_service.warm_social_graph()
+
+@app.on_event("startup")
+async def listen_profile_invalidations():
+    # 离线任务写回画像后发布失效通知，各进程轮询并清除本地的画像缓存
+    user_profile.user_profile_service.listen_for_invalidations()
+
+@app.on_event("shutdown")
+async def shutdown_cpu_executor():
+    cpu_executor.shutdown()
+
 @app.get("/")
 async def root():
     return {
@@ -65,6 +88,7 @@ async def health_check():
             "database": "available",
             "authentication": "available",
             "user_profile": "available",
+            "emotion_prediction": "available" if emotion_predictor.is_loaded else "unavailable",
             "user_behavior": "available",
             "alert_system": "available",
             "social_emotion": "available"
@@ -35,4 +35,6 @@ class AlertHistory(BaseModel):
     alerts: List[Alert]
     total_alerts: int
     active_alerts: int
-    last_alert_time: Optional[datetime] 
\ No newline at end of file
+    last_alert_time: Optional[datetime]
+    level_counts: Dict[str, int] = {}  # 各预警级别的数量
+    next_cursor: Optional[str] = None  # 下一页游标，为空表示没有更多数据 
\ No newline at end of file
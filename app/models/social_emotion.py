@@ -47,4 +47,6 @@ class SocialEmotionInsight(BaseModel):
     social_support: float  # 社交支持度
     social_stress: float  # 社交压力
     relationship_quality: Dict[str, float]  # 与不同用户的关系质量
+    emotional_exposure: Optional[float] = None  # 经社交网络传播后受到的情绪暴露 (-1 到 1)，由离线任务计算
+    emotional_influence: Optional[float] = None  # 情绪对其他用户的影响力（全体平均为1）
     last_updated: datetime = datetime.now() 
\ No newline at end of file
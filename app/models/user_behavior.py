@@ -1,7 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer, field_validator
 from typing import List, Dict, Optional
 from datetime import datetime
 from enum import Enum
+import base64
 
 class BehaviorType(str, Enum):
     LOGIN = "login"
@@ -25,11 +26,18 @@ class UserBehavior(BaseModel):
     duration: Optional[float] = None  # 行为持续时间（秒）
     context: Dict  # 行为发生的上下文
     metadata: Optional[Dict] = None  # 额外元数据
+    session_id: Optional[str] = None  # 所属会话，记录时按不活跃间隔分配
+
+class FunnelQuery(BaseModel):
+    steps: List[BehaviorType]  # 按顺序的漏斗步骤
+    start: datetime  # 第一步发生时间的范围 [start, end)
+    end: datetime
+    window_minutes: float = 60.0  # 从第一步起完成后续步骤的时间窗口
 
 class BehaviorPattern(BaseModel):
     daily_pattern: Dict[str, int]  # 每日行为频率
     weekly_pattern: Dict[str, int]  # 每周行为频率
-    behavior_sequence: List[Dict[str, float]]  # 行为序列模式
+    behavior_sequence: List[Dict]  # 行为转移概率（from、to、probability）
     interaction_graph: Dict[str, Dict[str, float]]  # 行为交互图
     last_updated: datetime
 
@@ -41,9 +49,73 @@ class BehaviorInsight(BaseModel):
     retention_score: float  # 留存率得分
     last_updated: datetime
 
+    @field_validator("active_hours", "favorite_features", mode="before")
+    @classmethod
+    def _drop_legacy_counts(cls, value):
+        # 旧数据以[值, 次数]对保存，只取值
+        return [item[0] if isinstance(item, (list, tuple)) else item for item in value]
+
+class BehaviorSession(BaseModel):
+    session_id: str
+    user_id: str
+    start: datetime  # 会话中第一条行为的时间
+    end: datetime  # 会话中最后一条行为结束的时间（时间加持续时间）
+    event_count: int = 0
+    total_duration: float = 0.0  # 各行为持续时间之和（秒）
+    type_counts: Dict[str, int] = {}  # 各类型行为次数
+
+class RecentBehavior(BaseModel):
+    behavior_type: str
+    timestamp: datetime
+
+class BehaviorCooccurrenceIndex(BaseModel):
+    window_seconds: float  # 共现时间窗口
+    record_count: int = 0  # 已计入交互图的行为记录数
+    latest: Optional[datetime] = None  # 已计入记录中最晚的时间
+    recent: List[RecentBehavior] = []  # 最晚时间之前一个窗口内的行为（按时间排序）
+
+class BehaviorTransitionModel(BaseModel):
+    half_life_hours: Optional[float] = None  # 时间衰减半衰期，为空时不衰减
+    counts: List[List[float]] = []  # 行为类型转移计数矩阵（行=前一行为，列=后一行为）
+    record_count: int = 0  # 已计入的行为记录数
+    last_type: Optional[str] = None  # 时间上最后一条行为的类型
+    last_timestamp: Optional[datetime] = None
+    reference_time: Optional[datetime] = None  # 衰减权重的基准时间
+
+class BehaviorClusterModel(BaseModel):
+    n_clusters: int
+    centers: List[List[float]] = []  # 各簇中心（小时、星期、持续时间）
+    counts: List[int] = []  # 各簇已分配的行为数，决定中心的更新步长
+    record_count: int = 0  # 已计入的行为记录数
+
+class ActivityBitmap(BaseModel):
+    first_day: Optional[int] = None  # 第0位对应的日期（距1970-01-01的天数）
+    bits: bytes = b""  # 每天一位的活跃位图（小端）
+    ring_days: List[int] = []  # 最近7天环形计数：每个槽对应的日期
+    ring_counts: List[int] = []  # 最近7天环形计数：该日的行为数
+    record_count: int = 0  # 已计入的行为记录数
+
+    @field_serializer("bits", when_used="json")
+    def _serialize_bits(self, bits: bytes) -> str:
+        # 位图不是UTF-8文本，JSON响应中以base64表示；写入数据库时仍为二进制
+        return base64.b64encode(bits).decode("ascii")
+
+class BehaviorTotals(BaseModel):
+    hour_counts: Dict[str, int] = {}  # 各小时的累计行为数
+    weekday_counts: Dict[str, int] = {}  # 各星期的累计行为数
+    type_counts: Dict[str, int] = {}  # 各类型的累计行为数
+    record_count: int = 0  # 已计入的行为记录数
+
 class UserBehaviorProfile(BaseModel):
     user_id: str
     behavior_pattern: BehaviorPattern
     behavior_insight: BehaviorInsight
-    behavior_history: List[UserBehavior]
+    behavior_history: List[UserBehavior]  # 最近的行为，更早的记录成批移入归档
+    archived_count: int = 0  # 已移入归档的行为数
+    totals: Optional[BehaviorTotals] = None  # 全部行为（包括已归档的）的累计次数
+    cooccurrence_index: Optional[BehaviorCooccurrenceIndex] = None  # 交互图的增量维护状态
+    transition_model: Optional[BehaviorTransitionModel] = None  # 行为转移（马尔可夫）模型
+    current_session: Optional[BehaviorSession] = None  # 最近一个会话的聚合
+    cluster_model: Optional[BehaviorClusterModel] = None  # 行为聚类的簇中心（增量更新）
+    activity: Optional[ActivityBitmap] = None  # 每日活跃位图
     last_updated: datetime 
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from pydantic import BaseModel, model_validator
+from typing import List, Dict, Optional, Union
 from datetime import datetime
 from enum import Enum
 
@@ -39,12 +39,77 @@ class UserInterests(BaseModel):
     last_updated: datetime
 
 class UserEmotionPattern(BaseModel):
-    daily_pattern: Dict[str, float]  # 每日情绪变化模式
-    weekly_pattern: Dict[str, float]  # 每周情绪变化模式
-    triggers: Dict[str, float]  # 情绪触发因素
+    daily_pattern: Dict[str, Union[float, str]]  # 每日情绪变化模式（"{时段}_dominant"项为情绪类型）
+    weekly_pattern: Dict[str, Union[float, str]]  # 每周情绪变化模式（含主导情绪和best_day、worst_day）
+    triggers: Dict[str, Union[float, str]]  # 情绪触发因素（"{词}_emotion"项为情绪类型）
     coping_strategies: Dict[str, float]  # 应对策略效果
     last_updated: datetime
 
+class EmotionStatsBucket(BaseModel):
+    count: int = 0
+    intensity_sum: float = 0.0
+    intensity_sq_sum: float = 0.0
+    emotion_counts: Dict[str, int] = {}  # 各情绪类型出现次数
+    emotion_intensity_sums: Dict[str, float] = {}  # 各情绪类型强度之和
+    emotion_first_seen: Dict[str, int] = {}  # 各情绪类型首次出现的记录序号
+
+class EmotionAccumulators(BaseModel):
+    record_count: int = 0
+    stability_window: List[float] = []  # 最近的情绪强度，用于计算情绪稳定性
+    daily_buckets: Dict[str, EmotionStatsBucket] = {}  # 按时间段（morning/afternoon/evening/night）
+    weekly_buckets: Dict[str, EmotionStatsBucket] = {}  # 按星期（"0"=周一）
+    social_count: int = 0  # 社交情境记录数
+    social_intensity_sum: float = 0.0
+    emotion_changes: int = 0  # 按时间顺序相邻记录情绪类型变化次数
+    last_timestamp: Optional[datetime] = None
+    last_emotion: Optional[str] = None
+    changes_dirty: bool = False  # 出现乱序记录时需要重新计算emotion_changes
+
+class TriggerTermStats(BaseModel):
+    term_count: int = 0  # 词在所有上下文中出现的总次数
+    records: int = 0  # 包含该词的记录数
+    intensity_sum: float = 0.0  # 包含该词的记录情绪强度之和
+    emotion_counts: Dict[str, int] = {}
+    emotion_first_seen: Dict[str, int] = {}
+
+    @model_validator(mode="before")
+    @classmethod
+    def _drop_legacy_postings(cls, data):
+        # 旧数据保存了包含该词的全部记录序号，只需要其数量
+        if isinstance(data, dict) and "postings" in data:
+            data = dict(data)
+            data.setdefault("records", len(data.pop("postings")))
+        return data
+
+class TriggerIndex(BaseModel):
+    record_count: int = 0
+    terms: Dict[str, TriggerTermStats] = {}
+
+class ActivityStats(BaseModel):
+    count: int = 0
+    first_seen: int = 0  # 首次出现的记录序号
+    intensity_sum: float = 0.0
+    emotion_counts: Dict[str, int] = {}
+    emotion_first_seen: Dict[str, int] = {}
+
+class CopingStrategyStats(BaseModel):
+    effect_sum: float = 0.0
+    count: int = 0
+
+class ContextKeywordIndex(BaseModel):
+    record_count: int = 0
+    record_strategies: List[Optional[str]] = []  # 每条记录上下文命中的应对策略（匹配结果缓存）
+    activities: Dict[str, ActivityStats] = {}
+    strategies: Dict[str, CopingStrategyStats] = {}
+    last_record: Optional[int] = None  # 时间顺序上最后一条记录的序号
+    transitions_dirty: bool = False  # 出现乱序记录时需要重新计算应对策略
+    config_fingerprint: Optional[str] = None  # 构建时关键词表的指纹，关键词表变化后需重建
+
+class ProfileStaleness(BaseModel):
+    pending_records: int = 0  # 已写入但尚未计入派生数据的记录数
+    dirty_since: Optional[datetime] = None  # 最早一条未计入记录的写入时间
+    derived_updated_at: Optional[datetime] = None  # 派生数据最近一次重新计算的时间
+
 class UserProfile(BaseModel):
     user_id: str
     personality: UserPersonality
@@ -56,6 +121,10 @@ class UserProfile(BaseModel):
     social_profile: Optional[Dict] = None  # 社交情绪数据
     risk_profile: Optional[Dict] = None  # 风险画像数据
     behavior_profile: Optional[Dict] = None  # 行为画像数据
+    accumulators: Optional[EmotionAccumulators] = None  # 增量分析的累加状态
+    trigger_index: Optional[TriggerIndex] = None  # 触发因素倒排索引
+    keyword_index: Optional[ContextKeywordIndex] = None  # 兴趣活动和应对策略的关键词索引
+    staleness: ProfileStaleness = ProfileStaleness()  # 派生数据（模式、性格、兴趣等）的滞后情况
     last_updated: datetime
 
 class EmotionPrediction(BaseModel):
@@ -64,6 +133,10 @@ class EmotionPrediction(BaseModel):
     factors: Dict[str, float]  # 影响因素
     timestamp: datetime
 
+class BatchEmotionPredictionRequest(BaseModel):
+    user_ids: List[str]
+    context: Dict = {}
+
 class PersonalizedRecommendation(BaseModel):
     type: str  # 推荐类型
     content: str  # 推荐内容
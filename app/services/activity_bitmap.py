@@ -0,0 +1,87 @@
+from datetime import date, datetime
+from typing import List, Optional
+from app.models.user_behavior import ActivityBitmap, UserBehavior
+
+_EPOCH = date(1970, 1, 1)
+
+# 最近事件数环形计数的天数
+RING_DAYS = 7
+
+
+def day_number(value: datetime) -> int:
+    """距1970-01-01的天数"""
+    return (value.date() - _EPOCH).days
+
+
+def update_activity(bitmap: Optional[ActivityBitmap], history: List[UserBehavior]) -> ActivityBitmap:
+    """
+    把行为历史中尚未计入的记录加入活跃位图
+
+    每条记录只置一位并更新一个环形计数；位图缺失或与历史不一致时从完整历史重建
+    """
+    if bitmap is None or bitmap.record_count > len(history):
+        bitmap = ActivityBitmap(ring_days=[-1] * RING_DAYS, ring_counts=[0] * RING_DAYS)
+
+    for behavior in history[bitmap.record_count:]:
+        day = day_number(behavior.timestamp)
+        _mark(bitmap, day)
+        _count(bitmap, day)
+        bitmap.record_count += 1
+    return bitmap
+
+
+def to_int(bitmap: ActivityBitmap) -> int:
+    """位图对应的整数，第i位表示first_day + i这一天是否活跃"""
+    return int.from_bytes(bitmap.bits, "little")
+
+
+def active_in_range(bits: int, first_day: int, start_day: int, end_day: int) -> bool:
+    """[start_day, end_day]中是否有活跃的日子"""
+    if end_day < first_day:
+        return False
+    start = max(start_day - first_day, 0)
+    length = end_day - first_day - start + 1
+    return (bits >> start) & ((1 << length) - 1) != 0
+
+
+def retention_streak(bitmap: ActivityBitmap, limit: int = 30) -> int:
+    """截至最后一个活跃日的连续活跃天数（最多limit天）"""
+    bits = to_int(bitmap)
+    if bits == 0:
+        return 0
+    last = bits.bit_length() - 1
+    # 取最后一个活跃日及之前limit-1天，取反后最高位的位置即连续区间的下界
+    start = max(last - limit + 1, 0)
+    window = (bits >> start) & ((1 << (last - start + 1)) - 1)
+    gaps = ~window & ((1 << (last - start + 1)) - 1)
+    return last - start + 1 if gaps == 0 else last - start - (gaps.bit_length() - 1)
+
+
+def recent_event_count(bitmap: ActivityBitmap, today: int) -> int:
+    """包括today在内最近RING_DAYS天的行为数"""
+    return sum(
+        count for day, count in zip(bitmap.ring_days, bitmap.ring_counts)
+        if today - RING_DAYS < day <= today
+    )
+
+
+def _mark(bitmap: ActivityBitmap, day: int):
+    bits = to_int(bitmap)
+    if bitmap.first_day is None:
+        bitmap.first_day = day
+    elif day < bitmap.first_day:
+        # 早于位图起始日的行为：整体左移，起始日前移
+        bits <<= bitmap.first_day - day
+        bitmap.first_day = day
+    bits |= 1 << (day - bitmap.first_day)
+    bitmap.bits = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def _count(bitmap: ActivityBitmap, day: int):
+    slot = day % RING_DAYS
+    if bitmap.ring_days[slot] == day:
+        bitmap.ring_counts[slot] += 1
+    elif bitmap.ring_days[slot] < day:
+        bitmap.ring_days[slot] = day
+        bitmap.ring_counts[slot] = 1
+    # 比环中记录的日期还早的行为已不在统计窗口内，不计数
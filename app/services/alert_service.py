@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import base64
 from app.models.alert import Alert, AlertRule, AlertLevel, AlertHistory
 from app.models.user_profile import UserEmotionRecord
 from app.services.user_profile_service import UserProfileService
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.services.profile_snapshots import snapshot_store
 
 class AlertService:
     def __init__(self):
@@ -187,38 +189,129 @@ class AlertService:
                 return user_profile["emotional_stability"]
             return 0.8  # 默认返回值
     
-    async def get_alert_history(self, user_id: str) -> AlertHistory:
-        """获取用户预警历史"""
+    async def get_alert_history(self, user_id: str, cursor: Optional[str] = None,
+                                limit: int = 20, status: Optional[str] = None,
+                                level: Optional[AlertLevel] = None) -> AlertHistory:
+        """
+        获取用户预警历史
+
+        按 (created_at, id) 倒序进行游标分页，统计数据由聚合查询得出，
+        不随预警数量增长而加载全部预警
+        """
         client = AsyncIOMotorClient(settings.MONGODB_URL)
         db = client[settings.MONGODB_DB_NAME]
         
-        # 查询该用户的所有预警
-        cursor = db.alerts.find({"user_id": user_id})
+        # 构建查询条件
+        query = {"user_id": user_id}
+        if status:
+            query["status"] = status
+        if level:
+            query["level"] = level
+        if cursor:
+            cursor_time, cursor_id = self._decode_cursor(cursor)
+            query["$or"] = [
+                {"created_at": {"$lt": cursor_time}},
+                {"created_at": cursor_time, "id": {"$lt": cursor_id}}
+            ]
+        
+        # 多取一条用于判断是否还有下一页
+        db_cursor = db.alerts.find(query).sort(
+            [("created_at", -1), ("id", -1)]
+        ).limit(limit + 1)
         
         alerts = []
-        active_alerts = 0
-        last_alert_time = None
+        async for alert_data in db_cursor:
+            alerts.append(Alert.model_validate(alert_data))
         
-        async for alert_data in cursor:
-            alert = Alert(**alert_data)
-            alerts.append(alert)
-            
-            # 统计活动预警数量
-            if alert.status == "active":
-                active_alerts += 1
-                
-            # 更新最后预警时间
-            if last_alert_time is None or alert.created_at > last_alert_time:
-                last_alert_time = alert.created_at
+        next_cursor = None
+        if len(alerts) > limit:
+            alerts = alerts[:limit]
+            next_cursor = self._encode_cursor(alerts[-1])
+        
+        stats = await self.get_alert_stats(user_id)
         
         return AlertHistory(
             user_id=user_id,
             alerts=alerts,
-            total_alerts=len(alerts),
-            active_alerts=active_alerts,
-            last_alert_time=last_alert_time
+            total_alerts=stats["total_alerts"],
+            active_alerts=stats["active_alerts"],
+            last_alert_time=stats["last_alert_time"],
+            level_counts=stats["level_counts"],
+            next_cursor=next_cursor
         )
     
+    async def get_user_alerts(self, user_id: str, status: Optional[str] = "active",
+                              limit: int = 50) -> List[Alert]:
+        """获取用户最近的预警（默认只取活动预警）"""
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        db = client[settings.MONGODB_DB_NAME]
+        
+        query = {"user_id": user_id}
+        if status:
+            query["status"] = status
+        
+        db_cursor = db.alerts.find(query).sort([("created_at", -1), ("id", -1)]).limit(limit)
+        return [Alert.model_validate(alert_data) async for alert_data in db_cursor]
+    
+    def calculate_user_risk_level(self, alerts: List[Alert]) -> str:
+        """由活动预警计算用户风险等级：取最高的预警级别，没有活动预警时为low"""
+        level_order = list(AlertLevel)
+        active_levels = [alert.level for alert in alerts if alert.status == "active"]
+        if not active_levels:
+            return AlertLevel.LOW.value
+        return max(active_levels, key=level_order.index).value
+    
+    async def get_alert_stats(self, user_id: str) -> Dict:
+        """获取用户预警统计（总数、活动数、各级别数量、最后预警时间）"""
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        db = client[settings.MONGODB_DB_NAME]
+        
+        # 按级别和状态分组统计，结果最多只有 级别数 x 状态数 行
+        pipeline = [
+            {"$match": {"user_id": user_id}},
+            {"$group": {
+                "_id": {"level": "$level", "status": "$status"},
+                "count": {"$sum": 1},
+                "last_alert_time": {"$max": "$created_at"}
+            }}
+        ]
+        
+        stats = {
+            "total_alerts": 0,
+            "active_alerts": 0,
+            "level_counts": {level.value: 0 for level in AlertLevel},
+            "last_alert_time": None
+        }
+        
+        async for group in db.alerts.aggregate(pipeline):
+            count = group["count"]
+            level = group["_id"].get("level")
+            stats["total_alerts"] += count
+            if group["_id"].get("status") == "active":
+                stats["active_alerts"] += count
+            if level is not None:
+                stats["level_counts"][level] = stats["level_counts"].get(level, 0) + count
+            
+            last_time = group.get("last_alert_time")
+            if last_time and (stats["last_alert_time"] is None or last_time > stats["last_alert_time"]):
+                stats["last_alert_time"] = last_time
+        
+        return stats
+    
+    def _encode_cursor(self, alert: Alert) -> str:
+        """将预警的 (created_at, id) 编码为分页游标"""
+        raw = f"{alert.created_at.isoformat()}|{alert.id}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+    
+    def _decode_cursor(self, cursor: str) -> Tuple[datetime, str]:
+        """解析分页游标"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+            created_at, alert_id = raw.split("|", 1)
+            return datetime.fromisoformat(created_at), alert_id
+        except Exception:
+            raise ValueError(f"无效的分页游标: {cursor}")
+    
     async def resolve_alert(self, alert_id: str) -> Alert:
         """解决预警"""
         client = AsyncIOMotorClient(settings.MONGODB_URL)
@@ -240,6 +333,8 @@ class AlertService:
             {"$set": {"status": "resolved", "resolved_at": datetime.now()}}
         )
         
+        snapshot_store.mark_stale(alert_data["user_id"], "alert")
+        
         # 返回更新后的预警对象
         return Alert(**alert_data)
     
@@ -263,5 +358,7 @@ class AlertService:
             {"$set": {"status": "dismissed"}}
         )
         
+        snapshot_store.mark_stale(alert_data["user_id"], "alert")
+        
         # 返回更新后的预警对象
         return Alert(**alert_data) 
\ No newline at end of file
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+import json
+import zlib
+from fastapi.encoders import jsonable_encoder
+from app.core.config import settings
+from app.models.user_behavior import UserBehavior, UserBehaviorProfile
+
+
+def expired_count(profile: UserBehaviorProfile, now: datetime) -> int:
+    """
+    行为历史开头应移入归档的记录数
+
+    超出BEHAVIOR_HISTORY_MAX_EVENTS条或早于BEHAVIOR_HISTORY_MAX_AGE_DAYS天的记录都应归档；
+    不足BEHAVIOR_ARCHIVE_BATCH_SIZE条时返回0，攒够一批再移动，分摊归档写入
+    """
+    history = profile.behavior_history
+    count = max(len(history) - settings.BEHAVIOR_HISTORY_MAX_EVENTS, 0)
+    cutoff = now - timedelta(days=settings.BEHAVIOR_HISTORY_MAX_AGE_DAYS)
+    while count < len(history) and history[count].timestamp < cutoff:
+        count += 1
+    return count if count >= settings.BEHAVIOR_ARCHIVE_BATCH_SIZE else 0
+
+
+def shift_record_counts(profile: UserBehaviorProfile, moved: int):
+    """
+    从行为历史开头移走moved条记录后，调整各增量状态中已计入的记录数
+
+    移走的记录都已计入这些状态，调整后它们继续从行为历史的正确位置增量更新
+    """
+    for state in (profile.totals, profile.cooccurrence_index, profile.transition_model,
+                  profile.cluster_model, profile.activity):
+        if state is not None:
+            state.record_count = max(state.record_count - moved, 0)
+
+
+class BehaviorArchiveStore:
+    """
+    行为历史冷存储
+
+    行为画像只保留最近一段行为，更早的记录按用户和日期分组，每批压缩为一个数据块
+    追加到behavior_archive集合中该用户当天的文档；长期统计使用画像中的累计聚合，
+    平时不需要读取归档，只有增量状态无法继续增量更新、需要重建时才读取该用户的全部归档。
+    """
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].behavior_archive
+
+    async def archive(self, user_id: str, behaviors: List[UserBehavior]):
+        """把一批行为按日期压缩写入归档"""
+        from pymongo import UpdateOne
+
+        by_day: Dict[str, List[Dict]] = {}
+        for behavior in behaviors:
+            by_day.setdefault(behavior.timestamp.date().isoformat(), []).append(jsonable_encoder(behavior))
+
+        await self._get_collection().bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "day": day},
+                {
+                    "$push": {"chunks": zlib.compress(json.dumps(records, ensure_ascii=False).encode("utf-8"))},
+                    "$inc": {"event_count": len(records)}
+                },
+                upsert=True
+            )
+            for day, records in by_day.items()
+        ], ordered=False)
+
+    async def load(self, user_id: str, start: datetime, end: datetime) -> List[UserBehavior]:
+        """读取[start, end)内已归档的行为（按时间排序）"""
+        cursor = self._get_collection().find(
+            {
+                "user_id": user_id,
+                "day": {"$gte": start.date().isoformat(), "$lte": end.date().isoformat()}
+            },
+            {"_id": 0, "chunks": 1}
+        )
+        behaviors = []
+        async for document in cursor:
+            for chunk in document["chunks"]:
+                for record in json.loads(zlib.decompress(chunk)):
+                    behavior = UserBehavior(**record)
+                    if start <= behavior.timestamp < end:
+                        behaviors.append(behavior)
+        return sorted(behaviors, key=lambda behavior: behavior.timestamp)
+
+    async def load_all(self, user_id: str) -> List[UserBehavior]:
+        """读取用户全部已归档的行为（按时间排序）"""
+        return await self.load(user_id, datetime.min, datetime.max)
+
+
+# 进程内共享的归档存储
+archive_store = BehaviorArchiveStore()
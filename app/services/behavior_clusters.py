@@ -0,0 +1,67 @@
+from typing import Dict, List
+import numpy as np
+from app.models.user_behavior import BehaviorClusterModel, UserBehavior
+
+# 行为聚类的簇数
+BEHAVIOR_CLUSTERS = 3
+
+
+def behavior_features(behaviors: List[UserBehavior]) -> np.ndarray:
+    """聚类特征矩阵：每行为（小时, 星期, 持续时间）"""
+    return np.array([
+        [behavior.timestamp.hour, behavior.timestamp.weekday(), behavior.duration or 0]
+        for behavior in behaviors
+    ], dtype=np.float64).reshape(-1, 3)
+
+
+def model_from_labels(features: np.ndarray, labels: np.ndarray, n_clusters: int,
+                      record_count: int) -> BehaviorClusterModel:
+    """由一次完整聚类的结果（样本和簇编号）得到簇中心和各簇样本数"""
+    model = BehaviorClusterModel(n_clusters=n_clusters, centers=[], counts=[], record_count=record_count)
+    for cluster_id in np.unique(labels):
+        members = features[labels == cluster_id]
+        model.centers.append([float(value) for value in members.mean(axis=0)])
+        model.counts.append(int(len(members)))
+    return model
+
+
+def add_behaviors(model: BehaviorClusterModel, history: List[UserBehavior]):
+    """
+    把行为历史中尚未计入的记录加入聚类模型
+
+    簇不足n_clusters个时新行为直接成为一个簇中心；之后每条行为分配到最近的中心，
+    中心按1/簇样本数的步长向它移动（MiniBatchKMeans在批大小为1时的更新规则），
+    每条行为O(簇数)，已有簇的编号保持不变
+    """
+    new_behaviors = history[model.record_count:]
+    if not new_behaviors:
+        return
+
+    centers = np.array(model.centers, dtype=np.float64).reshape(-1, 3)
+    counts = list(model.counts)
+    for point in behavior_features(new_behaviors):
+        if len(centers) < model.n_clusters:
+            centers = np.vstack([centers, point])
+            counts.append(1)
+            continue
+        nearest = int(np.argmin(((centers - point) ** 2).sum(axis=1)))
+        counts[nearest] += 1
+        centers[nearest] += (point - centers[nearest]) / counts[nearest]
+
+    model.centers = centers.tolist()
+    model.counts = counts
+    model.record_count = len(history)
+
+
+def cluster_summary(model: BehaviorClusterModel) -> List[Dict[str, float]]:
+    """各簇的中心（平均小时、星期、持续时间）和样本数"""
+    return [
+        {
+            "cluster_id": cluster_id,
+            "avg_hour": center[0],
+            "avg_weekday": center[1],
+            "avg_duration": center[2],
+            "size": count
+        }
+        for cluster_id, (center, count) in enumerate(zip(model.centers, model.counts))
+    ]
@@ -0,0 +1,99 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, List, Tuple
+from app.models.user_behavior import BehaviorCooccurrenceIndex, RecentBehavior, UserBehavior
+from app.services.behavior_transitions import behavior_type_key
+
+# 行为交互图：行为类型 -> 在同一时间窗口内出现的其他行为类型 -> 共现次数（稀疏存储）
+CooccurrenceGraph = Dict[str, Dict[str, float]]
+
+
+def build_cooccurrence(history: List[UserBehavior],
+                       window_seconds: float) -> Tuple[BehaviorCooccurrenceIndex, CooccurrenceGraph]:
+    """
+    从完整行为历史构建交互图
+
+    两条不同类型的行为时间相差不超过window_seconds即共现一次（双向计数）；
+    按时间排序后用滑动窗口一次遍历，复杂度为O(n·窗口内行为数)
+    """
+    events = sorted((behavior.timestamp, behavior_type_key(behavior)) for behavior in history)
+    graph: CooccurrenceGraph = {}
+    start = 0
+    for position, (timestamp, behavior_type) in enumerate(events):
+        graph.setdefault(behavior_type, {})
+        while (timestamp - events[start][0]).total_seconds() > window_seconds:
+            start += 1
+        for other_timestamp, other_type in events[start:position]:
+            _add_pair(graph, behavior_type, other_type)
+
+    index = BehaviorCooccurrenceIndex(window_seconds=window_seconds, record_count=len(history))
+    if events:
+        index.latest = events[-1][0]
+        index.recent = [
+            RecentBehavior(behavior_type=behavior_type, timestamp=timestamp)
+            for timestamp, behavior_type in events
+            if (index.latest - timestamp).total_seconds() <= window_seconds
+        ]
+    return index, graph
+
+
+def add_behaviors(index: BehaviorCooccurrenceIndex, graph: CooccurrenceGraph,
+                  history: List[UserBehavior]):
+    """
+    把行为历史中尚未计入的记录（第index.record_count条之后）加入交互图
+
+    按时间顺序到达的行为只需与index.recent中窗口内的行为配对；
+    乱序到达（早于已计入的最晚时间）时扫描已计入的历史查找共现行为
+    """
+    window_seconds = index.window_seconds
+    for position in range(index.record_count, len(history)):
+        behavior = history[position]
+        timestamp = behavior.timestamp
+        behavior_type = behavior_type_key(behavior)
+        graph.setdefault(behavior_type, {})
+
+        if index.latest is None or timestamp >= index.latest:
+            partners = [
+                recent.behavior_type for recent in index.recent
+                if (timestamp - recent.timestamp).total_seconds() <= window_seconds
+            ]
+        else:
+            partners = [
+                behavior_type_key(other) for other in history[:position]
+                if abs((timestamp - other.timestamp).total_seconds()) <= window_seconds
+            ]
+        for other_type in partners:
+            _add_pair(graph, behavior_type, other_type)
+
+        index.record_count += 1
+        _remember(index, behavior_type, timestamp)
+
+
+def _remember(index: BehaviorCooccurrenceIndex, behavior_type: str, timestamp: datetime):
+    """把行为放入最近窗口（保持按时间排序），并丢弃窗口之外的行为"""
+    if index.latest is None or timestamp > index.latest:
+        index.latest = timestamp
+    if (index.latest - timestamp).total_seconds() > index.window_seconds:
+        return
+
+    timestamps = [recent.timestamp for recent in index.recent]
+    index.recent.insert(
+        bisect_right(timestamps, timestamp),
+        RecentBehavior(behavior_type=behavior_type, timestamp=timestamp)
+    )
+    cutoff = 0
+    while (index.latest - index.recent[cutoff].timestamp).total_seconds() > index.window_seconds:
+        cutoff += 1
+    if cutoff:
+        del index.recent[:cutoff]
+
+
+def _add_pair(graph: CooccurrenceGraph, behavior_type: str, other_type: str):
+    # 只统计不同类型之间的共现
+    if behavior_type == other_type:
+        return
+    graph.setdefault(behavior_type, {})
+    graph.setdefault(other_type, {})
+    graph[behavior_type][other_type] = graph[behavior_type].get(other_type, 0.0) + 1.0
+    graph[other_type][behavior_type] = graph[other_type].get(behavior_type, 0.0) + 1.0
+
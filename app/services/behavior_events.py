@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+import numpy as np
+from app.core.config import settings
+from app.models.user_behavior import UserBehavior
+from app.services.activity_bitmap import day_number
+from app.services.behavior_transitions import BEHAVIOR_CODES, behavior_type_key
+from app.services.funnel import UserEvents
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY_SECONDS = 86400
+
+
+def epoch_seconds(value: datetime) -> int:
+    """距1970-01-01的秒数"""
+    return int((value - _EPOCH).total_seconds())
+
+
+def day_arrays(behaviors: List[UserBehavior]) -> Dict[int, Dict[str, List[int]]]:
+    """把行为按天编码为行为类型编码（codes）和当天内秒数（offsets）两个数组"""
+    days: Dict[int, Dict[str, List[int]]] = {}
+    for behavior in behaviors:
+        day = day_number(behavior.timestamp)
+        arrays = days.setdefault(day, {"codes": [], "offsets": []})
+        arrays["codes"].append(BEHAVIOR_CODES[behavior_type_key(behavior)])
+        arrays["offsets"].append(epoch_seconds(behavior.timestamp) - day * _DAY_SECONDS)
+    return days
+
+
+class BehaviorEventStore:
+    """
+    全体用户行为的紧凑事件索引（漏斗分析使用）
+
+    每个用户每天一个文档，只保存行为类型编码和当天内秒数两个整数数组，记录行为时追加。
+    索引不随行为画像的行为历史归档，覆盖用户的全部行为；按(day, user_id)建索引，
+    漏斗查询只读取范围内各天的文档，不扫描行为画像。
+    """
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].behavior_events
+
+    async def record(self, behavior: UserBehavior):
+        """把一条行为追加到该用户当天的文档"""
+        day = day_number(behavior.timestamp)
+        await self._get_collection().update_one(
+            {"day": day, "user_id": behavior.user_id},
+            {"$push": {
+                "codes": BEHAVIOR_CODES[behavior_type_key(behavior)],
+                "offsets": epoch_seconds(behavior.timestamp) - day * _DAY_SECONDS
+            }},
+            upsert=True
+        )
+
+    async def load(self, start: datetime, end: datetime, codes: Iterable[int]) -> Dict[str, UserEvents]:
+        """读取[start, end)内行为类型属于codes的事件，按用户合并为紧凑数组"""
+        start_second, end_second = epoch_seconds(start), epoch_seconds(end)
+        wanted = np.array(sorted(set(codes)), dtype=np.uint8)
+        parts: Dict[str, List[UserEvents]] = {}
+        cursor = self._get_collection().find(
+            {"day": {"$gte": day_number(start), "$lte": day_number(end)}},
+            {"_id": 0, "user_id": 1, "day": 1, "codes": 1, "offsets": 1}
+        )
+        async for document in cursor:
+            event_codes = np.asarray(document["codes"], dtype=np.uint8)
+            seconds = document["day"] * _DAY_SECONDS + np.asarray(document["offsets"], dtype=np.int64)
+            mask = np.isin(event_codes, wanted) & (seconds >= start_second) & (seconds < end_second)
+            if mask.any():
+                parts.setdefault(document["user_id"], []).append((event_codes[mask], seconds[mask]))
+
+        return {
+            user_id: (np.concatenate([part[0] for part in user_parts]),
+                      np.concatenate([part[1] for part in user_parts]))
+            for user_id, user_parts in parts.items()
+        }
+
+    async def replace_days(self, user_id: str, behaviors: List[UserBehavior]):
+        """用给定的行为覆盖该用户这些行为所在各天的文档（回填历史数据时使用）"""
+        from pymongo import UpdateOne
+
+        days = day_arrays(behaviors)
+        if not days:
+            return
+        await self._get_collection().bulk_write([
+            UpdateOne({"day": day, "user_id": user_id}, {"$set": arrays}, upsert=True)
+            for day, arrays in days.items()
+        ], ordered=False)
+
+
+# 进程内共享的事件索引
+event_store = BehaviorEventStore()
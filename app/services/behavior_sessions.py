@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from uuid import uuid4
+import numpy as np
+from app.core.config import settings
+from app.models.user_behavior import BehaviorSession, UserBehavior, UserBehaviorProfile
+from app.services.behavior_transitions import behavior_type_key
+
+
+class BehaviorSessionStore:
+    """
+    行为会话聚合
+
+    行为写入时按不活跃间隔流式划分会话：与上一会话的间隔不超过
+    BEHAVIOR_SESSION_GAP_MINUTES的行为归入同一会话，否则开启新会话。
+    每个会话的聚合（起止时间、行为数、各类型次数）保存在behavior_sessions集合中，
+    会话级统计只读取这些聚合，不再扫描行为历史。
+    """
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].behavior_sessions
+
+    async def assign(self, profile: UserBehaviorProfile, behavior: UserBehavior) -> BehaviorSession:
+        """
+        为行为分配会话并更新会话聚合，behavior.session_id被设置为所属会话
+
+        按时间顺序到达的行为只需与画像中的当前会话比较；早于当前会话的乱序行为
+        归入时间上相邻的已有会话（查询一次会话集合），找不到时单独成为一个会话
+        """
+        gap = timedelta(minutes=settings.BEHAVIOR_SESSION_GAP_MINUTES)
+        start = behavior.timestamp
+        end = start + timedelta(seconds=behavior.duration or 0)
+        current = profile.current_session
+
+        if current is not None and current.start - gap <= start <= current.end + gap:
+            session = current
+        elif current is None or start > current.end + gap:
+            session = self._new_session(profile.user_id, start, end)
+            profile.current_session = session
+        else:
+            document = await self._get_collection().find_one(
+                {
+                    "user_id": profile.user_id,
+                    "start": {"$lte": start + gap},
+                    "end": {"$gte": start - gap}
+                },
+                {"_id": 0},
+                sort=[("end", -1)]
+            )
+            if document is not None:
+                session = BehaviorSession.model_validate(document)
+            else:
+                session = self._new_session(profile.user_id, start, end)
+
+        behavior_type = behavior_type_key(behavior)
+        session.start = min(session.start, start)
+        session.end = max(session.end, end)
+        session.event_count += 1
+        session.total_duration += behavior.duration or 0
+        session.type_counts[behavior_type] = session.type_counts.get(behavior_type, 0) + 1
+        behavior.session_id = session.session_id
+
+        # 增量更新，与同一会话的并发写入互不覆盖
+        await self._get_collection().update_one(
+            {"session_id": session.session_id},
+            {
+                "$setOnInsert": {"user_id": profile.user_id},
+                "$min": {"start": start},
+                "$max": {"end": end},
+                "$inc": {
+                    "event_count": 1,
+                    "total_duration": behavior.duration or 0,
+                    f"type_counts.{behavior_type}": 1
+                }
+            },
+            upsert=True
+        )
+        return session
+
+    async def get_session_stats(self, user_id: str, days: int = 30,
+                                now: Optional[datetime] = None) -> Dict:
+        """
+        最近days天的会话统计：每天会话数、会话时长中位数、平均每个会话的行为数等
+        """
+        now = now or datetime.utcnow()
+        since = now - timedelta(days=days)
+        cursor = self._get_collection().find(
+            {"user_id": user_id, "start": {"$gte": since}},
+            {"_id": 0, "start": 1, "end": 1, "event_count": 1}
+        )
+
+        starts = []
+        lengths = []
+        event_counts = []
+        async for document in cursor:
+            starts.append(document["start"])
+            lengths.append((document["end"] - document["start"]).total_seconds())
+            event_counts.append(document["event_count"])
+
+        daily_sessions: Dict[str, int] = {}
+        for start in starts:
+            day = start.date().isoformat()
+            daily_sessions[day] = daily_sessions.get(day, 0) + 1
+
+        return {
+            "user_id": user_id,
+            "days": days,
+            "total_sessions": len(starts),
+            "sessions_per_day": round(len(starts) / days, 3) if days else None,
+            "median_session_seconds": float(np.median(lengths)) if lengths else None,
+            "avg_session_seconds": float(np.mean(lengths)) if lengths else None,
+            "avg_events_per_session": float(np.mean(event_counts)) if event_counts else None,
+            "daily_sessions": dict(sorted(daily_sessions.items()))
+        }
+
+    def _new_session(self, user_id: str, start: datetime, end: datetime) -> BehaviorSession:
+        return BehaviorSession(
+            session_id=uuid4().hex,
+            user_id=user_id,
+            start=start,
+            end=end,
+            type_counts={}
+        )
+
+
+# 进程内共享的会话存储
+session_store = BehaviorSessionStore()
@@ -0,0 +1,374 @@
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from typing import Dict, List, Optional
+from uuid import uuid4
+import math
+import time
+import numpy as np
+from app.core.concurrency import KeyedDebouncer
+from app.core.config import settings
+from app.models.user_behavior import UserBehavior
+from app.services.behavior_transitions import behavior_type_key
+
+# HyperLogLog寄存器数为2^HLL_PRECISION，相对标准误差约1.04/sqrt(2^HLL_PRECISION)
+HLL_PRECISION = 12
+# Count-Min的宽度和行数：高估不超过e/宽度·总次数的概率为1-e^(-行数)
+CMS_WIDTH = 1024
+CMS_DEPTH = 4
+# 每小时保留的高频功能候选数
+HEAVY_HITTERS = 50
+# t-digest压缩参数，越大越精确、质心越多
+TDIGEST_COMPRESSION = 100
+
+
+def _hash64(value: str) -> int:
+    """跨进程稳定的64位哈希（内置hash在不同进程中不同，不能用于可合并的草图）"""
+    return int.from_bytes(blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """去重计数草图，合并即逐寄存器取最大值"""
+
+    def __init__(self, registers: Optional[np.ndarray] = None):
+        self.registers = registers if registers is not None else np.zeros(1 << HLL_PRECISION, dtype=np.uint8)
+
+    def add_hash(self, hashed: int):
+        index = hashed >> (64 - HLL_PRECISION)
+        rest = hashed & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # 小基数时用线性计数修正
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(np.frombuffer(data, dtype=np.uint8).copy())
+
+
+class CountMinSketch:
+    """
+    频次草图及高频候选
+
+    候选表保留估计次数最高的HEAVY_HITTERS个键；合并时计数表逐项相加，
+    候选取两边并集并按合并后的计数表重新估计
+    """
+
+    def __init__(self, table: Optional[np.ndarray] = None, candidates: Optional[Dict[str, int]] = None):
+        self.table = table if table is not None else np.zeros((CMS_DEPTH, CMS_WIDTH), dtype=np.int64)
+        self.candidates = candidates if candidates is not None else {}
+
+    def _columns(self, key: str) -> List[int]:
+        digest = blake2b(key.encode("utf-8"), digest_size=4 * CMS_DEPTH).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], "little") % CMS_WIDTH for row in range(CMS_DEPTH)]
+
+    def estimate(self, key: str) -> int:
+        return int(min(self.table[row, column] for row, column in enumerate(self._columns(key))))
+
+    def add(self, key: str):
+        columns = self._columns(key)
+        for row, column in enumerate(columns):
+            self.table[row, column] += 1
+        self._offer(key, int(min(self.table[row, column] for row, column in enumerate(columns))))
+
+    def merge(self, other: "CountMinSketch"):
+        self.table += other.table
+        keys = set(self.candidates) | set(other.candidates)
+        self.candidates = {}
+        for key in keys:
+            self._offer(key, self.estimate(key))
+
+    def top(self, k: int) -> List[Dict]:
+        ranked = sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [{"feature": key, "count": count} for key, count in ranked]
+
+    def _offer(self, key: str, count: int):
+        if key in self.candidates or len(self.candidates) < HEAVY_HITTERS:
+            self.candidates[key] = count
+            return
+        smallest = min(self.candidates, key=self.candidates.get)
+        if count > self.candidates[smallest]:
+            del self.candidates[smallest]
+            self.candidates[key] = count
+
+
+class TDigest:
+    """
+    分位数草图（合并式t-digest，k1尺度函数）
+
+    新数据先进入缓冲区，缓冲区满或查询时与现有质心一起排序压缩；
+    两端的质心更小，因此尾部分位数（p99等）比中位数更精确
+    """
+
+    def __init__(self, means: Optional[List[float]] = None, weights: Optional[List[float]] = None):
+        self.means = np.array(means or [], dtype=np.float64)
+        self.weights = np.array(weights or [], dtype=np.float64)
+        self._buffer: List[float] = []
+        self._buffer_weights: List[float] = []
+
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append(value)
+        self._buffer_weights.append(weight)
+        if len(self._buffer) >= 5 * TDIGEST_COMPRESSION:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        other._compress()
+        self._buffer.extend(other.means.tolist())
+        self._buffer_weights.extend(other.weights.tolist())
+        self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        if not len(self.means):
+            return None
+        if len(self.means) == 1:
+            return float(self.means[0])
+        # 每个质心的权重集中在其累计权重的中点
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.weights.sum(), centers, self.means))
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        means = np.concatenate([self.means, self._buffer])
+        weights = np.concatenate([self.weights, self._buffer_weights])
+        self._buffer, self._buffer_weights = [], []
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+
+        def scale(q: float) -> float:
+            return TDIGEST_COMPRESSION / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+        merged_means, merged_weights = [means[0]], [weights[0]]
+        cumulative = 0.0
+        limit = scale(0.0)
+        for mean, weight in zip(means[1:], weights[1:]):
+            # 合并后质心的尺度跨度不超过1时合并，否则开启新质心
+            if scale((cumulative + merged_weights[-1] + weight) / total) - limit <= 1:
+                merged_weights[-1] += weight
+                merged_means[-1] += (mean - merged_means[-1]) * weight / merged_weights[-1]
+            else:
+                cumulative += merged_weights[-1]
+                limit = scale(cumulative / total)
+                merged_means.append(mean)
+                merged_weights.append(weight)
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+
+
+class HourlySketch:
+    """一个小时内行为的草图：活跃用户、各行为类型的活跃用户、高频功能和持续时间分布"""
+
+    def __init__(self):
+        self.events = 0
+        self.users = HyperLogLog()
+        self.type_users: Dict[str, HyperLogLog] = {}
+        self.features = CountMinSketch()
+        self.durations = TDigest()
+
+    def add(self, behavior: UserBehavior):
+        hashed = _hash64(behavior.user_id)
+        behavior_type = behavior_type_key(behavior)
+        self.events += 1
+        self.users.add_hash(hashed)
+        self.type_users.setdefault(behavior_type, HyperLogLog()).add_hash(hashed)
+        self.features.add(feature_key(behavior))
+        if behavior.duration is not None:
+            self.durations.add(float(behavior.duration))
+
+    def merge(self, other: "HourlySketch"):
+        self.events += other.events
+        self.users.merge(other.users)
+        for behavior_type, users in other.type_users.items():
+            self.type_users.setdefault(behavior_type, HyperLogLog()).merge(users)
+        self.features.merge(other.features)
+        self.durations.merge(other.durations)
+
+    def to_document(self) -> Dict:
+        self.durations._compress()
+        return {
+            "events": self.events,
+            "users": self.users.to_bytes(),
+            "type_users": {key: value.to_bytes() for key, value in self.type_users.items()},
+            "feature_table": self.features.table.tobytes(),
+            # 功能名可能含有"."，以列表形式保存
+            "feature_candidates": [[key, count] for key, count in self.features.candidates.items()],
+            "duration_means": self.durations.means.tolist(),
+            "duration_weights": self.durations.weights.tolist()
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict) -> "HourlySketch":
+        sketch = cls()
+        sketch.events = document["events"]
+        sketch.users = HyperLogLog.from_bytes(document["users"])
+        sketch.type_users = {
+            key: HyperLogLog.from_bytes(value) for key, value in document["type_users"].items()
+        }
+        sketch.features = CountMinSketch(
+            np.frombuffer(document["feature_table"], dtype=np.int64).reshape(CMS_DEPTH, CMS_WIDTH).copy(),
+            {key: count for key, count in document["feature_candidates"]}
+        )
+        sketch.durations = TDigest(document["duration_means"], document["duration_weights"])
+        return sketch
+
+
+def feature_key(behavior: UserBehavior) -> str:
+    """功能标识：上下文中的feature，缺失时为行为类型"""
+    feature = (behavior.context or {}).get("feature")
+    return str(feature) if feature else behavior_type_key(behavior)
+
+
+def error_bounds() -> Dict:
+    """各草图的误差界"""
+    return {
+        "distinct_users_relative_std_error": round(1.04 / math.sqrt(1 << HLL_PRECISION), 4),
+        "feature_count_overestimate": (
+            f"每个计数最多高估 {round(math.e / CMS_WIDTH, 5)} × 区间总行为数，"
+            f"置信度 {round(1 - math.exp(-CMS_DEPTH), 4)}；从不低估"
+        ),
+        "duration_quantile_rank_error": (
+            f"中位数附近的排名误差约 {round(1 / TDIGEST_COMPRESSION, 3)}，越接近两端越小"
+        )
+    }
+
+
+class BehaviorSketchStore:
+    """
+    全体用户行为的流式草图
+
+    记录行为时更新本进程内对应小时的草图，合并窗口结束后写入behavior_sketches集合。
+    每份内存草图对应一个文档（sketch_id），不同进程、不同时期的草图互不覆盖，
+    查询时把区间内的所有文档合并，因此多个工作进程的结果可以直接相加。
+    """
+
+    def __init__(self):
+        self._hours: Dict[datetime, HourlySketch] = {}
+        self._sketch_ids: Dict[datetime, str] = {}
+        self._dirty = set()
+        self._debouncer = KeyedDebouncer(
+            delay_seconds=settings.BEHAVIOR_SKETCH_FLUSH_SECONDS,
+            name="behavior_sketch"
+        )
+        self._metrics = {"recorded": 0, "flushes": 0, "documents_written": 0, "last_flush_ms": None}
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].behavior_sketches
+
+    def record(self, behavior: UserBehavior):
+        """把一条行为计入所在小时的草图，并安排写入"""
+        hour = behavior.timestamp.replace(minute=0, second=0, microsecond=0)
+        if hour not in self._hours:
+            self._hours[hour] = HourlySketch()
+            self._sketch_ids[hour] = uuid4().hex
+        self._hours[hour].add(behavior)
+        self._dirty.add(hour)
+        self._metrics["recorded"] += 1
+        self._debouncer.schedule("flush", self.flush)
+
+    async def flush(self):
+        """写入有变化的草图，并从内存中移除超过BEHAVIOR_SKETCH_RETAIN_HOURS的小时"""
+        started = time.monotonic()
+        dirty, self._dirty = self._dirty, set()
+        # 先在同步代码中序列化，写入期间新到的行为不影响本次写入的内容
+        documents = [
+            (self._sketch_ids[hour], {"sketch_id": self._sketch_ids[hour], "hour": hour,
+                                      **self._hours[hour].to_document()})
+            for hour in dirty
+        ]
+        collection = self._get_collection()
+        try:
+            for sketch_id, document in documents:
+                await collection.replace_one({"sketch_id": sketch_id}, document, upsert=True)
+        except Exception:
+            self._dirty |= dirty
+            raise
+
+        cutoff = datetime.utcnow() - timedelta(hours=settings.BEHAVIOR_SKETCH_RETAIN_HOURS)
+        for hour in [hour for hour in self._hours if hour < cutoff and hour not in self._dirty]:
+            # 之后这一小时再有行为时使用新的sketch_id，已写入的文档保持不变
+            del self._hours[hour]
+            del self._sketch_ids[hour]
+
+        self._metrics["flushes"] += 1
+        self._metrics["documents_written"] += len(documents)
+        self._metrics["last_flush_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+    async def report(self, start: datetime, end: datetime, top_k: int = 10) -> Dict:
+        """
+        [start, end)内的人口级统计：每小时和整个区间的活跃用户数（总体及按行为类型）、
+        高频功能和持续时间分位数
+        """
+        self._debouncer.cancel("flush")
+        await self.flush()
+
+        hourly: Dict[datetime, HourlySketch] = {}
+        cursor = self._get_collection().find({"hour": {"$gte": start, "$lt": end}}, {"_id": 0})
+        async for document in cursor:
+            sketch = HourlySketch.from_document(document)
+            if document["hour"] in hourly:
+                hourly[document["hour"]].merge(sketch)
+            else:
+                hourly[document["hour"]] = sketch
+
+        total = HourlySketch()
+        for sketch in hourly.values():
+            total.merge(sketch)
+
+        return {
+            "start": start,
+            "end": end,
+            "events": total.events,
+            "distinct_users": total.users.count(),
+            "distinct_users_by_type": {
+                key: users.count() for key, users in sorted(total.type_users.items())
+            },
+            "top_features": total.features.top(top_k),
+            "duration_quantiles": {
+                name: total.durations.quantile(q)
+                for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+            },
+            "hourly": [
+                {
+                    "hour": hour,
+                    "events": sketch.events,
+                    "distinct_users": sketch.users.count(),
+                    "distinct_users_by_type": {
+                        key: users.count() for key, users in sorted(sketch.type_users.items())
+                    }
+                }
+                for hour, sketch in sorted(hourly.items())
+            ],
+            "error_bounds": error_bounds()
+        }
+
+    def get_metrics(self) -> Dict:
+        return {
+            "hours_in_memory": len(self._hours),
+            "dirty_hours": len(self._dirty),
+            **self._metrics,
+            "debouncer": self._debouncer.get_metrics()
+        }
+
+
+# 进程内共享的行为草图
+sketch_store = BehaviorSketchStore()
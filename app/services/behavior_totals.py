@@ -0,0 +1,37 @@
+from typing import Dict, List, Optional
+from app.models.user_behavior import BehaviorTotals, UserBehavior
+from app.services.behavior_transitions import behavior_type_key
+
+
+def update_totals(totals: Optional[BehaviorTotals], history: List[UserBehavior]) -> BehaviorTotals:
+    """
+    把行为历史中尚未计入的记录加入按小时、星期和类型的累计次数
+
+    累计次数覆盖用户的全部行为（包括已归档的），每日/每周模式、活跃时间段和
+    最常用功能都由它得出；缺失时（旧数据）从当前行为历史建立
+    """
+    if totals is None or totals.record_count > len(history):
+        totals = BehaviorTotals()
+
+    for behavior in history[totals.record_count:]:
+        _increment(totals.hour_counts, str(behavior.timestamp.hour))
+        _increment(totals.weekday_counts, str(behavior.timestamp.weekday()))
+        _increment(totals.type_counts, behavior_type_key(behavior))
+        totals.record_count += 1
+    return totals
+
+
+def top_hours(totals: BehaviorTotals, limit: int = 3) -> List[int]:
+    """行为最多的几个小时"""
+    ranked = sorted(totals.hour_counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [int(hour) for hour, _ in ranked]
+
+
+def top_types(totals: BehaviorTotals, limit: int = 5) -> List[str]:
+    """次数最多的几种行为"""
+    ranked = sorted(totals.type_counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [behavior_type for behavior_type, _ in ranked]
+
+
+def _increment(counts: Dict[str, int], key: str):
+    counts[key] = counts.get(key, 0) + 1
@@ -0,0 +1,142 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from app.models.user_behavior import BehaviorTransitionModel, BehaviorType, UserBehavior
+
+# 行为类型编码表：编码即BehaviorType中的定义顺序
+BEHAVIOR_TYPES: List[str] = [behavior_type.value for behavior_type in BehaviorType]
+BEHAVIOR_CODES: Dict[str, int] = {behavior_type: code for code, behavior_type in enumerate(BEHAVIOR_TYPES)}
+
+# 衰减权重的指数超过该值时整体缩放计数并移动基准时间，避免浮点溢出
+RESCALE_EXPONENT = 50.0
+
+
+def update_transition_model(model: Optional[BehaviorTransitionModel], history: List[UserBehavior],
+                            half_life_hours: Optional[float]) -> BehaviorTransitionModel:
+    """
+    把行为历史中尚未计入的记录加入转移模型
+
+    按时间顺序到达的记录每条O(1)更新；模型缺失、衰减配置变化或出现乱序记录时从完整历史重建
+    """
+    if needs_rebuild(model, history, half_life_hours):
+        return build_transition_model(history, half_life_hours)
+
+    for behavior in history[model.record_count:]:
+        _add_behavior(model, behavior)
+    return model
+
+
+def needs_rebuild(model: Optional[BehaviorTransitionModel], history: List[UserBehavior],
+                  half_life_hours: Optional[float]) -> bool:
+    """转移模型是否无法增量更新（模型缺失、衰减配置变化、与历史不一致或新记录乱序）"""
+    if (model is None or model.half_life_hours != half_life_hours
+            or len(model.counts) != len(BEHAVIOR_TYPES) or model.record_count > len(history)):
+        return True
+
+    last_timestamp = model.last_timestamp
+    for behavior in history[model.record_count:]:
+        if last_timestamp is not None and behavior.timestamp < last_timestamp:
+            return True
+        last_timestamp = behavior.timestamp
+    return False
+
+
+def build_transition_model(history: List[UserBehavior],
+                           half_life_hours: Optional[float]) -> BehaviorTransitionModel:
+    """按时间顺序从完整行为历史构建转移模型"""
+    size = len(BEHAVIOR_TYPES)
+    model = BehaviorTransitionModel(
+        half_life_hours=half_life_hours,
+        counts=[[0.0] * size for _ in range(size)]
+    )
+    for behavior in sorted(history, key=lambda b: b.timestamp):
+        _add_behavior(model, behavior)
+    return model
+
+
+def transition_probabilities(model: BehaviorTransitionModel) -> np.ndarray:
+    """按行归一化的转移概率矩阵；没有出现过的前一行为对应全零行"""
+    counts = np.asarray(model.counts, dtype=np.float64).reshape(len(BEHAVIOR_TYPES), len(BEHAVIOR_TYPES))
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+def sequence_summary(model: BehaviorTransitionModel) -> List[Dict]:
+    """出现过的行为转移及其概率，按前一行为分组、概率从高到低排列（最多13×13项）"""
+    probabilities = transition_probabilities(model)
+    summary = []
+    for from_code in range(len(BEHAVIOR_TYPES)):
+        row = probabilities[from_code]
+        for to_code in np.argsort(-row, kind="stable"):
+            if row[to_code] <= 0:
+                break
+            summary.append({
+                "from": BEHAVIOR_TYPES[from_code],
+                "to": BEHAVIOR_TYPES[to_code],
+                "probability": round(float(row[to_code]), 4)
+            })
+    return summary
+
+
+def predict_next(model: BehaviorTransitionModel, current: Optional[str] = None,
+                 top_k: int = 3) -> List[Dict]:
+    """
+    预测下一个行为
+
+    current为空时使用最后一条行为；当前行为之后从未出现过转移时，
+    退回到所有转移中各行为作为后一行为的总体分布
+    """
+    current = current or model.last_type
+    if current is None or not model.counts:
+        return []
+
+    counts = np.asarray(model.counts, dtype=np.float64)
+    row = counts[BEHAVIOR_CODES[current]]
+    if row.sum() <= 0:
+        row = counts.sum(axis=0)
+    total = row.sum()
+    if total <= 0:
+        return []
+
+    probabilities = row / total
+    return [
+        {"behavior_type": BEHAVIOR_TYPES[code], "probability": round(float(probabilities[code]), 4)}
+        for code in np.argsort(-probabilities, kind="stable")[:top_k]
+        if probabilities[code] > 0
+    ]
+
+
+def _add_behavior(model: BehaviorTransitionModel, behavior: UserBehavior):
+    behavior_type = behavior_type_key(behavior)
+    if model.last_type is not None:
+        weight = _decay_weight(model, behavior.timestamp)
+        model.counts[BEHAVIOR_CODES[model.last_type]][BEHAVIOR_CODES[behavior_type]] += weight
+    model.last_type = behavior_type
+    model.last_timestamp = behavior.timestamp
+    model.record_count += 1
+
+
+def _decay_weight(model: BehaviorTransitionModel, timestamp: datetime) -> float:
+    """
+    时间衰减权重
+
+    新转移的权重为2^((t - 基准时间) / 半衰期)，旧计数保持不变，相当于旧转移随时间减半；
+    概率按行归一化，只与权重的相对大小有关
+    """
+    if model.half_life_hours is None:
+        return 1.0
+    if model.reference_time is None:
+        model.reference_time = timestamp
+    exponent = (timestamp - model.reference_time).total_seconds() / 3600 / model.half_life_hours
+    if exponent > RESCALE_EXPONENT:
+        scale = 2.0 ** -exponent
+        model.counts = [[count * scale for count in row] for row in model.counts]
+        model.reference_time = timestamp
+        exponent = 0.0
+    return 2.0 ** exponent
+
+
+def behavior_type_key(behavior: UserBehavior) -> str:
+    """行为类型的字符串值（行为类型可能是枚举或字符串）"""
+    behavior_type = behavior.behavior_type
+    return behavior_type.value if hasattr(behavior_type, "value") else str(behavior_type)
@@ -0,0 +1,167 @@
+from typing import Dict, List, Optional
+import asyncio
+from app.core.concurrency import gather_sections
+from app.core.config import settings
+from app.models.alert import Alert
+from app.services.alert_service import AlertService
+from app.services.social_emotion_service import SocialEmotionService
+from app.services.user_behavior_service import UserBehaviorService
+from app.services.user_profile_service import UserProfileService
+
+
+class ComprehensiveProfileService:
+    """
+    综合用户画像聚合
+
+    基础画像、社交、预警和行为各部分互不依赖，并发获取且各自限时；
+    某一部分超时或出错时返回其余部分，并在sections中标明各部分状态。
+    """
+
+    def __init__(self, user_profile_service: UserProfileService,
+                 social_emotion_service: SocialEmotionService,
+                 alert_service: AlertService,
+                 user_behavior_service: UserBehaviorService):
+        self.user_profile_service = user_profile_service
+        self.social_emotion_service = social_emotion_service
+        self.alert_service = alert_service
+        self.user_behavior_service = user_behavior_service
+
+    async def get_comprehensive_profile(self, user_id: str) -> Dict:
+        timeout = settings.COMPREHENSIVE_SECTION_TIMEOUT_SECONDS
+
+        # 社交分析和社交洞察共用同一次最近互动记录查询
+        recent_social = asyncio.ensure_future(
+            self.social_emotion_service._get_recent_interactions(user_id)
+        )
+        try:
+            results, statuses = await gather_sections({
+                "profile": self.user_profile_service._get_user_profile(user_id),
+                "social_analysis": self._social_analysis(user_id, recent_social),
+                "social_insights": self._social_insights(user_id, recent_social),
+                "alerts": self.alert_service.get_user_alerts(user_id),
+                "behavior": self._behavior_profile(user_id)
+            }, timeout)
+        finally:
+            if not recent_social.done():
+                recent_social.cancel()
+
+        if "profile" not in results:
+            raise RuntimeError(f"获取用户画像失败: {statuses['profile'].get('error')}")
+        profile = results["profile"]
+
+        profile.social_profile = self._build_social_profile(
+            results.get("social_analysis"), results.get("social_insights")
+        )
+        profile.risk_profile = self._build_risk_profile(results.get("alerts"), profile.social_profile)
+        profile.behavior_profile = results.get("behavior")
+
+        # 推荐依赖前面各部分的结果，缺失的部分不放入上下文
+        context = {}
+        if profile.social_profile and "social_emotion_score" in profile.social_profile:
+            context["social_score"] = profile.social_profile["social_emotion_score"]
+        if profile.risk_profile:
+            context["risk_level"] = profile.risk_profile["alert_level"]
+        if profile.behavior_profile:
+            context["active_hours"] = profile.behavior_profile["active_hours"]
+
+        recommendation_results, recommendation_statuses = await gather_sections({
+            "recommendations": self.user_profile_service.generate_recommendations(user_id, context, profile)
+        }, timeout)
+        statuses.update(recommendation_statuses)
+        recommendations = recommendation_results.get("recommendations")
+
+        return {
+            "user_id": profile.user_id,
+            "basic_info": {
+                "age": 28,  # 假设数据
+                "gender": "male",  # 假设数据
+                "occupation": "软件工程师",  # 假设数据
+                "location": "北京"  # 假设数据
+            },
+            "emotional_profile": {
+                "current_emotion": profile.current_emotion.emotion_type if profile.current_emotion else "neutral",
+                "emotion_stability": profile.emotional_stability,
+                "dominant_emotions": profile.emotion_pattern.triggers,
+                "emotion_trend": profile.emotion_pattern.daily_pattern
+            },
+            "social_profile": profile.social_profile,
+            "behavior_profile": profile.behavior_profile,
+            "risk_profile": profile.risk_profile,
+            "recommendations": {
+                "emotional_health": [r.content for r in recommendations if r.type == "emotional"],
+                "social_health": [r.content for r in recommendations if r.type == "social"],
+                "behavior_improvement": [r.content for r in recommendations if r.type == "behavior"],
+                "risk_prevention": [r.content for r in recommendations if r.type == "risk"]
+            } if recommendations is not None else None,
+            "sections": statuses,
+            "last_updated": profile.last_updated
+        }
+
+    async def _behavior_profile(self, user_id: str) -> Dict:
+        # 在限时部分内完成字段映射，映射出错时只影响行为部分
+        behavior = await self.user_behavior_service._get_user_behavior_profile(user_id)
+        return {
+            "active_hours": behavior.behavior_insight.active_hours,
+            "preferred_activities": behavior.behavior_insight.favorite_features,
+            "interaction_patterns": behavior.behavior_pattern.interaction_graph
+        }
+
+    async def _social_analysis(self, user_id: str, recent_social: asyncio.Future):
+        # shield：一个部分超时被取消时不影响另一部分继续等待共享查询
+        records = await asyncio.shield(recent_social)
+        return await self.social_emotion_service.analyze_social_emotion(user_id, records)
+
+    async def _social_insights(self, user_id: str, recent_social: asyncio.Future):
+        records = await asyncio.shield(recent_social)
+        return await self.social_emotion_service.get_social_emotion_insights(user_id, records)
+
+    def _build_social_profile(self, analysis, insights) -> Optional[Dict]:
+        if analysis is None and insights is None:
+            return None
+
+        social_profile = {}
+        if analysis is not None:
+            social_profile.update({
+                "social_emotion_score": analysis.social_emotion_score,
+                "social_engagement": analysis.social_engagement,
+                "social_network_size": analysis.social_network_size,
+                "interaction_patterns": analysis.interaction_patterns,
+                "emotional_contagion": analysis.emotional_contagion
+            })
+        if insights is not None:
+            social_profile.update({
+                "social_support": insights.social_support,
+                "social_stress": insights.social_stress,
+                "relationship_quality": insights.relationship_quality
+            })
+        return social_profile
+
+    def _build_risk_profile(self, alerts: Optional[List[Alert]],
+                            social_profile: Optional[Dict]) -> Optional[Dict]:
+        if alerts is None:
+            return None
+
+        active_alerts = [alert for alert in alerts if alert.status == "active"]
+        protective_factors = []
+        social_support = (social_profile or {}).get("social_support")
+        if social_support is not None:
+            strong = social_support > 0.7
+            protective_factors.append({
+                "type": "strong_social_support" if strong else "moderate_social_support",
+                "level": "high" if strong else "medium",
+                "description": "有良好的社交支持网络" if strong else "有一定的社交支持网络"
+            })
+
+        return {
+            "alert_level": self.alert_service.calculate_user_risk_level(alerts),
+            "active_alerts": len(active_alerts),
+            "risk_factors": [
+                {
+                    "type": alert.rule_id,
+                    "level": alert.level,
+                    "description": alert.message
+                }
+                for alert in active_alerts
+            ],
+            "protective_factors": protective_factors
+        }
@@ -0,0 +1,40 @@
+from typing import Any, Dict
+import numpy as np
+from app.core.concurrency import CpuExecutor
+from app.core.config import settings
+from app.models.user_profile import UserProfile
+
+# 画像中由情绪历史计算得出的字段
+DERIVED_PROFILE_FIELDS = [
+    "emotion_pattern", "personality", "interests", "emotional_stability",
+    "accumulators", "trigger_index", "keyword_index", "staleness"
+]
+
+# 子进程内复用的服务实例
+_profile_service = None
+
+
+def recompute_profile_sections(profile: UserProfile) -> Dict[str, Any]:
+    """在子进程中重新计算画像的派生数据，返回DERIVED_PROFILE_FIELDS中各字段的新值"""
+    global _profile_service
+    if _profile_service is None:
+        from app.services.user_profile_service import UserProfileService
+        _profile_service = UserProfileService()
+
+    _profile_service._recompute_derived_sections(profile)
+    return {field: getattr(profile, field) for field in DERIVED_PROFILE_FIELDS}
+
+
+def cluster_behaviors(features: np.ndarray, n_clusters: int) -> np.ndarray:
+    """对行为特征矩阵做KMeans聚类，返回每个样本的簇编号（每次新建估计器，调用之间互不影响）"""
+    from sklearn.cluster import KMeans
+
+    return KMeans(n_clusters=n_clusters).fit_predict(features)
+
+
+# 服务内共享的CPU任务执行器
+cpu_executor = CpuExecutor(
+    max_workers=settings.CPU_EXECUTOR_WORKERS,
+    max_concurrent=settings.CPU_EXECUTOR_MAX_CONCURRENT_TASKS,
+    name="cpu"
+)
@@ -0,0 +1,237 @@
+from typing import Dict, List, Optional
+import math
+import numpy as np
+from app.models.user_profile import (
+    EmotionAccumulators, EmotionStatsBucket, EmotionType, UserEmotionRecord
+)
+
+# 一天中的时间段划分（小时，闭区间；night跨越午夜）
+TIME_PERIODS = {
+    "morning": (5, 11),    # 5:00-11:59
+    "afternoon": (12, 17), # 12:00-17:59
+    "evening": (18, 22),   # 18:00-22:59
+    "night": (23, 4)       # 23:00-4:59
+}
+
+WEEKDAY_NAMES = {
+    0: "monday",
+    1: "tuesday",
+    2: "wednesday",
+    3: "thursday",
+    4: "friday",
+    5: "saturday",
+    6: "sunday"
+}
+
+# 时间段模式中统计的积极/消极情绪
+PATTERN_POSITIVE_EMOTIONS = ["happy", "excited", "content"]
+PATTERN_NEGATIVE_EMOTIONS = ["sad", "angry", "anxious"]
+
+# 性格和应对策略分析中视为负面的情绪
+NEGATIVE_EMOTIONS = ["sad", "angry", "anxious", "fear", "frustrated", "stressed"]
+
+# 社交情境关键词
+SOCIAL_CONTEXT_KEYWORDS = ["社交", "朋友", "聚会", "交流", "聊天", "群组", "团队", "会议"]
+
+# 计算情绪稳定性使用的最近记录数
+STABILITY_WINDOW = 30
+
+
+def period_of(hour: int) -> str:
+    """小时所属的时间段"""
+    for period, (start, end) in TIME_PERIODS.items():
+        if start <= end:
+            if start <= hour <= end:
+                return period
+        elif hour >= start or hour <= end:
+            return period
+    return "night"
+
+
+def is_social_context(context: str) -> bool:
+    return any(keyword in context for keyword in SOCIAL_CONTEXT_KEYWORDS)
+
+
+def build_accumulators(records: List[UserEmotionRecord]) -> EmotionAccumulators:
+    """从完整情绪历史构建累加状态"""
+    accumulators = EmotionAccumulators()
+    for record in records:
+        apply_record(accumulators, record)
+    if accumulators.changes_dirty:
+        resync_emotion_changes(accumulators, records)
+    return accumulators
+
+
+def apply_record(accumulators: EmotionAccumulators, record: UserEmotionRecord):
+    """把一条新情绪记录累加到状态中，耗时与历史长度无关"""
+    sequence = accumulators.record_count
+    accumulators.record_count += 1
+
+    emotion = _emotion_value(record.emotion_type)
+    intensity = record.intensity
+
+    # 情绪稳定性窗口
+    accumulators.stability_window.append(intensity)
+    if len(accumulators.stability_window) > STABILITY_WINDOW:
+        del accumulators.stability_window[0]
+
+    # 时间段和星期分桶
+    _add_to_bucket(accumulators.daily_buckets, period_of(record.timestamp.hour), emotion, intensity, sequence)
+    _add_to_bucket(accumulators.weekly_buckets, str(record.timestamp.weekday()), emotion, intensity, sequence)
+
+    # 社交情境
+    if record.context and is_social_context(record.context):
+        accumulators.social_count += 1
+        accumulators.social_intensity_sum += intensity
+
+    # 按时间顺序的情绪变化次数；乱序到达的记录只做标记，由resync_emotion_changes重新计算
+    if accumulators.last_timestamp is None or record.timestamp >= accumulators.last_timestamp:
+        if accumulators.last_emotion is not None and emotion != accumulators.last_emotion:
+            accumulators.emotion_changes += 1
+        accumulators.last_timestamp = record.timestamp
+        accumulators.last_emotion = emotion
+    else:
+        accumulators.changes_dirty = True
+
+
+def resync_emotion_changes(accumulators: EmotionAccumulators, records: List[UserEmotionRecord]):
+    """从完整历史重新计算情绪变化次数（仅在出现乱序记录时调用）"""
+    sorted_history = sorted(records, key=lambda x: x.timestamp)
+    accumulators.emotion_changes = sum(
+        1 for i in range(len(sorted_history) - 1)
+        if sorted_history[i].emotion_type != sorted_history[i + 1].emotion_type
+    )
+    if sorted_history:
+        accumulators.last_timestamp = sorted_history[-1].timestamp
+        accumulators.last_emotion = _emotion_value(sorted_history[-1].emotion_type)
+    accumulators.changes_dirty = False
+
+
+def daily_pattern(accumulators: EmotionAccumulators) -> Dict[str, float]:
+    """由累加状态得到每日情绪模式，格式与_analyze_daily_pattern一致"""
+    result = {}
+    for period in TIME_PERIODS:
+        bucket = accumulators.daily_buckets.get(period)
+        if bucket is None or bucket.count == 0:
+            continue
+
+        positive_count, positive_sum = _emotion_totals(bucket, PATTERN_POSITIVE_EMOTIONS)
+        negative_count, negative_sum = _emotion_totals(bucket, PATTERN_NEGATIVE_EMOTIONS)
+        if positive_count:
+            result[f"{period}_positive"] = positive_sum / positive_count
+        if negative_count:
+            result[f"{period}_negative"] = negative_sum / negative_count
+
+        dominant, _ = _dominant_emotion(bucket)
+        result[f"{period}_dominant"] = EmotionType(dominant)
+
+    return result
+
+
+def weekly_pattern(accumulators: EmotionAccumulators) -> Dict[str, float]:
+    """由累加状态得到每周情绪模式，格式与_analyze_weekly_pattern一致"""
+    result = {}
+    for weekday, day in WEEKDAY_NAMES.items():
+        bucket = accumulators.weekly_buckets.get(str(weekday))
+        if bucket is None or bucket.count == 0:
+            continue
+
+        result[f"{day}_intensity"] = bucket.intensity_sum / bucket.count
+        if bucket.count > 1:
+            result[f"{day}_stability"] = 1 - min(_bucket_std(bucket), 1)
+
+        dominant, dominant_count = _dominant_emotion(bucket)
+        result[f"{day}_dominant"] = EmotionType(dominant)
+        result[f"{day}_dominant_frequency"] = dominant_count / bucket.count
+
+    # 识别情绪最佳和最差的日子
+    if result:
+        day_avg_intensities = {day: result.get(f"{day}_intensity", 0) for day in WEEKDAY_NAMES.values()}
+        result["best_day"] = max(day_avg_intensities.items(), key=lambda x: x[1])[0]
+        result["worst_day"] = min(day_avg_intensities.items(), key=lambda x: x[1])[0]
+
+    return result
+
+
+def emotional_stability(accumulators: EmotionAccumulators) -> float:
+    """由最近记录窗口计算情绪稳定性（窗口大小固定，计算量恒定）"""
+    if not accumulators.stability_window:
+        return 0.5
+    std = np.std(accumulators.stability_window)
+    return float(1 - min(std, 1))
+
+
+def personality_inputs(accumulators: EmotionAccumulators) -> Optional[Dict[str, float]]:
+    """性格分析所需的统计量；记录不足5条时返回None"""
+    total = accumulators.record_count
+    if total < 5:
+        return None
+
+    emotion_counts: Dict[str, int] = {}
+    intensity_sum = 0.0
+    intensity_sq_sum = 0.0
+    for bucket in accumulators.weekly_buckets.values():
+        intensity_sum += bucket.intensity_sum
+        intensity_sq_sum += bucket.intensity_sq_sum
+        for emotion, count in bucket.emotion_counts.items():
+            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + count
+
+    mean = intensity_sum / total
+    negative_count = sum(emotion_counts.get(e, 0) for e in NEGATIVE_EMOTIONS)
+    social_intensity = (
+        accumulators.social_intensity_sum / accumulators.social_count
+        if accumulators.social_count else 0.5
+    )
+
+    return {
+        "total_records": total,
+        "emotion_change_rate": accumulators.emotion_changes / (total - 1),
+        "emotion_variety": len(emotion_counts),
+        "std_intensity": math.sqrt(max(intensity_sq_sum / total - mean * mean, 0.0)),
+        "negative_ratio": negative_count / total,
+        "social_intensity": social_intensity,
+        "anger_ratio": emotion_counts.get("angry", 0) / total
+    }
+
+
+def _add_to_bucket(buckets: Dict[str, EmotionStatsBucket], key: str, emotion: str,
+                   intensity: float, sequence: int):
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = EmotionStatsBucket()
+        buckets[key] = bucket
+
+    bucket.count += 1
+    bucket.intensity_sum += intensity
+    bucket.intensity_sq_sum += intensity * intensity
+    bucket.emotion_counts[emotion] = bucket.emotion_counts.get(emotion, 0) + 1
+    bucket.emotion_intensity_sums[emotion] = bucket.emotion_intensity_sums.get(emotion, 0.0) + intensity
+    bucket.emotion_first_seen.setdefault(emotion, sequence)
+
+
+def _emotion_totals(bucket: EmotionStatsBucket, emotions: List[str]):
+    count = 0
+    total = 0.0
+    for emotion in emotions:
+        if emotion in bucket.emotion_counts:
+            count += bucket.emotion_counts[emotion]
+            total += bucket.emotion_intensity_sums[emotion]
+    return count, total
+
+
+def _dominant_emotion(bucket: EmotionStatsBucket):
+    """次数最多的情绪；次数相同时取最先出现的"""
+    emotion = min(
+        bucket.emotion_counts,
+        key=lambda e: (-bucket.emotion_counts[e], bucket.emotion_first_seen[e])
+    )
+    return emotion, bucket.emotion_counts[emotion]
+
+
+def _bucket_std(bucket: EmotionStatsBucket) -> float:
+    mean = bucket.intensity_sum / bucket.count
+    return math.sqrt(max(bucket.intensity_sq_sum / bucket.count - mean * mean, 0.0))
+
+
+def _emotion_value(emotion_type) -> str:
+    return emotion_type.value if isinstance(emotion_type, EmotionType) else str(emotion_type)
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Tuple
+import numpy as np
+from app.models.user_profile import EmotionType, UserEmotionRecord
+
+# 情绪类型编码表：编码即EmotionType中的定义顺序
+EMOTION_TYPES: List[EmotionType] = list(EmotionType)
+EMOTION_CODES: Dict[str, int] = {emotion.value: code for code, emotion in enumerate(EMOTION_TYPES)}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class EmotionColumns:
+    """
+    情绪历史的列式表示
+
+    每条记录拆成若干等长数组，分析函数直接在数组上做向量化计算，
+    上下文字符串按值驻留为整数ID，相同上下文只需处理一次。
+    """
+
+    def __init__(self, timestamps: np.ndarray, hours: np.ndarray, weekdays: np.ndarray,
+                 emotion_codes: np.ndarray, intensities: np.ndarray,
+                 context_ids: np.ndarray, contexts: List[str]):
+        self.timestamps = timestamps        # int64，距1970-01-01的微秒数
+        self.hours = hours                  # uint8，记录本地时间的小时
+        self.weekdays = weekdays            # uint8，0=周一
+        self.emotion_codes = emotion_codes  # uint8，见EMOTION_CODES
+        self.intensities = intensities      # float64
+        self.context_ids = context_ids      # int32，指向contexts
+        self.contexts = contexts            # 去重后的上下文字符串
+
+    @classmethod
+    def from_records(cls, records: List[UserEmotionRecord]) -> "EmotionColumns":
+        """从情绪记录列表构建列式表示（单次遍历）"""
+        count = len(records)
+        timestamps = np.empty(count, dtype=np.int64)
+        hours = np.empty(count, dtype=np.uint8)
+        weekdays = np.empty(count, dtype=np.uint8)
+        emotion_codes = np.empty(count, dtype=np.uint8)
+        intensities = np.empty(count, dtype=np.float64)
+        context_ids = np.empty(count, dtype=np.int32)
+
+        context_index: Dict[str, int] = {}
+        contexts: List[str] = []
+
+        for i, record in enumerate(records):
+            timestamp = record.timestamp
+            timestamps[i] = _to_micros(timestamp)
+            hours[i] = timestamp.hour
+            weekdays[i] = timestamp.weekday()
+            emotion_codes[i] = EMOTION_CODES[record.emotion_type]
+            intensities[i] = record.intensity
+
+            context = record.context or ""
+            context_id = context_index.get(context)
+            if context_id is None:
+                context_id = len(contexts)
+                context_index[context] = context_id
+                contexts.append(context)
+            context_ids[i] = context_id
+
+        return cls(timestamps, hours, weekdays, emotion_codes, intensities, context_ids, contexts)
+
+    def __len__(self) -> int:
+        return len(self.emotion_codes)
+
+    def emotion_mask(self, emotion_types: Iterable[str]) -> np.ndarray:
+        """情绪类型属于给定集合的记录掩码（不在EmotionType中的类型会被忽略）"""
+        codes = [EMOTION_CODES[e] for e in emotion_types if e in EMOTION_CODES]
+        return np.isin(self.emotion_codes, codes)
+
+    def context_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """上下文满足条件的记录掩码，每个不同的上下文只判断一次"""
+        flags = np.fromiter(
+            (bool(context) and predicate(context) for context in self.contexts),
+            dtype=bool,
+            count=len(self.contexts)
+        )
+        return flags[self.context_ids]
+
+    def chronological_order(self) -> np.ndarray:
+        """按时间排序的索引（稳定排序，与sorted(key=timestamp)一致）"""
+        return np.argsort(self.timestamps, kind="stable")
+
+
+def sequential_sum(values: np.ndarray) -> float:
+    """
+    按顺序逐个累加
+
+    与内置sum的累加顺序一致，保证结果与逐条记录计算的版本完全相同
+    （np.sum使用分块求和，末位可能不同）。
+    """
+    if len(values) == 0:
+        return 0
+    return float(np.add.accumulate(values)[-1])
+
+
+def dominant_code(codes: np.ndarray) -> Tuple[int, int]:
+    """
+    出现次数最多的编码及其次数
+
+    次数相同时取最先出现的编码，与Counter.most_common的结果一致。
+    """
+    unique_codes, first_index, counts = np.unique(codes, return_index=True, return_counts=True)
+    candidates = np.flatnonzero(counts == counts.max())
+    best = candidates[np.argmin(first_index[candidates])]
+    return int(unique_codes[best]), int(counts[best])
+
+
+def _to_micros(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = timestamp - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
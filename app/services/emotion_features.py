@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.models.user_profile import UserPersonality, UserProfile
+from app.services.emotion_columns import EMOTION_CODES
+
+# 预测特征名称，顺序即特征向量中的列顺序（训练和预测必须一致）
+FEATURE_NAMES = [
+    "time_sin", "time_cos",           # 时间特征
+    "recent_emotion_1", "recent_emotion_2", "recent_emotion_3",
+    "recent_emotion_4", "recent_emotion_5",  # 最近5次情绪强度（由旧到新）
+    "openness", "conscientiousness", "extraversion",
+    "agreeableness", "neuroticism",   # 性格特征
+    "time_of_day", "day_of_week", "weather_score"  # 上下文特征
+]
+
+# 特征分组，用于汇总影响因素
+FEATURE_GROUPS = {
+    "time_of_day": ["time_sin", "time_cos"],
+    "recent_emotions": [f"recent_emotion_{i}" for i in range(1, 6)],
+    "personality": ["openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"],
+    "context": ["time_of_day", "day_of_week", "weather_score"]
+}
+
+RECENT_WINDOW = 5
+DEFAULT_INTENSITY = 0.5
+
+# 随用户数据变化、写入特征库的部分（最近情绪和性格特征），其余特征在预测时计算
+_STORED_SLICE = slice(FEATURE_NAMES.index("recent_emotion_1"), FEATURE_NAMES.index("neuroticism") + 1)
+STORED_FEATURE_NAMES = FEATURE_NAMES[_STORED_SLICE]
+
+
+def feature_vector(hour: int, recent_intensities: Sequence[float],
+                   personality: Optional[UserPersonality], context: Dict) -> List[float]:
+    """
+    构建单个样本的特征向量
+
+    最近情绪不足5条时在前面补默认强度，保证特征维度固定
+    """
+    recent = list(recent_intensities[-RECENT_WINDOW:])
+    recent = [DEFAULT_INTENSITY] * (RECENT_WINDOW - len(recent)) + recent
+
+    if personality is not None:
+        traits = [
+            personality.openness,
+            personality.conscientiousness,
+            personality.extraversion,
+            personality.agreeableness,
+            personality.neuroticism
+        ]
+    else:
+        traits = [0.5] * 5
+
+    return [
+        float(np.sin(2 * np.pi * hour / 24)),
+        float(np.cos(2 * np.pi * hour / 24)),
+        *recent,
+        *traits,
+        context.get("time_of_day", 0.5),
+        context.get("day_of_week", 0.5),
+        context.get("weather_score", 0.5)
+    ]
+
+
+def stored_feature_vector(profile: UserProfile) -> np.ndarray:
+    """
+    用户相关的特征（最近情绪强度和性格特征），按STORED_FEATURE_NAMES排列的float32数组
+
+    时间和上下文特征在预测时由assemble_features补上
+    """
+    recent = [record.intensity for record in profile.emotion_history[-RECENT_WINDOW:]]
+    vector = feature_vector(0, recent, profile.personality, {})
+    return np.asarray(vector[_STORED_SLICE], dtype=np.float32)
+
+
+def assemble_features(stored: np.ndarray, context: Dict,
+                      now: Optional[datetime] = None) -> np.ndarray:
+    """
+    把多个用户的存储特征（每行一个用户）拼接上当前时间和上下文，得到完整的预测特征矩阵
+    """
+    now = now or datetime.utcnow()
+    count = len(stored)
+    features = np.empty((count, len(FEATURE_NAMES)), dtype=np.float64)
+    features[:, 0] = np.sin(2 * np.pi * now.hour / 24)
+    features[:, 1] = np.cos(2 * np.pi * now.hour / 24)
+    features[:, _STORED_SLICE] = stored
+    features[:, _STORED_SLICE.stop] = context.get("time_of_day", 0.5)
+    features[:, _STORED_SLICE.stop + 1] = context.get("day_of_week", 0.5)
+    features[:, _STORED_SLICE.stop + 2] = context.get("weather_score", 0.5)
+    return features
+
+
+def training_samples(profile: UserProfile) -> Tuple[List[List[float]], List[int]]:
+    """
+    从一个用户的情绪历史生成训练样本
+
+    每条记录（第一条除外）作为一个样本：特征取记录时刻之前的最近情绪，
+    上下文由记录时间推出（time_of_day为小时/24，day_of_week为星期/6），标签为该记录的情绪类型
+    """
+    history = sorted(profile.emotion_history, key=lambda x: x.timestamp)
+    intensities = [record.intensity for record in history]
+
+    features = []
+    labels = []
+    for i in range(1, len(history)):
+        record = history[i]
+        timestamp = record.timestamp
+        context = {
+            "time_of_day": timestamp.hour / 24,
+            "day_of_week": timestamp.weekday() / 6
+        }
+        features.append(feature_vector(
+            timestamp.hour,
+            intensities[max(0, i - RECENT_WINDOW):i],
+            profile.personality,
+            context
+        ))
+        labels.append(EMOTION_CODES[record.emotion_type])
+    return features, labels
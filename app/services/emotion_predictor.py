@@ -0,0 +1,161 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+import os
+import numpy as np
+from app.core.config import settings
+from app.models.user_profile import EmotionType
+from app.services.emotion_columns import EMOTION_TYPES
+from app.services.emotion_features import FEATURE_GROUPS, FEATURE_NAMES
+
+ARTIFACT_PREFIX = "emotion_predictor_"
+ARTIFACT_SUFFIX = ".joblib"
+LATEST_FILE = "LATEST"
+
+
+class ModelUnavailableError(Exception):
+    """情绪预测模型尚未训练或加载失败"""
+
+
+def artifact_path(model_dir: str, version: str) -> str:
+    return os.path.join(model_dir, f"{ARTIFACT_PREFIX}{version}{ARTIFACT_SUFFIX}")
+
+
+def save_artifact(model_dir: str, scaler, classifier, metadata: Dict) -> str:
+    """
+    保存一个新版本的模型文件，并把LATEST指向它
+
+    以不压缩的joblib格式保存，加载时模型中的数组可以直接内存映射
+    """
+    import joblib
+
+    version = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(model_dir, exist_ok=True)
+    path = artifact_path(model_dir, version)
+    joblib.dump({
+        "version": version,
+        "feature_names": FEATURE_NAMES,
+        "scaler": scaler,
+        "classifier": classifier,
+        "metadata": metadata
+    }, path)
+
+    # 先写临时文件再替换，避免服务读到写了一半的版本号
+    latest_tmp = os.path.join(model_dir, f".{LATEST_FILE}.tmp")
+    with open(latest_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(latest_tmp, os.path.join(model_dir, LATEST_FILE))
+    return path
+
+
+class EmotionPredictor:
+    """
+    离线训练的情绪预测模型
+
+    进程启动时加载一次，模型文件中的数组以只读方式内存映射，加载时不再整体读入内存
+    （决策树的节点数组在反序列化时仍由scikit-learn复制）；
+    预测时对整批样本做一次标准化和一次predict_proba。
+    """
+
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.metadata: Dict = {}
+        self._scaler = None
+        self._classifier = None
+        self._emotions: List[EmotionType] = []
+        self._factors: Dict[str, float] = {}
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._classifier is not None
+
+    def load(self, model_dir: Optional[str] = None, version: Optional[str] = None) -> bool:
+        """
+        加载模型；未指定版本时加载LATEST指向的版本
+
+        模型文件不存在时返回False，服务照常启动，预测接口返回不可用
+        """
+        import joblib
+
+        model_dir = model_dir or settings.EMOTION_MODEL_DIR
+        version = version or settings.EMOTION_MODEL_VERSION
+        if not version:
+            latest = os.path.join(model_dir, LATEST_FILE)
+            if not os.path.exists(latest):
+                return False
+            with open(latest, encoding="utf-8") as f:
+                version = f.read().strip()
+
+        path = artifact_path(model_dir, version)
+        if not os.path.exists(path):
+            return False
+
+        artifact = joblib.load(path, mmap_mode="r")
+        if artifact["feature_names"] != FEATURE_NAMES:
+            raise ValueError(f"模型 {version} 的特征与当前版本不一致，请重新训练")
+
+        classifier = artifact["classifier"]
+        self._scaler = artifact["scaler"]
+        self._classifier = classifier
+        self._emotions = [EMOTION_TYPES[int(code)] for code in classifier.classes_]
+        self._factors = self._grouped_factors(getattr(classifier, "feature_importances_", None))
+        self.version = artifact["version"]
+        self.metadata = artifact.get("metadata", {})
+        return True
+
+    def predict(self, features: np.ndarray) -> List[Dict]:
+        """
+        批量预测
+
+        features为(样本数, 特征数)矩阵，返回每个样本的预测情绪、置信度和影响因素
+        """
+        if not self.is_loaded:
+            raise ModelUnavailableError("情绪预测模型未加载，请先运行 python -m app.jobs.train_emotion_model")
+        if len(features) == 0:
+            return []
+
+        probabilities = self._classifier.predict_proba(self._scaler.transform(features))
+        best = np.argmax(probabilities, axis=1)
+        confidences = probabilities[np.arange(len(best)), best]
+
+        return [
+            {
+                "emotion": self._emotions[index],
+                "confidence": float(confidence),
+                "factors": dict(self._factors)
+            }
+            for index, confidence in zip(best, confidences)
+        ]
+
+    def get_info(self) -> Dict:
+        return {
+            "loaded": self.is_loaded,
+            "version": self.version,
+            "metadata": self.metadata
+        }
+
+    def _grouped_factors(self, importances) -> Dict[str, float]:
+        """按特征分组汇总特征重要性并归一化"""
+        if importances is None:
+            # 如果模型没有特征重要性，返回一个简化的版本
+            return {
+                "time_of_day": 0.2,
+                "recent_emotions": 0.3,
+                "personality": 0.2,
+                "context": 0.3
+            }
+
+        raw_factors = dict(zip(FEATURE_NAMES, (float(value) for value in importances)))
+        grouped = {
+            group: sum(raw_factors.get(name, 0.0) for name in names)
+            for group, names in FEATURE_GROUPS.items()
+        }
+        total_weight = sum(grouped.values())
+        if total_weight > 0:
+            normalized = {group: weight / total_weight for group, weight in grouped.items()}
+        else:
+            normalized = {group: 1.0 / len(grouped) for group in grouped}
+        return {group: round(weight, 2) for group, weight in normalized.items()}
+
+
+# 进程内共享的预测模型实例
+emotion_predictor = EmotionPredictor()
@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.cache import LRUTTLCache
+from app.core.config import settings
+from app.services.emotion_features import STORED_FEATURE_NAMES
+
+FEATURE_DTYPE = np.dtype("<f4")
+
+
+class FeatureStore:
+    """
+    用户预测特征库
+
+    每个用户一条定长float32向量（约40字节），存放在独立的user_features集合中，
+    情绪记录写入时更新；预测时只需读取这些向量，无需加载完整画像。
+    """
+
+    def __init__(self, cache_size: int = 100_000, ttl_seconds: float = 300.0):
+        self._cache = LRUTTLCache(max_size=cache_size, ttl_seconds=ttl_seconds)
+        self._metrics = {
+            "cache_hits": 0,
+            "db_reads": 0,
+            "writes": 0
+        }
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].user_features
+
+    async def put(self, user_id: str, vector: np.ndarray):
+        """写入一个用户的特征向量"""
+        vector = np.ascontiguousarray(vector, dtype=FEATURE_DTYPE)
+        await self._get_collection().update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "vector": vector.tobytes(),
+                "dimension": len(vector),
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        self._cache.set(user_id, vector)
+        self._metrics["writes"] += 1
+
+    async def put_many(self, vectors: Dict[str, np.ndarray]):
+        """批量写入多个用户的特征向量（一次bulk_write）"""
+        from pymongo import UpdateOne
+
+        if not vectors:
+            return
+        updated_at = datetime.utcnow()
+        operations = []
+        for user_id, vector in vectors.items():
+            vector = np.ascontiguousarray(vector, dtype=FEATURE_DTYPE)
+            operations.append(UpdateOne(
+                {"user_id": user_id},
+                {"$set": {
+                    "vector": vector.tobytes(),
+                    "dimension": len(vector),
+                    "updated_at": updated_at
+                }},
+                upsert=True
+            ))
+            self._cache.set(user_id, vector)
+        await self._get_collection().bulk_write(operations, ordered=False)
+        self._metrics["writes"] += len(operations)
+
+    def invalidate(self, user_id: str):
+        """丢弃进程内缓存的特征向量（其他进程写入了新特征时调用）"""
+        self._cache.delete(user_id)
+
+    async def get_many(self, user_ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        批量读取特征向量；优先读进程内缓存，其余一次查询取回
+
+        没有特征（或特征维度与当前版本不一致）的用户不在返回结果中
+        """
+        result: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        for user_id in user_ids:
+            vector = self._cache.get(user_id)
+            if vector is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = vector
+        self._metrics["cache_hits"] += len(result)
+
+        if missing:
+            cursor = self._get_collection().find(
+                {"user_id": {"$in": missing}},
+                {"_id": 0, "user_id": 1, "vector": 1}
+            )
+            async for document in cursor:
+                vector = _decode(document.get("vector"))
+                if vector is not None:
+                    result[document["user_id"]] = vector
+                    self._cache.set(document["user_id"], vector)
+            self._metrics["db_reads"] += len(missing)
+
+        return result
+
+    async def load_matrix(self, batch_size: int = 10_000) -> Tuple[List[str], np.ndarray]:
+        """
+        读取全部用户的特征，返回(用户ID列表, 特征矩阵)
+
+        向量以二进制存储，整表读取后直接拼成一个矩阵，便于一次性批量打分
+        """
+        user_ids: List[str] = []
+        buffers: List[bytes] = []
+        cursor = self._get_collection().find(
+            {"dimension": len(STORED_FEATURE_NAMES)},
+            {"_id": 0, "user_id": 1, "vector": 1}
+        ).batch_size(batch_size)
+        async for document in cursor:
+            user_ids.append(document["user_id"])
+            buffers.append(bytes(document["vector"]))
+
+        matrix = np.frombuffer(b"".join(buffers), dtype=FEATURE_DTYPE)
+        return user_ids, matrix.reshape(len(user_ids), len(STORED_FEATURE_NAMES))
+
+    def get_metrics(self) -> Dict:
+        return {
+            "cached_users": len(self._cache),
+            **self._metrics
+        }
+
+
+def _decode(raw: Optional[bytes]) -> Optional[np.ndarray]:
+    if raw is None:
+        return None
+    vector = np.frombuffer(bytes(raw), dtype=FEATURE_DTYPE)
+    if len(vector) != len(STORED_FEATURE_NAMES):
+        return None
+    return vector
+
+
+# 进程内共享的特征库实例
+feature_store = FeatureStore(
+    cache_size=settings.FEATURE_STORE_CACHE_SIZE,
+    ttl_seconds=settings.FEATURE_STORE_CACHE_TTL_SECONDS
+)
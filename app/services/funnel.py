@@ -0,0 +1,63 @@
+from typing import Dict, List, Tuple
+import numpy as np
+from app.services.behavior_transitions import BEHAVIOR_CODES
+
+# 每个CPU任务处理的用户数
+FUNNEL_BATCH_USERS = 2000
+
+# 单个用户在查询范围内的事件：(行为类型编码 uint8, 距1970-01-01的秒数 int64)
+UserEvents = Tuple[np.ndarray, np.ndarray]
+
+
+def evaluate_funnel_batch(users: List[UserEvents], step_codes: List[int],
+                          window_seconds: int, start_before: int) -> List[int]:
+    """
+    计算一批用户的漏斗，返回到达每一步的用户数
+
+    每个用户按时间顺序扫描一次事件：第一步的事件（时间早于start_before）记为新的起点，
+    其余步骤的事件在上一步已到达且距起点不超过window_seconds时推进到该步，
+    每一步保留最近的起点，使后续步骤有最长的剩余窗口
+    """
+    # 行为类型 -> 对应的步骤（倒序，同一事件不会在一次扫描中连推多步）
+    steps_by_code: Dict[int, List[int]] = {}
+    for step, code in enumerate(step_codes):
+        steps_by_code.setdefault(code, []).insert(0, step)
+
+    reached = [0] * len(step_codes)
+    last_step = len(step_codes) - 1
+    for codes, seconds in users:
+        starts = [None] * len(step_codes)
+        level = -1
+        for index in np.argsort(seconds, kind="stable"):
+            timestamp = int(seconds[index])
+            for step in steps_by_code.get(int(codes[index]), ()):
+                if step == 0:
+                    if timestamp >= start_before:
+                        continue
+                    starts[0] = timestamp
+                elif starts[step - 1] is not None and timestamp - starts[step - 1] <= window_seconds:
+                    starts[step] = starts[step - 1]
+                else:
+                    continue
+                level = max(level, step)
+            if level == last_step:
+                break
+        for step in range(level + 1):
+            reached[step] += 1
+    return reached
+
+
+def funnel_report(steps: List[str], reached: List[int]) -> List[Dict]:
+    """各步骤的到达人数、相对上一步和第一步的转化率以及流失人数"""
+    report = []
+    for step, (name, users) in enumerate(zip(steps, reached)):
+        previous = reached[step - 1] if step else users
+        report.append({
+            "step": step + 1,
+            "behavior_type": name,
+            "users": users,
+            "conversion_from_previous": round(users / previous, 4) if previous else 0.0,
+            "conversion_from_start": round(users / reached[0], 4) if reached[0] else 0.0,
+            "drop_off": previous - users
+        })
+    return report
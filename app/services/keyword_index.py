@@ -0,0 +1,166 @@
+from typing import Dict, List, Optional
+from app.models.user_profile import (
+    ActivityStats, ContextKeywordIndex, CopingStrategyStats, EmotionType, UserEmotionRecord
+)
+from app.services.emotion_accumulators import NEGATIVE_EMOTIONS
+from app.services.profile_keywords import get_activity_matcher, get_coping_matcher, keyword_config_fingerprint
+
+# 应对策略只考虑该时间窗口（小时）内的情绪转变
+COPING_WINDOW_HOURS = 24
+
+
+def build_keyword_index(records: List[UserEmotionRecord]) -> ContextKeywordIndex:
+    """从完整情绪历史构建兴趣活动和应对策略索引"""
+    index = ContextKeywordIndex(config_fingerprint=keyword_config_fingerprint())
+    for record in records:
+        _match_record(index, record)
+    _rebuild_strategies(index, records)
+    return index
+
+
+def is_current(index: ContextKeywordIndex) -> bool:
+    """
+    索引是否按当前关键词表构建
+
+    关键词表变化后已索引的活动和缓存的策略可能不在表中，需要从完整历史重建；
+    没有指纹的旧索引也重建一次
+    """
+    return index.config_fingerprint == keyword_config_fingerprint()
+
+
+def add_records(index: ContextKeywordIndex, records: List[UserEmotionRecord]):
+    """
+    把情绪历史中尚未加入索引的记录（第index.record_count条之后）加入索引
+
+    只扫描新记录的上下文；新记录按时间排在最后时只需评估一次情绪转变，
+    乱序到达时用缓存的每条记录策略重新计算转变，不再重复匹配上下文
+    """
+    for position in range(index.record_count, len(records)):
+        record = records[position]
+        _match_record(index, record)
+
+        last = records[index.last_record] if index.last_record is not None else None
+        if last is None or record.timestamp >= last.timestamp:
+            if last is not None and not index.transitions_dirty:
+                _add_transition(index, index.record_strategies[index.last_record], last, record)
+            index.last_record = position
+        else:
+            index.transitions_dirty = True
+
+    if index.transitions_dirty:
+        _rebuild_strategies(index, records)
+
+
+def interest_summary(index: ContextKeywordIndex) -> Dict:
+    """由索引得到兴趣偏好，格式与_analyze_interests一致"""
+    total_records = index.record_count
+    matcher = get_activity_matcher()
+
+    # 只考虑出现至少两次的活动，按首次出现的顺序输出
+    # 不在当前关键词表中的活动（索引重建前关键词被删除或改名）跳过
+    activities_found = sorted(
+        (activity for activity, stats in index.activities.items()
+         if stats.count >= 2 and activity in matcher.keyword_category),
+        key=lambda activity: (index.activities[activity].first_seen, matcher.keyword_order(activity))
+    )
+
+    activities = []
+    preferences = {}
+    emotional_responses = {}
+    for activity in activities_found:
+        stats = index.activities[activity]
+
+        # 计算活动偏好分数 (出现频率和情绪强度的加权平均)
+        frequency = stats.count / total_records
+        avg_intensity = stats.intensity_sum / stats.count
+        preference_score = frequency * 0.4 + avg_intensity * 0.6
+
+        activities.append(activity)
+        preferences[activity] = round(preference_score, 2)
+
+        # 活动引起的主要情绪；次数相同时取最先出现的
+        main_emotion = min(
+            stats.emotion_counts,
+            key=lambda e: (-stats.emotion_counts[e], stats.emotion_first_seen[e])
+        )
+        emotional_responses[activity] = EmotionType(main_emotion)
+
+    # 话题即命中活动所属的类别
+    topics = list(dict.fromkeys(matcher.keyword_category[activity] for activity in activities))
+
+    return {
+        "topics": topics,
+        "activities": activities,
+        "preferences": preferences,
+        "emotional_responses": emotional_responses
+    }
+
+
+def coping_summary(index: ContextKeywordIndex) -> Dict[str, float]:
+    """由索引得到应对策略效果，格式与_analyze_coping_strategies一致"""
+    result = {}
+    for strategy, stats in index.strategies.items():
+        if stats.count:
+            result[strategy] = stats.effect_sum / stats.count
+            result[f"{strategy}_count"] = stats.count
+    return result
+
+
+def _match_record(index: ContextKeywordIndex, record: UserEmotionRecord):
+    """扫描一条记录的上下文，更新活动统计并缓存其应对策略"""
+    sequence = index.record_count
+    index.record_count += 1
+
+    context = record.context or ""
+    index.record_strategies.append(get_coping_matcher().first_category(context) if context else None)
+    if not context:
+        return
+
+    emotion = record.emotion_type.value if isinstance(record.emotion_type, EmotionType) else str(record.emotion_type)
+    for activity in get_activity_matcher().match_keywords(context):
+        stats = index.activities.get(activity)
+        if stats is None:
+            stats = ActivityStats(first_seen=sequence)
+            index.activities[activity] = stats
+        stats.count += 1
+        stats.intensity_sum += record.intensity
+        stats.emotion_counts[emotion] = stats.emotion_counts.get(emotion, 0) + 1
+        stats.emotion_first_seen.setdefault(emotion, sequence)
+
+
+def _rebuild_strategies(index: ContextKeywordIndex, records: List[UserEmotionRecord]):
+    """按时间顺序重新计算全部情绪转变（使用缓存的策略，不重新匹配上下文）"""
+    index.strategies = {}
+    order = sorted(range(len(records)), key=lambda i: records[i].timestamp)
+    for current, following in zip(order, order[1:]):
+        _add_transition(index, index.record_strategies[current], records[current], records[following])
+    index.last_record = order[-1] if order else None
+    index.transitions_dirty = False
+
+
+def _add_transition(index: ContextKeywordIndex, strategy: Optional[str],
+                    current_record: UserEmotionRecord, next_record: UserEmotionRecord):
+    """评估一次情绪转变中应对策略的效果"""
+    # 只关注合理时间窗口内、从负面情绪出发且能识别出策略的转变
+    if not strategy or current_record.emotion_type not in NEGATIVE_EMOTIONS:
+        return
+    time_diff = (next_record.timestamp - current_record.timestamp).total_seconds() / 3600
+    if time_diff > COPING_WINDOW_HOURS:
+        return
+
+    if next_record.emotion_type not in NEGATIVE_EMOTIONS:
+        # 从负面到正面：有效
+        effect = 1.0
+    elif current_record.intensity > next_record.intensity:
+        # 负面情绪强度降低：部分有效
+        effect = (current_record.intensity - next_record.intensity) / current_record.intensity
+    else:
+        # 无效或负面情绪加剧
+        effect = 0.0
+
+    stats = index.strategies.get(strategy)
+    if stats is None:
+        stats = CopingStrategyStats()
+        index.strategies[strategy] = stats
+    stats.effect_sum += effect
+    stats.count += 1
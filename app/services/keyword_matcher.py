@@ -0,0 +1,76 @@
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+
+class AhoCorasickMatcher:
+    """
+    Aho-Corasick多模式匹配自动机
+
+    构建一次后，对任意文本只需扫描一遍即可找出其中出现的全部关键词，
+    耗时与文本长度和匹配数成正比，与关键词数量无关。
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for keyword in dict.fromkeys(keywords):
+            if keyword:
+                self._add(keyword)
+        self._build_failure_links()
+
+    def _add(self, keyword: str):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+
+        self._output[state].append(len(self.keywords))
+        self.keywords.append(keyword)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+
+                # 合并后缀状态的输出，匹配时无需沿失败链回溯
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find_ids(self, text: str) -> Set[int]:
+        """返回文本中出现的关键词编号（即在keywords中的位置）"""
+        found: Set[int] = set()
+        if not text:
+            return found
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def find(self, text: str) -> List[str]:
+        """返回文本中出现的关键词，按关键词定义顺序排列"""
+        return [self.keywords[i] for i in sorted(self.find_ids(text))]
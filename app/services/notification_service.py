@@ -65,7 +65,7 @@ class NotificationService:
                 "total_alerts": alert_history["total_alerts"],
                 "active_alerts": alert_history["active_alerts"],
                 "last_alert_time": alert_history["last_alert_time"],
-                "alert_levels": self._count_alert_levels(alert_history["alerts"]),
+                "alert_levels": alert_history.get("level_counts") or self._count_alert_levels(alert_history.get("alerts", [])),
                 "timestamp": datetime.now().isoformat()
             }
             
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+from app.core.config import settings
+
+# 轮询时回看的秒数，容忍写入方与服务进程之间的时钟差和写入可见延迟；已处理的通知按_id跳过
+POLL_OVERLAP_SECONDS = 30.0
+
+
+class ProfileInvalidationFeed:
+    """
+    跨进程的画像缓存失效通知
+
+    画像缓存和特征缓存都在各服务进程内，离线任务直接写数据库时无法通知到它们。
+    任务写回一批画像后向profile_invalidations集合追加一条通知（该批的user_id），
+    各服务进程每PROFILE_INVALIDATION_POLL_SECONDS秒读取新通知并使本地缓存中的这些用户失效。
+    通知由created_at上的TTL索引在一天后删除。
+    """
+
+    def __init__(self):
+        self._watermark: Optional[datetime] = None
+        # 回看窗口内已处理的通知：_id -> created_at
+        self._seen: Dict = {}
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {"published": 0, "polls": 0, "invalidated": 0, "failed_polls": 0}
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].profile_invalidations
+
+    async def publish(self, user_ids: List[str]):
+        """发布一批用户的失效通知（离线任务写回后调用）"""
+        if not user_ids:
+            return
+        await self._get_collection().insert_one({"user_ids": list(user_ids), "created_at": datetime.utcnow()})
+        self._metrics["published"] += len(user_ids)
+
+    async def poll(self, invalidate: Callable[[str], Awaitable[None]]) -> int:
+        """处理上次轮询之后的新通知，返回失效的用户数"""
+        if self._watermark is None:
+            # 首次轮询前缓存中的数据都是启动后读取的，只需处理此后的通知
+            self._watermark = datetime.utcnow()
+            return 0
+
+        since = self._watermark - timedelta(seconds=POLL_OVERLAP_SECONDS)
+        cursor = self._get_collection().find({"created_at": {"$gte": since}}, {"user_ids": 1, "created_at": 1})
+        user_ids = set()
+        async for document in cursor:
+            if document["_id"] in self._seen:
+                continue
+            self._seen[document["_id"]] = document["created_at"]
+            self._watermark = max(self._watermark, document["created_at"])
+            user_ids.update(document["user_ids"])
+
+        for user_id in user_ids:
+            await invalidate(user_id)
+
+        self._seen = {key: created_at for key, created_at in self._seen.items() if created_at >= since}
+        self._metrics["polls"] += 1
+        self._metrics["invalidated"] += len(user_ids)
+        return len(user_ids)
+
+    def start(self, invalidate: Callable[[str], Awaitable[None]]):
+        """在后台定期轮询（服务启动时调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(invalidate))
+
+    async def _run(self, invalidate: Callable[[str], Awaitable[None]]):
+        while True:
+            try:
+                await self.poll(invalidate)
+            except Exception as e:
+                self._metrics["failed_polls"] += 1
+                print(f"画像缓存失效通知读取失败: {str(e)}")
+            await asyncio.sleep(settings.PROFILE_INVALIDATION_POLL_SECONDS)
+
+    def get_metrics(self) -> Dict:
+        return dict(self._metrics)
+
+
+# 进程内共享的失效通知
+profile_invalidations = ProfileInvalidationFeed()
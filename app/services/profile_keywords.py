@@ -0,0 +1,92 @@
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, List, Optional
+import json
+from app.core.config import settings
+from app.services.keyword_matcher import AhoCorasickMatcher
+
+# 预定义的活动类别
+ACTIVITY_CATEGORIES: Dict[str, List[str]] = {
+    "体育运动": ["跑步", "健身", "游泳", "篮球", "足球", "羽毛球", "乒乓球", "瑜伽", "骑行", "登山", "健走"],
+    "艺术文化": ["阅读", "写作", "绘画", "摄影", "音乐", "电影", "戏剧", "舞蹈", "手工", "博物馆", "展览"],
+    "社交活动": ["聚会", "聊天", "约会", "团建", "交友", "社区活动", "志愿服务"],
+    "休闲娱乐": ["游戏", "旅行", "购物", "烹饪", "美食", "园艺", "钓鱼", "宠物", "收藏", "冥想"],
+    "学习工作": ["学习", "工作", "研究", "讲座", "培训", "编程", "语言学习", "技能培训"]
+}
+
+# 常见的应对策略关键词（按顺序匹配，一条记录取第一个命中的策略）
+COPING_STRATEGY_KEYWORDS: Dict[str, List[str]] = {
+    "运动": ["跑步", "健身", "散步", "锻炼", "运动"],
+    "社交": ["聊天", "交流", "朋友", "社交", "通话"],
+    "娱乐": ["电影", "音乐", "游戏", "娱乐", "看书", "阅读"],
+    "放松": ["冥想", "休息", "睡觉", "放松", "休闲"],
+    "工作": ["工作", "学习", "忙碌", "专注"],
+    "表达": ["倾诉", "表达", "写作", "日记"]
+}
+
+
+class CategoryKeywordMatcher:
+    """
+    分类关键词匹配器
+
+    把 {类别: [关键词]} 表编译为一个自动机，扫描一遍上下文即可得到命中的关键词及其类别
+    """
+
+    def __init__(self, table: Dict[str, List[str]]):
+        self.categories: List[str] = list(table)
+        # 关键词 -> 所属类别（同一关键词出现在多个类别时以先出现的为准）
+        self.keyword_category: Dict[str, str] = {}
+        for category, keywords in table.items():
+            for keyword in keywords:
+                self.keyword_category.setdefault(keyword, category)
+
+        self._category_order = {category: i for i, category in enumerate(self.categories)}
+        self.automaton = AhoCorasickMatcher(self.keyword_category)
+        self._keyword_order = {keyword: i for i, keyword in enumerate(self.automaton.keywords)}
+
+    def keyword_order(self, keyword: str) -> int:
+        """关键词在表中的定义顺序"""
+        return self._keyword_order[keyword]
+
+    def match_keywords(self, text: str) -> List[str]:
+        """命中的关键词，按表中定义顺序排列"""
+        return self.automaton.find(text)
+
+    def first_category(self, text: str) -> Optional[str]:
+        """命中的类别中定义顺序最靠前的一个"""
+        best = None
+        for keyword_id in self.automaton.find_ids(text):
+            category = self.keyword_category[self.automaton.keywords[keyword_id]]
+            if best is None or self._category_order[category] < self._category_order[best]:
+                best = category
+        return best
+
+
+def _merge_tables(base: Dict[str, List[str]], extra: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    merged = {category: list(keywords) for category, keywords in base.items()}
+    for category, keywords in extra.items():
+        merged.setdefault(category, [])
+        merged[category].extend(k for k in keywords if k not in merged[category])
+    return merged
+
+
+@lru_cache(maxsize=1)
+def get_activity_matcher() -> CategoryKeywordMatcher:
+    """活动关键词匹配器（进程内只构建一次，可通过EXTRA_ACTIVITY_KEYWORDS扩展）"""
+    return CategoryKeywordMatcher(_merge_tables(ACTIVITY_CATEGORIES, settings.EXTRA_ACTIVITY_KEYWORDS))
+
+
+@lru_cache(maxsize=1)
+def get_coping_matcher() -> CategoryKeywordMatcher:
+    """应对策略关键词匹配器（进程内只构建一次，可通过EXTRA_COPING_KEYWORDS扩展）"""
+    return CategoryKeywordMatcher(_merge_tables(COPING_STRATEGY_KEYWORDS, settings.EXTRA_COPING_KEYWORDS))
+
+
+@lru_cache(maxsize=1)
+def keyword_config_fingerprint() -> str:
+    """活动和应对策略关键词表（含扩展）的指纹，关键词增删、改名或调整顺序时变化"""
+    tables = [
+        _merge_tables(ACTIVITY_CATEGORIES, settings.EXTRA_ACTIVITY_KEYWORDS),
+        _merge_tables(COPING_STRATEGY_KEYWORDS, settings.EXTRA_COPING_KEYWORDS)
+    ]
+    return blake2b(json.dumps(tables, ensure_ascii=False).encode("utf-8"), digest_size=8).hexdigest()
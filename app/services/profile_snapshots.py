@@ -0,0 +1,194 @@
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+import time
+from fastapi.encoders import jsonable_encoder
+from app.core.concurrency import KeyedDebouncer, ShardedKeyExecutor
+from app.core.config import settings
+
+# 新鲜度统计保留的最近刷新次数
+LAG_SAMPLE_SIZE = 1000
+
+
+class ProfileSnapshotStore:
+    """
+    综合画像物化快照
+
+    每个用户一份快照文档（comprehensive_profiles集合），读取时只需一次按user_id的索引查询。
+    情绪记录、行为、社交互动、预警等数据源变化时调用mark_stale，
+    快照在合并窗口结束后异步重建；同一用户的重建串行执行，旧结果不会覆盖新结果。
+
+    mark_stale的待重建状态只保存在当前进程内：由接收写入的工作进程负责重建，
+    其他进程读到的snapshot.stale只反映自己标记过的变化。离线任务等没有构建函数的进程
+    用mark_stored_stale在快照文档上写入stale_since，任一进程读取到该快照时安排重建。
+    """
+
+    def __init__(self):
+        self._builder: Optional[Callable[[str], Awaitable[Dict]]] = None
+        self._debouncer = KeyedDebouncer(
+            delay_seconds=settings.COMPREHENSIVE_SNAPSHOT_DEBOUNCE_SECONDS,
+            name="comprehensive_snapshot"
+        )
+        self._executor = ShardedKeyExecutor(num_shards=8, name="comprehensive_snapshot")
+        # 用户 -> 最早一次未反映到快照中的数据变化时间（time.monotonic）
+        self._stale_since: Dict[str, float] = {}
+        self._lags = deque(maxlen=LAG_SAMPLE_SIZE)
+        self._metrics = {
+            "stale_marks": 0,
+            "refreshes": 0,
+            "partial_refreshes": 0,
+            "failed_refreshes": 0,
+            "snapshot_hits": 0,
+            "snapshot_misses": 0
+        }
+
+    def set_builder(self, builder: Callable[[str], Awaitable[Dict]]):
+        """注册实时构建综合画像的函数（通常是ComprehensiveProfileService.get_comprehensive_profile）"""
+        self._builder = builder
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].comprehensive_profiles
+
+    def mark_stale(self, user_id: str, source: str):
+        """
+        数据源发生变化，安排该用户快照的异步重建
+
+        source仅用于统计（emotion/behavior/social/alert）；未注册构建函数时（例如离线任务中）不做任何事
+        """
+        if self._builder is None:
+            return
+
+        self._metrics["stale_marks"] += 1
+        self._metrics[f"stale_marks_{source}"] = self._metrics.get(f"stale_marks_{source}", 0) + 1
+        self._stale_since.setdefault(user_id, time.monotonic())
+        self._debouncer.schedule(
+            user_id,
+            lambda: self._executor.submit(user_id, lambda: self._refresh(user_id))
+        )
+
+    async def mark_stored_stale(self, user_ids: List[str]):
+        """
+        在已有快照文档上标记数据变化（跨进程生效）
+
+        供没有构建函数的离线任务使用；不会立即重建，任一进程读取这些快照时再安排重建
+        """
+        if not user_ids:
+            return
+        await self._get_collection().update_many(
+            {"user_id": {"$in": user_ids}},
+            {"$set": {"stale_since": datetime.utcnow()}}
+        )
+
+    async def get(self, user_id: str) -> Dict:
+        """读取快照；还没有快照时实时构建一次并保存"""
+        document = await self._get_collection().find_one({"user_id": user_id}, {"_id": 0})
+        if document is not None:
+            self._metrics["snapshot_hits"] += 1
+            if document.get("stale_since") is not None and user_id not in self._stale_since:
+                # 其他进程（如离线任务）标记的变化：先返回当前快照，后台重建
+                self.mark_stale(user_id, "stored")
+            return self._with_metadata(document)
+
+        self._metrics["snapshot_misses"] += 1
+        return await self.refresh(user_id)
+
+    async def refresh(self, user_id: str) -> Dict:
+        """立即重建快照并返回（与该用户的后台重建串行执行）"""
+        self._debouncer.cancel(user_id)
+        document = await self._executor.submit(user_id, lambda: self._refresh(user_id))
+        return self._with_metadata(document)
+
+    async def _refresh(self, user_id: str) -> Dict:
+        changed_at = self._stale_since.pop(user_id, None)
+        started_at = datetime.utcnow()
+        try:
+            snapshot = jsonable_encoder(await self._builder(user_id))
+        except Exception:
+            self._metrics["failed_refreshes"] += 1
+            if changed_at is not None:
+                # 保留最早的变化时间，下次重建成功时计入延迟
+                self._stale_since[user_id] = min(changed_at, self._stale_since.get(user_id, changed_at))
+            raise
+
+        from pymongo import ReturnDocument
+
+        document = await self._get_collection().find_one_and_update(
+            {"user_id": user_id},
+            {
+                "$set": {"snapshot": snapshot, "refreshed_at": started_at},
+                "$inc": {"version": 1}
+            },
+            upsert=True,
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+        # 清除重建开始前写入的持久化标记；重建期间新写入的标记保留
+        stored_since = document.pop("stale_since", None)
+        if stored_since is not None:
+            if stored_since <= started_at:
+                await self._get_collection().update_one(
+                    {"user_id": user_id, "stale_since": {"$lte": started_at}},
+                    {"$unset": {"stale_since": ""}}
+                )
+            else:
+                document["stale_since"] = stored_since
+
+        self._metrics["refreshes"] += 1
+        if changed_at is not None:
+            self._lags.append(time.monotonic() - changed_at)
+
+        # 有部分超时或出错时照常保存（sections中标明了状态），下一次数据变化时重建
+        if any(section.get("status") != "ok" for section in snapshot.get("sections", {}).values()):
+            self._metrics["partial_refreshes"] += 1
+
+        return document
+
+    def _with_metadata(self, document: Dict) -> Dict:
+        snapshot = dict(document["snapshot"])
+        snapshot["snapshot"] = {
+            "version": document.get("version"),
+            "refreshed_at": document.get("refreshed_at"),
+            "stale": document["user_id"] in self._stale_since or document.get("stale_since") is not None
+        }
+        return snapshot
+
+    def get_metrics(self) -> Dict:
+        """
+        快照新鲜度指标
+
+        lag为数据变化到快照重建完成的时间；within_sla_ratio为最近刷新中
+        lag不超过COMPREHENSIVE_SNAPSHOT_FRESHNESS_SLA_SECONDS的比例
+        """
+        sla = settings.COMPREHENSIVE_SNAPSHOT_FRESHNESS_SLA_SECONDS
+        now = time.monotonic()
+        lags = sorted(self._lags)
+
+        def percentile(q: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(q * len(lags)))], 3)
+
+        oldest_stale = max((now - since for since in self._stale_since.values()), default=None)
+        return {
+            "freshness_sla_seconds": sla,
+            "stale_users": len(self._stale_since),
+            "oldest_stale_seconds": round(oldest_stale, 3) if oldest_stale is not None else None,
+            "stale_over_sla": sum(1 for since in self._stale_since.values() if now - since > sla),
+            "lag_p50_seconds": percentile(0.5),
+            "lag_p95_seconds": percentile(0.95),
+            "lag_max_seconds": round(lags[-1], 3) if lags else None,
+            "within_sla_ratio": (
+                round(sum(1 for lag in lags if lag <= sla) / len(lags), 4) if lags else None
+            ),
+            **self._metrics,
+            "debouncer": self._debouncer.get_metrics(),
+            "executor": self._executor.get_metrics()
+        }
+
+
+# 进程内共享的快照存储
+snapshot_store = ProfileSnapshotStore()
@@ -8,7 +8,11 @@ from app.models.social_emotion import (
 )
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
-import asyncio
+from app.services.profile_snapshots import snapshot_store
+from app.services.social_graph import social_graph
+
+# 社交洞察中返回的关系质量最高的联系人数
+RELATIONSHIP_QUALITY_CONTACTS = 20
 
 class SocialEmotionService:
     def __init__(self):
@@ -40,15 +44,23 @@ class SocialEmotionService:
         
         # 插入记录
         await db.social_emotion_records.insert_one(record_dict)
+        # 互动同时改变双方的关系图（网络规模、关系质量）
+        snapshot_store.mark_stale(record.user_id, "social")
+        if record.target_user_id and record.target_user_id != record.user_id:
+            snapshot_store.mark_stale(record.target_user_id, "social")
         
         return record
     
-    async def analyze_social_emotion(self, user_id: str) -> SocialEmotionAnalysis:
+    async def analyze_social_emotion(self, user_id: str,
+                                     recent_records: Optional[List[SocialEmotionRecord]] = None) -> SocialEmotionAnalysis:
         """
         分析用户社交情绪
+        
+        可传入已获取的最近互动记录，与其他分析共用同一次查询
         """
         # 获取最近的社交互动记录
-        recent_records = await self._get_recent_interactions(user_id)
+        if recent_records is None:
+            recent_records = await self._get_recent_interactions(user_id)
         
         # 计算社交情绪得分
         emotion_score = self._calculate_emotion_score(recent_records)
@@ -57,7 +69,7 @@ class SocialEmotionService:
         engagement = self._calculate_engagement(recent_records)
         
         # 计算社交网络规模
-        network_size = self._calculate_network_size(user_id)
+        network_size = await self._calculate_network_size(user_id)
         
         # 分析互动模式
         interaction_patterns = self._analyze_interaction_patterns(recent_records)
@@ -106,12 +118,16 @@ class SocialEmotionService:
             timestamps=timestamps
         )
     
-    async def get_social_emotion_insights(self, user_id: str) -> SocialEmotionInsight:
+    async def get_social_emotion_insights(self, user_id: str,
+                                          recent_records: Optional[List[SocialEmotionRecord]] = None) -> SocialEmotionInsight:
         """
         获取社交情绪洞察
+        
+        可传入已获取的最近互动记录，与其他分析共用同一次查询
         """
         # 获取最近的社交互动记录
-        recent_records = await self._get_recent_interactions(user_id)
+        if recent_records is None:
+            recent_records = await self._get_recent_interactions(user_id)
         
         # 分析最频繁的互动类型
         top_interactions = self._analyze_top_interactions(recent_records)
@@ -126,7 +142,10 @@ class SocialEmotionService:
         social_stress = self._calculate_social_stress(recent_records)
         
         # 分析关系质量
-        relationship_quality = self._analyze_relationship_quality(user_id)
+        relationship_quality = await self._analyze_relationship_quality(user_id)
+        
+        # 情绪传染（由 app.jobs.propagate_contagion 定期计算）
+        contagion = await self._get_contagion_scores(user_id)
         
         return SocialEmotionInsight(
             user_id=user_id,
@@ -134,9 +153,27 @@ class SocialEmotionService:
             emotional_impact=emotional_impact,
             social_support=social_support,
             social_stress=social_stress,
-            relationship_quality=relationship_quality
+            relationship_quality=relationship_quality,
+            emotional_exposure=contagion.get("exposure"),
+            emotional_influence=contagion.get("influence")
         )
     
+    def warm_social_graph(self):
+        """服务启动时在后台开始全量加载社交关系图"""
+        social_graph.schedule_refresh(self.interaction_weights)
+    
+    async def get_relationships(self, user_id: str, limit: int = 50) -> Dict:
+        """
+        获取用户与各联系人的关系（关系质量、互惠度、双向互动权重）及度数
+        """
+        social_graph.schedule_refresh(self.interaction_weights)
+        return {
+            "user_id": user_id,
+            "graph_ready": social_graph.is_ready,
+            **social_graph.degree(user_id),
+            "contacts": social_graph.relationships(user_id, (datetime.now() - datetime(1970, 1, 1)).total_seconds(), limit)
+        }
+    
     def _calculate_emotion_score(self, records: List[SocialEmotionRecord]) -> float:
         """计算社交情绪得分"""
         if not records:
@@ -173,28 +210,11 @@ class SocialEmotionService:
         
         return float(min(engagement, 1.0))
     
-    def _calculate_network_size(self, user_id: str) -> int:
+    async def _calculate_network_size(self, user_id: str) -> int:
         """计算社交网络规模"""
-        client = AsyncIOMotorClient(settings.MONGODB_URL)
-        db = client[settings.MONGODB_DB_NAME]
-        
-        # 获取用户的互动目标用户列表
-        async def get_unique_contacts():
-            unique_contacts = set()
-            
-            # 查询该用户的所有社交互动记录
-            cursor = db.social_emotion_records.find({"user_id": user_id})
-            
-            async for record in cursor:
-                # 添加互动目标用户到集合中
-                if "target_user_id" in record and record["target_user_id"]:
-                    unique_contacts.add(record["target_user_id"])
-            
-            return len(unique_contacts)
-            
-        # 由于这是一个同步方法但需要执行异步操作，我们使用一个事件循环来运行异步函数
-        loop = asyncio.get_event_loop()
-        network_size = loop.run_until_complete(get_unique_contacts())
+        # 互动过的目标用户数即关系图中的出度
+        social_graph.schedule_refresh(self.interaction_weights)
+        network_size = social_graph.degree(user_id)["out_degree"]
         
         return network_size if network_size > 0 else 100  # 如果没有数据，返回默认值
     
@@ -536,13 +556,22 @@ class SocialEmotionService:
         
         return float(min(stress, 1.0))
     
-    def _analyze_relationship_quality(self, user_id: str) -> Dict[str, float]:
-        """分析关系质量"""
-        # 在实际实现中，这应该从数据库读取关系数据
-        # 这里返回模拟数据
+    async def _get_contagion_scores(self, user_id: str) -> Dict[str, float]:
+        """读取离线计算的情绪暴露度和影响力，尚未计算时为空"""
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        db = client[settings.MONGODB_DB_NAME]
+        
+        document = await db.social_contagion.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "exposure": 1, "influence": 1}
+        )
+        return document or {}
+    
+    async def _analyze_relationship_quality(self, user_id: str) -> Dict[str, float]:
+        """分析关系质量：关系质量最高的联系人 -> 质量（0-1）"""
+        social_graph.schedule_refresh(self.interaction_weights)
+        now = (datetime.now() - datetime(1970, 1, 1)).total_seconds()
         return {
-            "family": 0.9,
-            "friends": 0.85,
-            "colleagues": 0.75,
-            "acquaintances": 0.6
+            contact["user_id"]: contact["quality"]
+            for contact in social_graph.relationships(user_id, now, RELATIONSHIP_QUALITY_CONTACTS)
         } 
\ No newline at end of file
@@ -0,0 +1,289 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import time
+import numpy as np
+from app.core.config import settings
+
+_EPOCH = datetime(1970, 1, 1)
+
+# 只读取_id生成时间早于该秒数的记录，给其他进程的插入留出可见时间，避免水位线越过尚未可见的记录
+INSERT_VISIBILITY_SECONDS = 2.0
+# 关系强度换算为0-1亲密度的尺度：强度为该值时亲密度约0.63
+RELATIONSHIP_STRENGTH_SCALE = 1.0
+
+
+def _seconds(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+class SocialGraphIndex:
+    """
+    社交关系图索引
+
+    由social_emotion_records中user_id -> target_user_id的互动构建有向加权图，以CSR
+    （压缩稀疏行）数组保存在进程内：第u个用户的出边是indices[indptr[u]:indptr[u+1]]，
+    行内按目标用户编号排序。边权重为各次互动的 互动类型权重 × 强度，按
+    SOCIAL_GRAPH_HALF_LIFE_DAYS半衰期随时间衰减。
+
+    刷新按_id水位线只读取新记录，排序后合并进现有数组（O(边数 + 新边数·log 新边数)），
+    不重新扫描集合。请求路径只调用schedule_refresh在后台刷新、不等待，首次全量加载在服务启动时开始；
+    加载完成前（is_ready为False）查询得到的是空图或上一次刷新的结果。
+    """
+
+    def __init__(self):
+        self._user_ids: Dict[str, int] = {}
+        self._users: List[str] = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int64)
+        # 边的排序键（源<<32 | 目标），用于反向边的二分查找
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._weights = np.zeros(0, dtype=np.float64)  # 衰减到reference_time的边权重
+        self._counts = np.zeros(0, dtype=np.int64)  # 互动次数
+        self._last_seen = np.zeros(0, dtype=np.float64)  # 最近一次互动时间（秒）
+        self._in_degree = np.zeros(0, dtype=np.int64)
+        self._reference_time: Optional[float] = None
+        self._watermark = None  # 已读取的最后一条记录的_id
+        self._refreshed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._metrics = {
+            "refreshes": 0,
+            "failed_refreshes": 0,
+            "records_loaded": 0,
+            "last_refresh_ms": None,
+            "last_merge_ms": None
+        }
+
+    def _get_collection(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        return client[settings.MONGODB_DB_NAME].social_emotion_records
+
+    @property
+    def is_ready(self) -> bool:
+        """是否已完成首次全量加载"""
+        return self._refreshed_at is not None
+
+    async def ensure_fresh(self, interaction_weights: Dict[str, float]):
+        """距上次刷新超过SOCIAL_GRAPH_REFRESH_SECONDS时读取新记录并合并（并发调用只刷新一次），等待完成"""
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if not self._is_fresh():
+                await self._refresh(interaction_weights)
+
+    def schedule_refresh(self, interaction_weights: Dict[str, float]):
+        """
+        需要时在后台刷新，不等待结果
+
+        供请求路径使用：刷新任务独立于请求，请求超时或被取消不会中断读取
+        """
+        if self._is_fresh() or (self._refresh_task is not None and not self._refresh_task.done()):
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(self._background_refresh(interaction_weights))
+
+    async def _background_refresh(self, interaction_weights: Dict[str, float]):
+        try:
+            await self.ensure_fresh(interaction_weights)
+        except Exception as e:
+            self._metrics["failed_refreshes"] += 1
+            print(f"社交关系图刷新失败: {str(e)}")
+
+    def _is_fresh(self) -> bool:
+        return (self._refreshed_at is not None
+                and time.monotonic() - self._refreshed_at < settings.SOCIAL_GRAPH_REFRESH_SECONDS)
+
+    def _visible_before(self):
+        from bson import ObjectId
+
+        return ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=INSERT_VISIBILITY_SECONDS))
+
+    async def _refresh(self, interaction_weights: Dict[str, float]):
+        started = time.monotonic()
+        id_range = {"$lt": self._visible_before()}
+        if self._watermark is not None:
+            id_range["$gt"] = self._watermark
+        cursor = self._get_collection().find(
+            {"_id": id_range, "target_user_id": {"$nin": [None, ""]}},
+            {"user_id": 1, "target_user_id": 1, "interaction_type": 1, "intensity": 1, "timestamp": 1}
+        ).sort("_id", 1)
+
+        # 读取期间只收集到局部变量；合并成功后才登记用户、推进水位线，中途出错或被取消时下次从原水位线重读
+        source_ids, target_ids, weights, timestamps = [], [], [], []
+        last_id = None
+        async for document in cursor:
+            source_ids.append(document["user_id"])
+            target_ids.append(document["target_user_id"])
+            weights.append(interaction_weights.get(document["interaction_type"], 0.0) * document["intensity"])
+            timestamps.append(_seconds(document["timestamp"]))
+            last_id = document["_id"]
+
+        merge_started = time.monotonic()
+        sources = [self._node(user_id) for user_id in source_ids]
+        targets = [self._node(user_id) for user_id in target_ids]
+        self.add_edges(sources, targets, weights, timestamps, _seconds(datetime.now()))
+        if last_id is not None:
+            self._watermark = last_id
+        self._metrics["last_merge_ms"] = round((time.monotonic() - merge_started) * 1000, 1)
+
+        self._refreshed_at = time.monotonic()
+        self._metrics["refreshes"] += 1
+        self._metrics["records_loaded"] += len(sources)
+        self._metrics["last_refresh_ms"] = round((self._refreshed_at - started) * 1000, 1)
+
+    def _node(self, user_id: str) -> int:
+        node = self._user_ids.get(user_id)
+        if node is None:
+            node = self._user_ids[user_id] = len(self._users)
+            self._users.append(user_id)
+        return node
+
+    def add_edges(self, sources: List[int], targets: List[int], weights: List[float],
+                  timestamps: List[float], now: float):
+        """
+        把一批互动合并进CSR数组
+
+        现有权重先衰减到now；新互动按各自时间衰减到now后，同一条边的互动先在批内合并，
+        已有的边原位累加，新边按排序键插入（不需要对全部边重新排序）
+        """
+        half_life = settings.SOCIAL_GRAPH_HALF_LIFE_DAYS * 86400
+        if self._reference_time is not None and now > self._reference_time:
+            self._weights *= 0.5 ** ((now - self._reference_time) / half_life)
+        self._reference_time = now
+
+        node_count = len(self._users)
+        if not sources:
+            self._grow(node_count)
+            return
+
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        # 未来时间（时钟偏差）不放大权重
+        decay = 0.5 ** (np.maximum(now - timestamps, 0.0) / half_life)
+        weights = np.asarray(weights, dtype=np.float64) * decay
+
+        keys = (sources << 32) | targets
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        batch_keys = keys[starts]
+        batch_weights = np.add.reduceat(weights[order], starts)
+        batch_counts = np.diff(np.r_[starts, len(keys)])
+        batch_last_seen = np.maximum.reduceat(timestamps[order], starts)
+
+        positions = np.searchsorted(self._keys, batch_keys)
+        existing = positions < len(self._keys)
+        existing[existing] = self._keys[positions[existing]] == batch_keys[existing]
+
+        hit = positions[existing]
+        self._weights[hit] += batch_weights[existing]
+        self._counts[hit] += batch_counts[existing]
+        self._last_seen[hit] = np.maximum(self._last_seen[hit], batch_last_seen[existing])
+
+        new = ~existing
+        insert_at = positions[new]
+        self._keys = np.insert(self._keys, insert_at, batch_keys[new])
+        self._weights = np.insert(self._weights, insert_at, batch_weights[new])
+        self._counts = np.insert(self._counts, insert_at, batch_counts[new])
+        self._last_seen = np.insert(self._last_seen, insert_at, batch_last_seen[new])
+
+        self._indices = self._keys & 0xFFFFFFFF
+        self._indptr = np.searchsorted(self._keys >> 32, np.arange(node_count + 1)).astype(np.int64)
+        self._in_degree = np.bincount(self._indices, minlength=node_count)
+
+    def _grow(self, node_count: int):
+        # 只出现新用户、没有新边时补齐行指针和入度
+        if len(self._indptr) < node_count + 1:
+            self._indptr = np.r_[self._indptr, np.full(node_count + 1 - len(self._indptr), len(self._keys))]
+            self._in_degree = np.r_[self._in_degree, np.zeros(node_count - len(self._in_degree), dtype=np.int64)]
+
+    def degree(self, user_id: str) -> Dict[str, int]:
+        """出度（互动过的用户数）、入度（与该用户互动过的用户数）和双向互动的用户数"""
+        node = self._user_ids.get(user_id)
+        if node is None:
+            return {"out_degree": 0, "in_degree": 0, "mutual": 0}
+        contacts = self._indices[self._indptr[node]:self._indptr[node + 1]]
+        return {
+            "out_degree": int(len(contacts)),
+            "in_degree": int(self._in_degree[node]),
+            "mutual": int(np.count_nonzero(self._reverse_positions(node, contacts) >= 0))
+        }
+
+    def relationships(self, user_id: str, now: float, limit: Optional[int] = None) -> List[Dict]:
+        """
+        与每个联系人的关系：双向的衰减权重、互动次数、最近互动时间、互惠度和关系质量，按质量从高到低
+
+        关系质量 = 0.7 × 亲密度 + 0.3 × 互惠度，亲密度 = 1 - exp(-双向正权重之和 / RELATIONSHIP_STRENGTH_SCALE)，
+        互惠度 = 两个方向正权重的较小值 / 较大值
+        """
+        node = self._user_ids.get(user_id)
+        if node is None:
+            return []
+        start, end = self._indptr[node], self._indptr[node + 1]
+        contacts = self._indices[start:end]
+        decay = self._decay_to(now)
+
+        outgoing = self._weights[start:end] * decay
+        reverse = self._reverse_positions(node, contacts)
+        has_reverse = reverse >= 0
+        incoming = np.where(has_reverse, self._weights[reverse] * decay, 0.0)
+        incoming_counts = np.where(has_reverse, self._counts[reverse], 0)
+
+        positive_out = np.maximum(outgoing, 0.0)
+        positive_in = np.maximum(incoming, 0.0)
+        stronger = np.maximum(positive_out, positive_in)
+        reciprocity = np.divide(np.minimum(positive_out, positive_in), stronger,
+                                out=np.zeros_like(stronger), where=stronger > 0)
+        closeness = 1 - np.exp(-(positive_out + positive_in) / RELATIONSHIP_STRENGTH_SCALE)
+        quality = 0.7 * closeness + 0.3 * reciprocity
+
+        order = np.argsort(-quality, kind="stable")[:limit]
+        return [
+            {
+                "user_id": self._users[contacts[i]],
+                "quality": round(float(quality[i]), 4),
+                "reciprocity": round(float(reciprocity[i]), 4),
+                "outgoing_weight": round(float(outgoing[i]), 4),
+                "incoming_weight": round(float(incoming[i]), 4),
+                "outgoing_interactions": int(self._counts[start + i]),
+                "incoming_interactions": int(incoming_counts[i]),
+                "last_interaction": _EPOCH + timedelta(seconds=float(self._last_seen[start + i]))
+            }
+            for i in order
+        ]
+
+    def csr(self, now: float) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """(用户列表, 行指针, 列编号, 衰减到now的边权重)，供全图计算使用"""
+        return list(self._users), self._indptr.copy(), self._indices.copy(), self._weights * self._decay_to(now)
+
+    def _reverse_positions(self, node: int, contacts: np.ndarray) -> np.ndarray:
+        """各联系人指向node的边在数组中的位置，没有反向边时为-1"""
+        reverse_keys = (contacts << 32) | node
+        positions = np.searchsorted(self._keys, reverse_keys)
+        found = positions < len(self._keys)
+        found[found] = self._keys[positions[found]] == reverse_keys[found]
+        return np.where(found, positions, -1)
+
+    def _decay_to(self, now: float) -> float:
+        if self._reference_time is None or now <= self._reference_time:
+            return 1.0
+        return 0.5 ** ((now - self._reference_time) / (settings.SOCIAL_GRAPH_HALF_LIFE_DAYS * 86400))
+
+    def get_metrics(self) -> Dict:
+        return {
+            "ready": self.is_ready,
+            "users": len(self._users),
+            "edges": int(len(self._keys)),
+            "memory_bytes": int(sum(array.nbytes for array in (
+                self._indptr, self._indices, self._keys, self._weights,
+                self._counts, self._last_seen, self._in_degree
+            ))),
+            **self._metrics
+        }
+
+
+# 进程内共享的社交关系图
+social_graph = SocialGraphIndex()
@@ -0,0 +1,133 @@
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from app.core.config import settings
+
+# 基础词典：常见的情绪触发场景词汇
+BASE_DICTIONARY = [
+    # 工作学习
+    "工作", "加班", "上班", "下班", "项目", "会议", "开会", "汇报", "考核", "绩效", "升职", "辞职",
+    "失业", "面试", "老板", "领导", "同事", "客户", "截止", "任务", "学习", "考试", "作业", "论文",
+    "成绩", "毕业", "老师", "同学", "培训", "编程",
+    # 家庭关系
+    "家人", "父母", "爸爸", "妈妈", "孩子", "老公", "老婆", "对象", "恋爱", "分手", "吵架", "结婚",
+    "离婚", "朋友", "聚会", "聊天", "交流", "社交", "约会", "团队", "群组",
+    # 身体健康
+    "睡眠", "失眠", "熬夜", "生病", "身体", "健康", "头疼", "疲惫", "医院", "体检",
+    # 生活
+    "天气", "下雨", "堵车", "通勤", "交通", "地铁", "公交", "房租", "工资", "金钱", "花钱", "购物", "搬家", "旅行",
+    "美食", "做饭", "运动", "跑步", "健身", "散步", "锻炼", "音乐", "电影", "游戏", "阅读", "看书",
+    "冥想", "休息", "放松", "睡觉", "写作", "日记", "倾诉",
+    # 情绪相关
+    "压力", "焦虑", "紧张", "担心", "害怕", "开心", "难过", "生气", "失望", "孤独", "无聊", "烦躁"
+]
+
+
+# 未登录汉字串中遇到这些虚词时断开
+SPLIT_CHARS = set("的了在是我有和就不都也很到说要去你会着看好这那上一他她它们吗呢吧啊")
+
+
+def _is_cjk(char: str) -> bool:
+    return "\u4e00" <= char <= "\u9fff" or "\u3400" <= char <= "\u4dbf"
+
+
+class TrieSegmenter:
+    """
+    基于词典的正向最大匹配分词
+
+    中文按词典最长匹配切分；词典未覆盖的连续汉字先按常见虚词断开，
+    2-4个字作为一个词，更长的按相邻两字切分；
+    字母数字按\\w连续片段切分并转为小写。
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self._root: Dict = {}
+        self._max_length = 0
+        for word in words:
+            self.add_word(word)
+
+    def add_word(self, word: str):
+        word = word.strip().lower()
+        if not word:
+            return
+
+        node = self._root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+        self._max_length = max(self._max_length, len(word))
+
+    def segment(self, text: str) -> List[str]:
+        text = text.lower()
+        tokens: List[str] = []
+        unknown_start: Optional[int] = None
+        i = 0
+        length = len(text)
+
+        while i < length:
+            char = text[i]
+            if _is_cjk(char):
+                match_length = self._longest_match(text, i)
+                if match_length:
+                    self._flush_unknown(text, unknown_start, i, tokens)
+                    unknown_start = None
+                    tokens.append(text[i:i + match_length])
+                    i += match_length
+                elif char in SPLIT_CHARS:
+                    self._flush_unknown(text, unknown_start, i, tokens)
+                    unknown_start = None
+                    i += 1
+                else:
+                    if unknown_start is None:
+                        unknown_start = i
+                    i += 1
+                continue
+
+            self._flush_unknown(text, unknown_start, i, tokens)
+            unknown_start = None
+
+            if char.isalnum() or char == "_":
+                end = i + 1
+                while end < length and (text[end].isalnum() or text[end] == "_") and not _is_cjk(text[end]):
+                    end += 1
+                tokens.append(text[i:end])
+                i = end
+            else:
+                i += 1
+
+        self._flush_unknown(text, unknown_start, length, tokens)
+        return tokens
+
+    def _longest_match(self, text: str, start: int) -> int:
+        node = self._root
+        best = 0
+        end = min(len(text), start + self._max_length)
+        for i in range(start, end):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if "" in node:
+                best = i - start + 1
+        return best
+
+    def _flush_unknown(self, text: str, start: Optional[int], end: int, tokens: List[str]):
+        if start is None or end <= start:
+            return
+
+        run = text[start:end]
+        if len(run) <= 4:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+
+@lru_cache(maxsize=1)
+def get_segmenter() -> TrieSegmenter:
+    """获取全局分词器（词典树只构建一次）"""
+    words = list(BASE_DICTIONARY)
+
+    # 可通过配置追加自定义词典文件（每行一个词）
+    if settings.TRIGGER_DICTIONARY_PATH:
+        with open(settings.TRIGGER_DICTIONARY_PATH, encoding="utf-8") as f:
+            words.extend(line.strip() for line in f if line.strip())
+
+    return TrieSegmenter(words)
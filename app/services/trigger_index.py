@@ -0,0 +1,103 @@
+from typing import Dict, List
+import heapq
+from app.core.config import settings
+from app.models.user_profile import (
+    EmotionType, TriggerIndex, TriggerTermStats, UserEmotionRecord
+)
+from app.services.text_segmenter import get_segmenter
+
+# 触发因素分析中过滤的停用词
+STOP_WORDS = {
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很',
+    '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这'
+}
+
+# 输出的触发因素数量
+TOP_TRIGGERS = 10
+
+
+def extract_terms(context: str) -> List[str]:
+    """对上下文分词并过滤停用词和单字"""
+    return [
+        term for term in get_segmenter().segment(context)
+        if term not in STOP_WORDS and len(term) > 1
+    ]
+
+
+def build_trigger_index(records: List[UserEmotionRecord]) -> TriggerIndex:
+    """从完整情绪历史构建触发因素索引"""
+    index = TriggerIndex()
+    for record in records:
+        add_record(index, record)
+    return index
+
+
+def add_record(index: TriggerIndex, record: UserEmotionRecord):
+    """
+    把一条记录加入索引，只处理该记录自身的上下文
+
+    未登录词的相邻两字切分会不断产生新词，词数超过TRIGGER_INDEX_MAX_TERMS的两倍时
+    只保留出现次数最高的TRIGGER_INDEX_MAX_TERMS个，索引大小有界
+    """
+    sequence = index.record_count
+    index.record_count += 1
+
+    if not record.context:
+        return
+
+    terms = extract_terms(record.context)
+    if not terms:
+        return
+
+    emotion = record.emotion_type.value if isinstance(record.emotion_type, EmotionType) else str(record.emotion_type)
+
+    for term in terms:
+        stats = index.terms.get(term)
+        if stats is None:
+            stats = TriggerTermStats()
+            index.terms[term] = stats
+        stats.term_count += 1
+
+    # 同一记录中重复出现的词只记一次倒排
+    for term in dict.fromkeys(terms):
+        stats = index.terms[term]
+        stats.records += 1
+        stats.intensity_sum += record.intensity
+        stats.emotion_counts[emotion] = stats.emotion_counts.get(emotion, 0) + 1
+        stats.emotion_first_seen.setdefault(emotion, sequence)
+
+    if len(index.terms) > 2 * settings.TRIGGER_INDEX_MAX_TERMS:
+        _prune_terms(index, settings.TRIGGER_INDEX_MAX_TERMS)
+
+
+def trigger_stats(index: TriggerIndex) -> Dict[str, float]:
+    """
+    由索引得到触发因素统计
+
+    取出现次数最多的词（次数相同按首次出现顺序），输出格式与原先逐条扫描的实现一致
+    """
+    if index.record_count == 0 or not index.terms:
+        return {}
+
+    top_terms = heapq.nlargest(TOP_TRIGGERS, index.terms.items(), key=lambda item: item[1].term_count)
+
+    result = {}
+    for term, stats in top_terms:
+        record_count = stats.records
+        primary_emotion = min(
+            stats.emotion_counts,
+            key=lambda e: (-stats.emotion_counts[e], stats.emotion_first_seen[e])
+        )
+
+        result[term] = record_count / index.record_count
+        result[f"{term}_emotion"] = EmotionType(primary_emotion)
+        result[f"{term}_strength"] = stats.emotion_counts[primary_emotion] / record_count
+        result[f"{term}_intensity"] = stats.intensity_sum / record_count
+
+    return result
+
+
+def _prune_terms(index: TriggerIndex, keep: int):
+    """只保留出现次数最高的keep个词（次数相同保留先出现的），保持原有顺序"""
+    kept = set(heapq.nlargest(keep, index.terms, key=lambda term: index.terms[term].term_count))
+    index.terms = {term: stats for term, stats in index.terms.items() if term in kept}
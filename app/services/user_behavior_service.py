@@ -1,39 +1,83 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import asyncio
 from typing import List, Dict, Optional
-import numpy as np
-from sklearn.cluster import KMeans
 from app.models.user_behavior import (
     UserBehavior, BehaviorPattern, BehaviorInsight,
-    UserBehaviorProfile, BehaviorType
+    UserBehaviorProfile, BehaviorType, BehaviorTransitionModel, BehaviorClusterModel,
+    ActivityBitmap, FunnelQuery
 )
 from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.concurrency import ShardedKeyExecutor
 from app.core.config import settings
+from app.services.profile_snapshots import snapshot_store
+from app.services.cpu_tasks import cluster_behaviors, cpu_executor
+from app.services.behavior_cooccurrence import (
+    build_cooccurrence,
+    add_behaviors as add_cooccurrence_behaviors
+)
+from app.services.activity_bitmap import (
+    active_in_range, day_number, recent_event_count, retention_streak, update_activity
+)
+from app.services.behavior_clusters import (
+    BEHAVIOR_CLUSTERS, behavior_features, cluster_summary, model_from_labels,
+    add_behaviors as add_cluster_behaviors
+)
+from app.services.behavior_archive import archive_store, expired_count, shift_record_counts
+from app.services.behavior_events import epoch_seconds, event_store
+from app.services.behavior_sessions import session_store
+from app.services.behavior_sketches import sketch_store
+from app.services.behavior_transitions import (
+    BEHAVIOR_CODES, predict_next, sequence_summary, update_transition_model,
+    needs_rebuild as transition_needs_rebuild
+)
+from app.services.behavior_totals import top_hours, top_types, update_totals
+from app.services.funnel import (
+    FUNNEL_BATCH_USERS, evaluate_funnel_batch, funnel_report
+)
+
+# 行为记录按user_id分片串行执行：同一用户的读取、归档和写回不会交错
+behavior_update_executor = ShardedKeyExecutor(
+    num_shards=settings.PROFILE_UPDATE_SHARDS,
+    name="behavior_update"
+)
 
 class UserBehaviorService:
-    def __init__(self):
-        self.kmeans = KMeans(n_clusters=3)
-        
     async def record_behavior(self, behavior: UserBehavior) -> UserBehaviorProfile:
         """
         记录用户行为并更新行为画像
+        
+        同一用户的行为按提交顺序串行处理，不同用户的行为并发处理
         """
+        return await behavior_update_executor.submit(
+            behavior.user_id,
+            lambda: self._record_behavior(behavior)
+        )
+    
+    async def _record_behavior(self, behavior: UserBehavior) -> UserBehaviorProfile:
+        """读取画像、加入行为、归档并写回（在该用户的分片中执行）"""
         # 获取现有行为画像
         profile = await self._get_user_behavior_profile(behavior.user_id)
         
+        # 分配会话并更新会话聚合
+        await session_store.assign(profile, behavior)
+        
         # 添加新行为记录
         profile.behavior_history.append(behavior)
         
-        # 更新行为模式
-        await self._update_behavior_patterns(profile)
-        
-        # 更新行为洞察
-        await self._update_behavior_insights(profile)
+        # 更新行为模式和行为洞察
+        await self._update_derived_state(profile)
         
         # 更新时间戳
         profile.last_updated = datetime.utcnow()
         
-        # 保存更新后的画像
-        await self._save_user_behavior_profile(profile)
+        # 较早的行为成批移入归档，画像中只保留最近的行为
+        archived = await self._archive_expired_behaviors(profile)
+        
+        # 保存更新后的画像（行为历史只追加新记录）
+        await self._save_user_behavior_profile(profile, appended=behavior, trimmed=archived > 0)
+        await event_store.record(behavior)
+        snapshot_store.mark_stale(behavior.user_id, "behavior")
+        sketch_store.record(behavior)
         
         return profile
     
@@ -51,206 +95,250 @@ class UserBehaviorService:
         profile = await self._get_user_behavior_profile(user_id)
         return profile.behavior_pattern
     
-    async def _update_behavior_patterns(self, profile: UserBehaviorProfile):
+    async def analyze_funnel(self, query: FunnelQuery) -> Dict:
         """
-        更新行为模式
+        全体用户的漏斗分析
+        
+        从紧凑事件索引中只读取范围内各天、属于漏斗步骤的事件（按用户合并为数组，包括已归档的行为），
+        按批交给CPU进程池并行计算，最后合并各步骤的到达人数
         """
-        # 分析每日模式
-        daily_pattern = self._analyze_daily_pattern(profile.behavior_history)
-        profile.behavior_pattern.daily_pattern = daily_pattern
+        steps = [step.value for step in query.steps]
+        step_codes = [BEHAVIOR_CODES[step] for step in steps]
+        window_seconds = int(query.window_minutes * 60)
+        # 第一步在[start, end)内，后续步骤最晚可到end之后一个窗口
+        events_end = query.end + timedelta(seconds=window_seconds)
+        users = await event_store.load(query.start, events_end, step_codes)
         
-        # 分析每周模式
-        weekly_pattern = self._analyze_weekly_pattern(profile.behavior_history)
-        profile.behavior_pattern.weekly_pattern = weekly_pattern
+        start_before = epoch_seconds(query.end)
+        events = list(users.values())
+        tasks = [
+            cpu_executor.run(evaluate_funnel_batch, events[offset:offset + FUNNEL_BATCH_USERS],
+                             step_codes, window_seconds, start_before)
+            for offset in range(0, len(events), FUNNEL_BATCH_USERS)
+        ]
         
-        # 分析行为序列
-        behavior_sequence = self._analyze_behavior_sequence(profile.behavior_history)
-        profile.behavior_pattern.behavior_sequence = behavior_sequence
+        reached = [0] * len(steps)
+        for batch_reached in await asyncio.gather(*tasks):
+            reached = [total + count for total, count in zip(reached, batch_reached)]
         
-        # 分析行为交互
-        interaction_graph = self._analyze_interaction_graph(profile.behavior_history)
-        profile.behavior_pattern.interaction_graph = interaction_graph
+        return {
+            "steps": funnel_report(steps, reached),
+            "start": query.start,
+            "end": query.end,
+            "window_minutes": query.window_minutes
+        }
     
-    async def _update_behavior_insights(self, profile: UserBehaviorProfile):
+    async def get_population_report(self, start: datetime, end: datetime, top_k: int = 10) -> Dict:
         """
-        更新行为洞察
+        全体用户的近似统计（活跃用户数、高频功能、持续时间分位数），由流式草图得出
         """
-        # 分析活跃时间段
-        active_hours = self._analyze_active_hours(profile.behavior_history)
-        profile.behavior_insight.active_hours = active_hours
-        
-        # 分析最常用功能
-        favorite_features = self._analyze_favorite_features(profile.behavior_history)
-        profile.behavior_insight.favorite_features = favorite_features
+        return await sketch_store.report(start, end, top_k)
+    
+    async def get_session_stats(self, user_id: str, days: int = 30) -> Dict:
+        """
+        获取用户会话统计（由会话聚合得出）
+        """
+        return await session_store.get_session_stats(user_id, days)
+    
+    async def predict_next_behavior(self, user_id: str, current_behavior: Optional[BehaviorType] = None,
+                                    top_k: int = 3) -> Dict:
+        """
+        预测用户的下一个行为
         
-        # 分析行为聚类
-        behavior_clusters = self._analyze_behavior_clusters(profile.behavior_history)
-        profile.behavior_insight.behavior_clusters = behavior_clusters
+        只读取转移模型（不加载行为历史）；current_behavior为空时以最后一条行为为当前行为
+        """
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        db = client[settings.MONGODB_DB_NAME]
         
-        # 计算参与度得分
-        engagement_score = self._calculate_engagement_score(profile.behavior_history)
-        profile.behavior_insight.engagement_score = engagement_score
+        document = await db.user_behaviors.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "transition_model": 1}
+        )
+        model_data = (document or {}).get("transition_model")
+        model = BehaviorTransitionModel.model_validate(model_data) if model_data else BehaviorTransitionModel()
         
-        # 计算留存率得分
-        retention_score = self._calculate_retention_score(profile.behavior_history)
-        profile.behavior_insight.retention_score = retention_score
+        current = current_behavior.value if current_behavior is not None else model.last_type
+        return {
+            "user_id": user_id,
+            "current_behavior": current,
+            "predictions": predict_next(model, current, top_k)
+        }
     
-    def _analyze_daily_pattern(self, behavior_history: List[UserBehavior]) -> Dict[str, int]:
+    async def _update_derived_state(self, profile: UserBehaviorProfile):
         """
-        分析每日行为模式
+        更新行为模式和行为洞察
+        
+        某项增量状态需要从完整历史重建时（旧数据、配置变化、乱序记录），先读取该用户的全部归档
+        临时放回行为历史开头，使重建覆盖已归档的行为；其余增量状态把这些记录视为已计入
         """
-        daily_counts = {}
-        for behavior in behavior_history:
-            hour = behavior.timestamp.hour
-            daily_counts[str(hour)] = daily_counts.get(str(hour), 0) + 1
-        return daily_counts
+        archived = []
+        if profile.archived_count and self._needs_rebuild(profile):
+            archived = await archive_store.load_all(profile.user_id)
+            profile.behavior_history[:0] = archived
+            shift_record_counts(profile, -len(archived))
+        try:
+            await self._update_behavior_patterns(profile)
+            await self._update_behavior_insights(profile)
+        finally:
+            if archived:
+                del profile.behavior_history[:len(archived)]
+                shift_record_counts(profile, len(archived))
     
-    def _analyze_weekly_pattern(self, behavior_history: List[UserBehavior]) -> Dict[str, int]:
-        """
-        分析每周行为模式
-        """
-        weekly_counts = {}
-        for behavior in behavior_history:
-            weekday = behavior.timestamp.weekday()
-            weekly_counts[str(weekday)] = weekly_counts.get(str(weekday), 0) + 1
-        return weekly_counts
+    def _needs_rebuild(self, profile: UserBehaviorProfile) -> bool:
+        """是否有增量状态无法在当前行为历史上继续增量更新"""
+        history = profile.behavior_history
+        return (
+            transition_needs_rebuild(profile.transition_model, history,
+                                     settings.BEHAVIOR_TRANSITION_HALF_LIFE_HOURS)
+            or self._cooccurrence_stale(profile)
+            or self._clusters_stale(profile)
+            or any(state is None or state.record_count > len(history)
+                   for state in (profile.totals, profile.activity))
+        )
+    
+    def _cooccurrence_stale(self, profile: UserBehaviorProfile) -> bool:
+        index = profile.cooccurrence_index
+        window_seconds = settings.BEHAVIOR_COOCCURRENCE_WINDOW_MINUTES * 60
+        return (index is None or index.window_seconds != window_seconds
+                or index.record_count > len(profile.behavior_history))
     
-    def _analyze_behavior_sequence(self, behavior_history: List[UserBehavior]) -> List[Dict[str, float]]:
-        """
-        分析行为序列模式
-        """
-        sequences = []
-        for i in range(len(behavior_history) - 1):
-            current = behavior_history[i].behavior_type
-            next_behavior = behavior_history[i + 1].behavior_type
-            sequences.append({
-                "from": current,
-                "to": next_behavior,
-                "probability": 1.0  # 简化版本，实际应该计算概率
-            })
-        return sequences
+    def _clusters_stale(self, profile: UserBehaviorProfile) -> bool:
+        model = profile.cluster_model
+        return (model is None or model.n_clusters != BEHAVIOR_CLUSTERS
+                or model.record_count > len(profile.behavior_history))
     
-    def _analyze_interaction_graph(self, behavior_history: List[UserBehavior]) -> Dict[str, Dict[str, float]]:
+    async def _update_behavior_patterns(self, profile: UserBehaviorProfile):
         """
-        分析行为交互图
+        更新行为模式
         """
-        graph = {}
-        for behavior in behavior_history:
-            behavior_type = behavior.behavior_type
-            if behavior_type not in graph:
-                graph[behavior_type] = {}
-            
-            # 分析与其他行为的关联
-            for other_behavior in behavior_history:
-                if other_behavior.behavior_type != behavior_type:
-                    if other_behavior.behavior_type not in graph[behavior_type]:
-                        graph[behavior_type][other_behavior.behavior_type] = 0.0
-                    graph[behavior_type][other_behavior.behavior_type] += 1.0
-        
-        return graph
+        # 累计各小时、星期和类型的行为数（覆盖已归档的行为）
+        profile.totals = update_totals(profile.totals, profile.behavior_history)
+        
+        # 每日模式和每周模式
+        profile.behavior_pattern.daily_pattern = dict(profile.totals.hour_counts)
+        profile.behavior_pattern.weekly_pattern = dict(profile.totals.weekday_counts)
+        
+        # 分析行为序列（增量更新转移模型）
+        profile.transition_model = update_transition_model(
+            profile.transition_model,
+            profile.behavior_history,
+            settings.BEHAVIOR_TRANSITION_HALF_LIFE_HOURS
+        )
+        profile.behavior_pattern.behavior_sequence = sequence_summary(profile.transition_model)
+        
+        # 分析行为交互（增量维护）
+        self._update_interaction_graph(profile)
     
-    def _analyze_active_hours(self, behavior_history: List[UserBehavior]) -> List[int]:
+    async def _update_behavior_insights(self, profile: UserBehaviorProfile):
         """
-        分析活跃时间段
+        更新行为洞察
         """
-        hour_counts = {}
-        for behavior in behavior_history:
-            hour = behavior.timestamp.hour
-            hour_counts[hour] = hour_counts.get(hour, 0) + 1
+        # 活跃时间段和最常用功能（由累计次数得出）
+        profile.behavior_insight.active_hours = top_hours(profile.totals, limit=3)
+        profile.behavior_insight.favorite_features = top_types(profile.totals, limit=5)
+        
+        # 分析行为聚类
+        behavior_clusters = await self._update_behavior_clusters(profile)
+        profile.behavior_insight.behavior_clusters = behavior_clusters
         
-        # 返回最活跃的3个时间段
-        return sorted(hour_counts.items(), key=lambda x: x[1], reverse=True)[:3]
+        # 更新每日活跃位图，参与度和留存率由位图计算
+        profile.activity = update_activity(profile.activity, profile.behavior_history)
+        
+        # 计算参与度得分
+        engagement_score = self._calculate_engagement_score(profile.activity)
+        profile.behavior_insight.engagement_score = engagement_score
+        
+        # 计算留存率得分
+        retention_score = self._calculate_retention_score(profile.activity)
+        profile.behavior_insight.retention_score = retention_score
     
-    def _analyze_favorite_features(self, behavior_history: List[UserBehavior]) -> List[str]:
-        """
-        分析最常用功能
+    def _update_interaction_graph(self, profile: UserBehaviorProfile):
         """
-        feature_counts = {}
-        for behavior in behavior_history:
-            feature = behavior.behavior_type
-            feature_counts[feature] = feature_counts.get(feature, 0) + 1
+        更新行为交互图：统计同一时间窗口内不同类型行为的共现次数
         
-        # 返回使用频率最高的5个功能
-        return sorted(feature_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+        状态与行为历史一致时只加入新记录（每条记录只与窗口内的行为配对），
+        否则（旧数据、窗口配置变化）从完整历史重建
+        """
+        history = profile.behavior_history
+        index = profile.cooccurrence_index
+        if self._cooccurrence_stale(profile):
+            index, graph = build_cooccurrence(history, settings.BEHAVIOR_COOCCURRENCE_WINDOW_MINUTES * 60)
+            profile.cooccurrence_index = index
+            profile.behavior_pattern.interaction_graph = graph
+        else:
+            add_cooccurrence_behaviors(index, profile.behavior_pattern.interaction_graph, history)
     
-    def _analyze_behavior_clusters(self, behavior_history: List[UserBehavior]) -> List[Dict[str, float]]:
+    async def _update_behavior_clusters(self, profile: UserBehaviorProfile) -> List[Dict[str, float]]:
         """
-        分析行为聚类
+        更新行为聚类
+        
+        簇中心随画像保存，新行为只做一次O(簇数)的增量更新，簇编号在调用之间保持稳定；
+        没有聚类模型的旧数据先在最近BEHAVIOR_CLUSTER_FIT_WINDOW条行为上做一次完整KMeans（CPU进程池中执行）
         """
-        if not behavior_history:
-            return []
-            
-        # 准备特征数据
-        features = []
-        for behavior in behavior_history:
-            features.append([
-                behavior.timestamp.hour,
-                behavior.timestamp.weekday(),
-                behavior.duration or 0
-            ])
-        
-        features = np.array(features)
-        
-        # 聚类分析
-        clusters = self.kmeans.fit_predict(features)
-        
-        # 计算每个聚类的特征
-        cluster_features = []
-        for i in range(3):
-            cluster_data = features[clusters == i]
-            if len(cluster_data) > 0:
-                cluster_features.append({
-                    "cluster_id": i,
-                    "avg_hour": float(np.mean(cluster_data[:, 0])),
-                    "avg_weekday": float(np.mean(cluster_data[:, 1])),
-                    "avg_duration": float(np.mean(cluster_data[:, 2]))
-                })
-        
-        return cluster_features
+        history = profile.behavior_history
+        model = profile.cluster_model
+        if self._clusters_stale(profile):
+            window = history[-settings.BEHAVIOR_CLUSTER_FIT_WINDOW:] if len(history) > BEHAVIOR_CLUSTERS else []
+            if window:
+                features = behavior_features(window)
+                labels = await cpu_executor.run(cluster_behaviors, features, BEHAVIOR_CLUSTERS)
+                model = model_from_labels(features, labels, BEHAVIOR_CLUSTERS, len(history))
+            else:
+                model = BehaviorClusterModel(n_clusters=BEHAVIOR_CLUSTERS, centers=[], counts=[])
+            profile.cluster_model = model
+        
+        add_cluster_behaviors(model, history)
+        return cluster_summary(model)
     
-    def _calculate_engagement_score(self, behavior_history: List[UserBehavior]) -> float:
+    def _calculate_engagement_score(self, activity: ActivityBitmap) -> float:
         """
         计算参与度得分
         """
-        if not behavior_history:
-            return 0.0
-            
-        # 计算最近7天的行为频率
-        recent_behaviors = [
-            b for b in behavior_history
-            if b.timestamp > datetime.utcnow() - timedelta(days=7)
-        ]
+        # 计算最近7天（按日，包括今天）的行为频率
+        recent_count = recent_event_count(activity, day_number(datetime.utcnow()))
         
         # 计算得分（0-1）
-        score = min(len(recent_behaviors) / 100, 1.0)
+        score = min(recent_count / 100, 1.0)
         return float(score)
     
-    def _calculate_retention_score(self, behavior_history: List[UserBehavior]) -> float:
+    def _calculate_retention_score(self, activity: ActivityBitmap) -> float:
         """
         计算留存率得分
         """
-        if not behavior_history:
-            return 0.0
-            
-        # 计算用户连续活跃天数
-        dates = sorted(set(b.timestamp.date() for b in behavior_history))
-        if not dates:
-            return 0.0
-            
-        consecutive_days = 1
-        current_date = dates[-1]
-        
-        for date in reversed(dates[:-1]):
-            if (current_date - date).days == 1:
-                consecutive_days += 1
-                current_date = date
-            else:
-                break
+        # 计算截至最后活跃日的连续活跃天数
+        consecutive_days = retention_streak(activity, limit=30)
         
         # 计算得分（0-1）
         score = min(consecutive_days / 30, 1.0)
         return float(score)
     
+    async def get_active_user_counts(self, day: Optional[date] = None) -> Dict:
+        """
+        统计某天的日活、周活、月活用户数（截至该天的最近1/7/30天内有行为的用户）
+        
+        只读取各用户的活跃位图，按位判断每个用户在各窗口内是否活跃
+        """
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        db = client[settings.MONGODB_DB_NAME]
+        
+        day = day or datetime.utcnow().date()
+        target = (day - date(1970, 1, 1)).days
+        counts = {"dau": 0, "wau": 0, "mau": 0}
+        windows = {"dau": 1, "wau": 7, "mau": 30}
+        
+        cursor = db.user_behaviors.find(
+            {"activity.first_day": {"$lte": target}},
+            {"_id": 0, "activity.first_day": 1, "activity.bits": 1}
+        )
+        async for document in cursor:
+            activity = document["activity"]
+            bits = int.from_bytes(activity["bits"], "little")
+            for name, days in windows.items():
+                if active_in_range(bits, activity["first_day"], target - days + 1, target):
+                    counts[name] += 1
+        
+        return {"date": day.isoformat(), **counts}
+    
     # 数据库操作方法
     async def _get_user_behavior_profile(self, user_id: str) -> UserBehaviorProfile:
         """从数据库获取用户行为画像"""
@@ -261,7 +349,7 @@ class UserBehaviorService:
         
         if profile_data:
             # 如果找到了用户行为画像数据，就转换为UserBehaviorProfile对象
-            return UserBehaviorProfile(**profile_data)
+            return UserBehaviorProfile.model_validate(profile_data)
         else:
             # 如果没有找到，创建一个新的空用户行为画像
             current_time = datetime.utcnow()
@@ -272,14 +360,16 @@ class UserBehaviorService:
                     daily_pattern={},
                     weekly_pattern={},
                     behavior_sequence=[],
-                    interaction_graph={}
+                    interaction_graph={},
+                    last_updated=current_time
                 ),
                 behavior_insight=BehaviorInsight(
                     active_hours=[],
                     favorite_features=[],
                     behavior_clusters=[],
                     engagement_score=0.0,
-                    retention_score=0.0
+                    retention_score=0.0,
+                    last_updated=current_time
                 ),
                 last_updated=current_time
             )
@@ -289,17 +379,46 @@ class UserBehaviorService:
             
             return new_profile
     
-    async def _save_user_behavior_profile(self, profile: UserBehaviorProfile):
-        """保存用户行为画像到数据库"""
+    async def _archive_expired_behaviors(self, profile: UserBehaviorProfile) -> int:
+        """
+        把超出保留范围的较早行为移入归档，返回移动的记录数
+        
+        先写归档再从画像中移除；其间出错时记录仍留在画像中，下次再移动
+        """
+        count = expired_count(profile, datetime.utcnow())
+        if not count:
+            return 0
+        
+        await archive_store.archive(profile.user_id, profile.behavior_history[:count])
+        del profile.behavior_history[:count]
+        profile.archived_count += count
+        shift_record_counts(profile, count)
+        return count
+    
+    async def _save_user_behavior_profile(self, profile: UserBehaviorProfile,
+                                          appended: Optional[UserBehavior] = None, trimmed: bool = False):
+        """
+        保存用户行为画像到数据库
+        
+        appended为本次新增的行为时，行为历史只追加这一条（trimmed时同时截去已归档的开头部分），
+        其余字段大小有界，每次写入的数据量不随历史增长
+        """
         client = AsyncIOMotorClient(settings.MONGODB_URL)
         db = client[settings.MONGODB_DB_NAME]
         
         # 将UserBehaviorProfile对象转换为字典
         profile_dict = profile.dict(by_alias=True)
+        update = {"$set": profile_dict}
+        if appended is not None:
+            del profile_dict["behavior_history"]
+            push = {"$each": [appended.dict(by_alias=True)]}
+            if trimmed:
+                push["$slice"] = -len(profile.behavior_history)
+            update["$push"] = {"behavior_history": push}
         
         # 更新或插入用户行为画像数据
         await db.user_behaviors.update_one(
             {"user_id": profile.user_id},
-            {"$set": profile_dict},
+            update,
             upsert=True
         ) 
\ No newline at end of file
@@ -1,25 +1,91 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier
 from app.models.user_profile import (
     UserProfile, UserEmotionRecord, UserPersonality,
     UserInterests, UserEmotionPattern, EmotionPrediction,
-    PersonalizedRecommendation, EmotionType
+    PersonalizedRecommendation, EmotionType, EmotionAccumulators, ProfileStaleness
+)
+from app.core.cache import LRUTTLCache, LocalSharedCache, ReadThroughCache
+from app.core.concurrency import KeyedDebouncer, ShardedKeyExecutor
+from app.core.config import settings
+from app.services.emotion_columns import (
+    EmotionColumns, EMOTION_TYPES, EMOTION_CODES,
+    sequential_sum, dominant_code
+)
+from app.services.emotion_accumulators import (
+    TIME_PERIODS, WEEKDAY_NAMES, PATTERN_POSITIVE_EMOTIONS,
+    PATTERN_NEGATIVE_EMOTIONS, NEGATIVE_EMOTIONS,
+    apply_record, build_accumulators, resync_emotion_changes,
+    emotional_stability, personality_inputs, is_social_context, period_of,
+    daily_pattern as accumulated_daily_pattern,
+    weekly_pattern as accumulated_weekly_pattern
+)
+from app.services.trigger_index import (
+    build_trigger_index, trigger_stats,
+    add_record as add_trigger_record
+)
+from app.services.emotion_features import (
+    STORED_FEATURE_NAMES, assemble_features, stored_feature_vector
+)
+from app.services.emotion_predictor import emotion_predictor
+from app.services.feature_store import feature_store
+from app.services.profile_invalidations import profile_invalidations
+from app.services.profile_snapshots import snapshot_store
+from app.services.cpu_tasks import cpu_executor, recompute_profile_sections
+from app.services.keyword_index import (
+    build_keyword_index, interest_summary, coping_summary,
+    add_records as add_keyword_records, is_current as keyword_index_is_current
+)
+import asyncio
+
+# 用户画像读穿透缓存，所有UserProfileService实例共享
+profile_cache = ReadThroughCache(
+    LRUTTLCache(
+        max_size=settings.PROFILE_CACHE_MAX_SIZE,
+        ttl_seconds=settings.PROFILE_CACHE_TTL_SECONDS
+    ),
+    shared=LocalSharedCache() if settings.PROFILE_CACHE_SHARED_ENABLED else None,
+    serialize=lambda profile: profile.dict(by_alias=True),
+    deserialize=UserProfile.model_validate
+)
+
+# 画像更新按user_id分片串行执行，保证同一用户的更新顺序
+profile_update_executor = ShardedKeyExecutor(
+    num_shards=settings.PROFILE_UPDATE_SHARDS,
+    name="profile_update"
+)
+
+# 派生数据后台重算：同一用户窗口内的多条新记录合并为一次重算
+profile_recompute_debouncer = KeyedDebouncer(
+    delay_seconds=settings.PROFILE_RECOMPUTE_DEBOUNCE_SECONDS,
+    name="profile_recompute"
 )
 
 class UserProfileService:
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.emotion_classifier = RandomForestClassifier()
-        
-    async def update_user_profile(self, user_id: str, emotion_record: UserEmotionRecord) -> UserProfile:
+    async def update_user_profile(self, user_id: str, emotion_record: UserEmotionRecord,
+                                  sync: Optional[bool] = None) -> UserProfile:
         """
         更新用户画像
+        
+        记录写入后立即返回，派生数据（模式、性格、兴趣等）标记为待更新，
+        由后台任务在合并窗口内一次性重算；sync=True时同步重算后再返回。
+        同一用户的更新按提交顺序串行执行，不同用户的更新并发执行
+        """
+        if sync is None:
+            sync = settings.PROFILE_RECOMPUTE_SYNC
+        return await profile_update_executor.submit(
+            user_id,
+            lambda: self._apply_profile_update(user_id, emotion_record, sync)
+        )
+    
+    async def _apply_profile_update(self, user_id: str, emotion_record: UserEmotionRecord,
+                                    sync: bool = False) -> UserProfile:
+        """
+        执行单次画像更新（读取-修改-写回）
         """
-        # 获取现有用户画像
-        profile = await self._get_user_profile(user_id)
+        # 获取现有用户画像（写路径直接读数据库，避免基于缓存数据修改）
+        profile = await self._get_user_profile(user_id, use_cache=False)
         
         # 更新情绪历史
         profile.emotion_history.append(emotion_record)
@@ -27,17 +93,15 @@ class UserProfileService:
         # 更新当前情绪
         profile.current_emotion = emotion_record
         
-        # 更新情绪模式
-        await self._update_emotion_patterns(profile)
+        # 标记派生数据待更新
+        profile.staleness.pending_records += 1
+        if profile.staleness.dirty_since is None:
+            profile.staleness.dirty_since = datetime.utcnow()
         
-        # 更新性格特征
-        await self._update_personality(profile)
-        
-        # 更新兴趣偏好
-        await self._update_interests(profile)
-        
-        # 计算情绪稳定性
-        profile.emotional_stability = self._calculate_emotional_stability(profile)
+        if sync:
+            # 同步重算已包含所有待处理记录，取消尚未执行的后台重算
+            profile_recompute_debouncer.cancel(user_id)
+            await self._recompute_in_executor(profile)
         
         # 更新时间戳
         profile.last_updated = datetime.utcnow()
@@ -45,32 +109,210 @@ class UserProfileService:
         # 保存更新后的画像
         await self._save_user_profile(profile)
         
+        snapshot_store.mark_stale(user_id, "emotion")
+        if not sync:
+            profile_recompute_debouncer.schedule(
+                user_id,
+                lambda: profile_update_executor.submit(
+                    user_id,
+                    lambda: self._refresh_derived_sections(user_id)
+                )
+            )
+        
         return profile
     
+    async def refresh_user_profile(self, user_id: str) -> UserProfile:
+        """
+        立即重算用户画像中待更新的派生数据并返回最新画像
+        
+        与该用户的其他更新串行执行，没有待处理记录时直接返回
+        """
+        profile_recompute_debouncer.cancel(user_id)
+        return await profile_update_executor.submit(
+            user_id,
+            lambda: self._refresh_derived_sections(user_id)
+        )
+    
+    async def _refresh_derived_sections(self, user_id: str) -> UserProfile:
+        """重算派生数据并保存（只应在profile_update_executor中执行）"""
+        profile = await self._get_user_profile(user_id, use_cache=False)
+        if profile.staleness.pending_records == 0:
+            return profile
+        
+        await self._recompute_in_executor(profile)
+        await self._save_user_profile(profile)
+        snapshot_store.mark_stale(user_id, "emotion")
+        return profile
+    
+    async def _recompute_in_executor(self, profile: UserProfile):
+        """
+        重新计算派生数据，避免CPU密集的分析阻塞事件循环
+        
+        需要从完整历史重建时交给CPU进程池（不受GIL限制，并受并发上限约束）；
+        增量路径只处理新记录，在线程池中执行，省去画像在进程间传递的开销
+        """
+        if self._needs_full_rebuild(profile):
+            derived = await cpu_executor.run(recompute_profile_sections, profile)
+            for field, value in derived.items():
+                setattr(profile, field, value)
+            return
+        
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._recompute_derived_sections, profile)
+    
+    def _needs_full_rebuild(self, profile: UserProfile) -> bool:
+        """累加状态或索引缺失、与情绪历史不一致时需要完整重建"""
+        record_count = len(profile.emotion_history)
+        return any(
+            state is None or state.record_count > record_count
+            for state in (profile.accumulators, profile.trigger_index, profile.keyword_index)
+        )
+    
+    def _recompute_derived_sections(self, profile: UserProfile):
+        """
+        重新计算情绪模式、性格特征、兴趣偏好和情绪稳定性
+        
+        累加状态和索引与情绪历史一致时只补上尚未计入的记录（增量路径，
+        多条待处理记录一次处理完），否则从完整历史重建，并用列式分析函数精确计算
+        """
+        history = profile.emotion_history
+        accumulators = profile.accumulators
+        incremental = accumulators is not None and accumulators.record_count <= len(history)
+        
+        if incremental:
+            for record in history[accumulators.record_count:]:
+                apply_record(accumulators, record)
+            if accumulators.changes_dirty:
+                resync_emotion_changes(accumulators, history)
+        else:
+            profile.accumulators = build_accumulators(history)
+            accumulators = None
+        
+        # 触发因素倒排索引：与历史一致时只加入新记录，否则重建
+        trigger_index = profile.trigger_index
+        if trigger_index is not None and trigger_index.record_count <= len(history):
+            for record in history[trigger_index.record_count:]:
+                add_trigger_record(trigger_index, record)
+        else:
+            profile.trigger_index = build_trigger_index(history)
+        
+        # 兴趣活动和应对策略关键词索引：同上，关键词表变化后也重建
+        keyword_index = profile.keyword_index
+        if (keyword_index is not None and keyword_index.record_count <= len(history)
+                and keyword_index_is_current(keyword_index)):
+            add_keyword_records(keyword_index, history)
+        else:
+            profile.keyword_index = build_keyword_index(history)
+        
+        # 列式情绪历史只在完整计算路径上构建，供各分析函数共用
+        columns = EmotionColumns.from_records(history) if accumulators is None else None
+        
+        # 更新情绪模式
+        self._update_emotion_patterns(profile, columns, accumulators)
+        
+        # 更新性格特征
+        self._update_personality(profile, columns, accumulators)
+        
+        # 更新兴趣偏好
+        self._update_interests(profile)
+        
+        # 计算情绪稳定性
+        if accumulators is not None:
+            profile.emotional_stability = emotional_stability(accumulators)
+        else:
+            profile.emotional_stability = self._calculate_emotional_stability(columns)
+        
+        # 派生数据已与情绪历史同步
+        profile.staleness = ProfileStaleness(derived_updated_at=datetime.utcnow())
+    
+    def get_update_metrics(self) -> Dict:
+        """
+        获取画像更新分片队列、后台重算和CPU进程池的指标
+        """
+        metrics = profile_update_executor.get_metrics()
+        metrics["recompute"] = profile_recompute_debouncer.get_metrics()
+        metrics["cpu"] = cpu_executor.get_metrics()
+        metrics["invalidations"] = profile_invalidations.get_metrics()
+        return metrics
+    
+    def listen_for_invalidations(self):
+        """服务启动时开始轮询离线任务发布的失效通知"""
+        profile_invalidations.start(self._invalidate_cached)
+    
+    async def _invalidate_cached(self, user_id: str):
+        """丢弃本进程缓存的画像和预测特征，下次读取时从数据库加载"""
+        await profile_cache.invalidate(user_id)
+        feature_store.invalidate(user_id)
+    
     async def predict_emotion(self, user_id: str, context: Dict) -> EmotionPrediction:
         """
         预测用户当前情绪
         """
-        profile = await self._get_user_profile(user_id)
+        # 当前用户还没有画像时与读取画像一致，创建空画像后按默认特征预测
+        predictions = await self.predict_emotions([user_id], context, create_missing=True)
+        return predictions[user_id]
+    
+    async def predict_emotions(self, user_ids: List[str], context: Dict,
+                               create_missing: bool = False) -> Dict[str, EmotionPrediction]:
+        """
+        批量预测多个用户当前的情绪
         
-        # 准备特征数据
-        features = self._prepare_prediction_features(profile, context)
+        从特征库读取每个用户的定长特征向量（不加载完整画像），
+        堆叠成一个特征矩阵后只做一次predict_proba。
+        没有画像的用户默认不在结果中，create_missing为True时为其创建空画像
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        vectors = await feature_store.get_many(user_ids)
+        
+        # 特征库中还没有的用户（例如历史数据）从画像计算并补写
+        missing = [user_id for user_id in user_ids if user_id not in vectors]
+        if missing:
+            load = self._get_user_profile if create_missing else self._find_user_profile
+            profiles = await asyncio.gather(*(load(user_id) for user_id in missing))
+            for user_id, profile in zip(missing, profiles):
+                if profile is None:
+                    continue
+                vectors[user_id] = stored_feature_vector(profile)
+                await feature_store.put(user_id, vectors[user_id])
+            user_ids = [user_id for user_id in user_ids if user_id in vectors]
+        
+        if user_ids:
+            stored = np.stack([vectors[user_id] for user_id in user_ids])
+        else:
+            stored = np.empty((0, len(STORED_FEATURE_NAMES)), dtype=np.float32)
+        return self._predict_from_stored(user_ids, stored, context)
+    
+    async def predict_all_emotions(self, context: Dict) -> Dict[str, EmotionPrediction]:
+        """为特征库中的全部用户预测情绪（整表特征一次读出、一次打分）"""
+        user_ids, stored = await feature_store.load_matrix()
+        return self._predict_from_stored(user_ids, stored, context)
+    
+    def _predict_from_stored(self, user_ids: List[str], stored: np.ndarray,
+                             context: Dict) -> Dict[str, EmotionPrediction]:
+        # 补上时间和上下文特征
+        now = datetime.utcnow()
+        features = assemble_features(stored, context, now)
         
         # 预测情绪
-        prediction = self._predict_emotion(features)
+        predictions = emotion_predictor.predict(features)
         
-        return EmotionPrediction(
-            predicted_emotion=prediction['emotion'],
-            confidence=prediction['confidence'],
-            factors=prediction['factors'],
-            timestamp=datetime.utcnow()
-        )
+        return {
+            user_id: EmotionPrediction(
+                predicted_emotion=prediction['emotion'],
+                confidence=prediction['confidence'],
+                factors=prediction['factors'],
+                timestamp=now
+            )
+            for user_id, prediction in zip(user_ids, predictions)
+        }
     
-    async def generate_recommendations(self, user_id: str, context: Dict) -> List[PersonalizedRecommendation]:
+    async def generate_recommendations(self, user_id: str, context: Dict,
+                                       profile: Optional[UserProfile] = None) -> List[PersonalizedRecommendation]:
         """
-        生成个性化推荐
+        生成个性化推荐（调用方已获取画像时可直接传入，避免重复读取）
         """
-        profile = await self._get_user_profile(user_id)
+        if profile is None:
+            profile = await self._get_user_profile(user_id)
         current_emotion = profile.current_emotion
         
         recommendations = []
@@ -108,126 +350,75 @@ class UserProfileService:
         
         return recommendations[:5]  # 返回前5个最相关的推荐
     
-    async def _update_emotion_patterns(self, profile: UserProfile):
+    def _update_emotion_patterns(self, profile: UserProfile, columns: Optional[EmotionColumns],
+                                 accumulators: Optional[EmotionAccumulators] = None):
         """
-        更新情绪模式
+        更新情绪模式（提供累加状态时，每日/每周模式直接由累加状态得出）
+        
+        调用前需确保profile.trigger_index和profile.keyword_index已与情绪历史同步
         """
         # 分析每日模式
-        daily_pattern = self._analyze_daily_pattern(profile.emotion_history)
+        if accumulators is not None:
+            daily_pattern = accumulated_daily_pattern(accumulators)
+        else:
+            daily_pattern = self._analyze_daily_pattern(columns)
         profile.emotion_pattern.daily_pattern = daily_pattern
         
         # 分析每周模式
-        weekly_pattern = self._analyze_weekly_pattern(profile.emotion_history)
+        if accumulators is not None:
+            weekly_pattern = accumulated_weekly_pattern(accumulators)
+        else:
+            weekly_pattern = self._analyze_weekly_pattern(columns)
         profile.emotion_pattern.weekly_pattern = weekly_pattern
         
-        # 分析触发因素
-        triggers = self._analyze_triggers(profile.emotion_history)
+        # 分析触发因素（由倒排索引直接得出）
+        triggers = trigger_stats(profile.trigger_index)
         profile.emotion_pattern.triggers = triggers
         
-        # 分析应对策略
-        coping_strategies = self._analyze_coping_strategies(profile.emotion_history)
+        # 分析应对策略（由关键词索引直接得出）
+        coping_strategies = coping_summary(profile.keyword_index)
         profile.emotion_pattern.coping_strategies = coping_strategies
     
-    async def _update_personality(self, profile: UserProfile):
+    def _update_personality(self, profile: UserProfile, columns: Optional[EmotionColumns],
+                            accumulators: Optional[EmotionAccumulators] = None):
         """
         更新性格特征
         """
         # 基于情绪历史分析性格特征
-        personality_scores = self._analyze_personality(profile.emotion_history)
+        if accumulators is not None:
+            personality_scores = self._score_personality(personality_inputs(accumulators))
+        else:
+            personality_scores = self._analyze_personality(columns)
         profile.personality = UserPersonality(
             **personality_scores,
             last_updated=datetime.utcnow()
         )
     
-    async def _update_interests(self, profile: UserProfile):
+    def _update_interests(self, profile: UserProfile):
         """
-        更新兴趣偏好
+        更新兴趣偏好（由关键词索引直接得出）
         """
         # 分析用户兴趣
-        interests = self._analyze_interests(profile.emotion_history)
+        interests = interest_summary(profile.keyword_index)
         profile.interests = UserInterests(
             **interests,
             last_updated=datetime.utcnow()
         )
     
-    def _calculate_emotional_stability(self, profile: UserProfile) -> float:
+    def _calculate_emotional_stability(self, columns: EmotionColumns) -> float:
         """
         计算情绪稳定性指标
         """
-        if not profile.emotion_history:
-            return 0.5
-            
-        # 计算情绪波动
-        emotions = [record.intensity for record in profile.emotion_history[-30:]]
-        if not emotions:
+        if len(columns) == 0:
             return 0.5
             
-        # 计算标准差
-        std = np.std(emotions)
+        # 计算最近30条记录的情绪波动（标准差）
+        std = np.std(columns.intensities[-30:])
         # 转换为0-1的稳定性指标
         stability = 1 - min(std, 1)
         
         return float(stability)
     
-    def _prepare_prediction_features(self, profile: UserProfile, context: Dict) -> np.ndarray:
-        """
-        准备预测特征
-        """
-        features = []
-        
-        # 添加时间特征
-        current_hour = datetime.utcnow().hour
-        features.extend([
-            np.sin(2 * np.pi * current_hour / 24),
-            np.cos(2 * np.pi * current_hour / 24)
-        ])
-        
-        # 添加历史情绪特征
-        if profile.emotion_history:
-            recent_emotions = [record.intensity for record in profile.emotion_history[-5:]]
-            features.extend(recent_emotions)
-        else:
-            features.extend([0.5] * 5)
-        
-        # 添加性格特征
-        features.extend([
-            profile.personality.openness,
-            profile.personality.conscientiousness,
-            profile.personality.extraversion,
-            profile.personality.agreeableness,
-            profile.personality.neuroticism
-        ])
-        
-        # 添加上下文特征
-        features.extend([
-            context.get('time_of_day', 0.5),
-            context.get('day_of_week', 0.5),
-            context.get('weather_score', 0.5)
-        ])
-        
-        return np.array(features).reshape(1, -1)
-    
-    def _predict_emotion(self, features: np.ndarray) -> Dict:
-        """
-        预测情绪
-        """
-        # 标准化特征
-        scaled_features = self.scaler.fit_transform(features)
-        
-        # 预测情绪类型
-        prediction = self.emotion_classifier.predict_proba(scaled_features)[0]
-        emotion_idx = np.argmax(prediction)
-        confidence = prediction[emotion_idx]
-        
-        # 获取影响因素
-        factors = self._get_prediction_factors(features[0])
-        
-        return {
-            'emotion': EmotionType(emotion_idx),
-            'confidence': float(confidence),
-            'factors': factors
-        }
-    
     def _generate_emotion_improvement_recommendations(self, profile: UserProfile) -> List[PersonalizedRecommendation]:
         """
         生成情绪改善建议
@@ -287,18 +478,21 @@ class UserProfileService:
         recommendations = []
         current_hour = datetime.utcnow().hour
         
-        # 根据每日模式推荐活动时间
-        for hour, intensity in profile.emotion_pattern.daily_pattern.items():
-            if abs(int(hour) - current_hour) < 2 and intensity > 0.7:
-                recommendations.append(
-                    PersonalizedRecommendation(
-                        type="timing",
-                        content=f"现在是进行{hour}点常做活动的好时机",
-                        reason="基于您的日常模式",
-                        relevance_score=intensity,
-                        user_context={"current_time": current_hour}
-                    )
+        period_labels = {"morning": "上午", "afternoon": "下午", "evening": "晚上", "night": "深夜"}
+        
+        # 根据每日模式推荐活动时间（每日模式按时间段统计，见TIME_PERIODS）
+        current_period = period_of(current_hour)
+        intensity = profile.emotion_pattern.daily_pattern.get(f"{current_period}_positive", 0)
+        if intensity > 0.7:
+            recommendations.append(
+                PersonalizedRecommendation(
+                    type="timing",
+                    content=f"现在是{period_labels[current_period]}，是进行常做活动的好时机",
+                    reason="基于您的日常模式",
+                    relevance_score=intensity,
+                    user_context={"current_time": current_hour}
                 )
+            )
         
         return recommendations
     
@@ -403,7 +597,30 @@ class UserProfileService:
         return recommendations
     
     # 其他辅助方法...
-    async def _get_user_profile(self, user_id: str) -> UserProfile:
+    async def _get_user_profile(self, user_id: str, use_cache: bool = True) -> UserProfile:
+        """获取用户画像，默认优先读取缓存"""
+        if not use_cache or not settings.PROFILE_CACHE_ENABLED:
+            return await self._load_user_profile(user_id)
+        
+        profile = await profile_cache.get_or_load(
+            user_id,
+            lambda: self._load_user_profile(user_id)
+        )
+        # 返回深拷贝，调用方修改模式、索引等嵌套数据不会影响缓存中的画像；
+        # 情绪记录写入后不再修改，历史只复制列表、共享记录对象，避免逐条深拷贝
+        copied = profile.model_copy(update={"emotion_history": []}).model_copy(deep=True)
+        copied.emotion_history = list(profile.emotion_history)
+        return copied
+    
+    async def _find_user_profile(self, user_id: str) -> Optional[UserProfile]:
+        """从数据库读取已有的用户画像，不存在时返回None（不创建）"""
+        from motor.motor_asyncio import AsyncIOMotorClient
+        
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        profile_data = await client[settings.MONGODB_DB_NAME].user_profiles.find_one({"user_id": user_id})
+        return UserProfile.model_validate(profile_data) if profile_data else None
+    
+    async def _load_user_profile(self, user_id: str) -> UserProfile:
         """从数据库获取用户画像"""
         # 从MongoDB中查询用户画像
         from motor.motor_asyncio import AsyncIOMotorClient
@@ -417,7 +634,7 @@ class UserProfileService:
         
         if profile_data:
             # 如果找到了用户画像数据，就转换为UserProfile对象
-            return UserProfile(**profile_data)
+            return UserProfile.model_validate(profile_data)
         else:
             # 如果没有找到，创建一个新的空用户画像
             current_time = datetime.utcnow()
@@ -430,7 +647,8 @@ class UserProfileService:
                     daily_pattern={},
                     weekly_pattern={},
                     triggers={},
-                    coping_strategies={}
+                    coping_strategies={},
+                    last_updated=current_time
                 ),
                 personality=UserPersonality(
                     openness=0.5,
@@ -471,104 +689,79 @@ class UserProfileService:
             {"$set": profile_dict},
             upsert=True
         )
+        
+        # 画像已变更，使缓存失效
+        await profile_cache.invalidate(profile.user_id)
+        
+        # 同步更新特征库中的预测特征（最近情绪和性格特征）
+        await feature_store.put(profile.user_id, stored_feature_vector(profile))
     
-    def _analyze_daily_pattern(self, emotion_history: List[UserEmotionRecord]) -> Dict[str, float]:
+    def _analyze_daily_pattern(self, columns: EmotionColumns) -> Dict[str, float]:
         """分析一天中不同时间段的情绪模式"""
-        if not emotion_history:
+        if len(columns) == 0:
             return {}
             
-        # 将一天分为四个时间段
-        time_periods = {
-            "morning": (5, 11),    # 5:00-11:59
-            "afternoon": (12, 17), # 12:00-17:59
-            "evening": (18, 22),   # 18:00-22:59
-            "night": (23, 4)       # 23:00-4:59
-        }
-        
-        # 初始化各时间段的情绪数据
-        period_emotions = {period: [] for period in time_periods}
-        
-        # 将情绪记录分配到不同时间段
-        for record in emotion_history:
-            hour = record.timestamp.hour
-            for period, (start, end) in time_periods.items():
-                if start <= hour <= end or (period == "night" and (hour >= start or hour <= end)):
-                    period_emotions[period].append(record)
+        hours = columns.hours
+        positive_mask = columns.emotion_mask(PATTERN_POSITIVE_EMOTIONS)
+        negative_mask = columns.emotion_mask(PATTERN_NEGATIVE_EMOTIONS)
         
-        # 计算每个时间段的平均情绪强度
+        # 计算每个时间段（见TIME_PERIODS）的平均情绪强度
         result = {}
-        for period, records in period_emotions.items():
-            if records:
-                # 计算积极情绪和消极情绪的平均强度
-                positive_records = [r for r in records if r.emotion_type in ["happy", "excited", "content"]]
-                negative_records = [r for r in records if r.emotion_type in ["sad", "angry", "anxious"]]
-                
-                if positive_records:
-                    result[f"{period}_positive"] = sum(r.intensity for r in positive_records) / len(positive_records)
-                if negative_records:
-                    result[f"{period}_negative"] = sum(r.intensity for r in negative_records) / len(negative_records)
-                
-                # 计算主导情绪
-                emotion_types = [r.emotion_type for r in records]
-                if emotion_types:
-                    from collections import Counter
-                    most_common_emotion = Counter(emotion_types).most_common(1)[0][0]
-                    result[f"{period}_dominant"] = most_common_emotion
+        for period, (start, end) in TIME_PERIODS.items():
+            if start <= end:
+                period_mask = (hours >= start) & (hours <= end)
+            else:
+                # 跨越午夜的时间段
+                period_mask = (hours >= start) | (hours <= end)
+            
+            if not period_mask.any():
+                continue
+            
+            # 计算积极情绪和消极情绪的平均强度
+            positive = columns.intensities[period_mask & positive_mask]
+            negative = columns.intensities[period_mask & negative_mask]
+            
+            if len(positive):
+                result[f"{period}_positive"] = sequential_sum(positive) / len(positive)
+            if len(negative):
+                result[f"{period}_negative"] = sequential_sum(negative) / len(negative)
+            
+            # 计算主导情绪
+            dominant, _ = dominant_code(columns.emotion_codes[period_mask])
+            result[f"{period}_dominant"] = EMOTION_TYPES[dominant]
         
         return result
     
-    def _analyze_weekly_pattern(self, emotion_history: List[UserEmotionRecord]) -> Dict[str, float]:
+    def _analyze_weekly_pattern(self, columns: EmotionColumns) -> Dict[str, float]:
         """分析每周不同日期的情绪模式"""
-        if not emotion_history:
+        if len(columns) == 0:
             return {}
             
-        # 星期名称映射
-        weekdays = {
-            0: "monday",
-            1: "tuesday",
-            2: "wednesday",
-            3: "thursday",
-            4: "friday",
-            5: "saturday",
-            6: "sunday"
-        }
-        
-        # 初始化每天的情绪数据
-        day_emotions = {day: [] for day in weekdays.values()}
-        
-        # 将情绪记录分配到不同日期
-        for record in emotion_history:
-            weekday = record.timestamp.weekday()
-            day_name = weekdays[weekday]
-            day_emotions[day_name].append(record)
-        
         # 计算每天的情绪指标
         result = {}
-        for day, records in day_emotions.items():
-            if records:
-                # 计算平均情绪强度
-                avg_intensity = sum(r.intensity for r in records) / len(records)
-                result[f"{day}_intensity"] = avg_intensity
-                
-                # 计算情绪稳定性（强度的标准差）
-                if len(records) > 1:
-                    import numpy as np
-                    intensities = [r.intensity for r in records]
-                    std_intensity = np.std(intensities)
-                    result[f"{day}_stability"] = 1 - min(std_intensity, 1)  # 稳定性 = 1 - 标准差
-                
-                # 计算主导情绪
-                emotion_types = [r.emotion_type for r in records]
-                if emotion_types:
-                    from collections import Counter
-                    emotion_counts = Counter(emotion_types)
-                    most_common = emotion_counts.most_common(1)[0]
-                    result[f"{day}_dominant"] = most_common[0]
-                    result[f"{day}_dominant_frequency"] = most_common[1] / len(records)
+        for weekday, day in WEEKDAY_NAMES.items():
+            day_mask = columns.weekdays == weekday
+            count = int(np.count_nonzero(day_mask))
+            if count == 0:
+                continue
+            
+            # 计算平均情绪强度
+            intensities = columns.intensities[day_mask]
+            result[f"{day}_intensity"] = sequential_sum(intensities) / count
+            
+            # 计算情绪稳定性（强度的标准差）
+            if count > 1:
+                std_intensity = np.std(intensities)
+                result[f"{day}_stability"] = 1 - min(std_intensity, 1)  # 稳定性 = 1 - 标准差
+            
+            # 计算主导情绪
+            dominant, dominant_count = dominant_code(columns.emotion_codes[day_mask])
+            result[f"{day}_dominant"] = EMOTION_TYPES[dominant]
+            result[f"{day}_dominant_frequency"] = dominant_count / count
         
         # 识别情绪最佳和最差的日子
         if result:
-            day_avg_intensities = {day: result.get(f"{day}_intensity", 0) for day in weekdays.values()}
+            day_avg_intensities = {day: result.get(f"{day}_intensity", 0) for day in WEEKDAY_NAMES.values()}
             best_day = max(day_avg_intensities.items(), key=lambda x: x[1])
             worst_day = min(day_avg_intensities.items(), key=lambda x: x[1])
             
@@ -577,141 +770,40 @@ class UserProfileService:
         
         return result
     
-    def _analyze_triggers(self, emotion_history: List[UserEmotionRecord]) -> Dict[str, float]:
-        """分析情绪触发因素"""
-        if not emotion_history:
-            return {}
-            
-        # 提取所有情绪记录中的上下文
-        all_contexts = [r.context for r in emotion_history if r.context]
-        if not all_contexts:
-            return {}
-            
-        # 使用自然语言处理提取关键词
-        # 简化版：我们通过分词和计数来识别常见触发因素
-        from collections import Counter
-        import re
-        
-        # 将上下文拆分为关键词
-        words = []
-        for context in all_contexts:
-            # 简单分词：按空格和标点符号分割
-            context_words = re.findall(r'\w+', context.lower())
-            words.extend(context_words)
-        
-        # 过滤掉常见停用词
-        stop_words = {'的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己', '这'}
-        filtered_words = [word for word in words if word not in stop_words and len(word) > 1]
-        
-        if not filtered_words:
-            return {}
-            
-        # 计算词频，找出最常见的触发因素
-        word_counts = Counter(filtered_words)
-        common_triggers = word_counts.most_common(10)  # 获取前10个最常见的词语
-        
-        # 关联情绪类型与触发因素
-        emotion_triggers = {}
-        for trigger, _ in common_triggers:
-            # 查找含有该触发因素的记录
-            trigger_records = [r for r in emotion_history if r.context and trigger in r.context.lower()]
-            if trigger_records:
-                # 计算该触发因素与各种情绪类型的关联度
-                emotion_counts = Counter([r.emotion_type for r in trigger_records])
-                total = len(trigger_records)
-                
-                # 找出最相关的情绪
-                most_common_emotion = emotion_counts.most_common(1)[0]
-                emotion_triggers[trigger] = {
-                    "frequency": len(trigger_records) / len(emotion_history),
-                    "primary_emotion": most_common_emotion[0],
-                    "primary_emotion_strength": most_common_emotion[1] / total,
-                    "avg_intensity": sum(r.intensity for r in trigger_records) / len(trigger_records)
-                }
-        
-        # 重新组织结果格式
-        result = {}
-        for trigger, data in emotion_triggers.items():
-            result[trigger] = data["frequency"]
-            result[f"{trigger}_emotion"] = data["primary_emotion"]
-            result[f"{trigger}_strength"] = data["primary_emotion_strength"]
-            result[f"{trigger}_intensity"] = data["avg_intensity"]
-            
-        return result
-    
-    def _analyze_coping_strategies(self, emotion_history: List[UserEmotionRecord]) -> Dict[str, float]:
-        """分析用户应对负面情绪的策略及其效果"""
-        if not emotion_history:
-            return {}
-            
-        # 找出负面情绪记录及其后续的情绪记录
-        negative_emotions = ["sad", "angry", "anxious", "fear", "frustrated", "stressed"]
+    def _analyze_personality(self, columns: EmotionColumns) -> Dict[str, float]:
+        """基于情绪历史分析用户性格特征"""
+        total_records = len(columns)
+        if total_records < 5:
+            return self._score_personality(None)
         
-        # 按时间顺序排序情绪历史
-        sorted_history = sorted(emotion_history, key=lambda x: x.timestamp)
+        # 计算情绪类型分布
+        emotion_counts = np.bincount(columns.emotion_codes, minlength=len(EMOTION_TYPES))
         
-        # 分析情绪转变
-        transitions = {}
-        for i in range(len(sorted_history) - 1):
-            current_record = sorted_history[i]
-            next_record = sorted_history[i + 1]
-            
-            # 只关注从负面情绪转变的情况
-            if current_record.emotion_type in negative_emotions:
-                time_diff = (next_record.timestamp - current_record.timestamp).total_seconds() / 3600
-                
-                # 只考虑合理时间窗口内的转变(例如24小时内)
-                if time_diff <= 24:
-                    # 提取当前记录的策略
-                    strategy = current_record.coping_strategy if hasattr(current_record, 'coping_strategy') else None
-                    
-                    # 如果没有明确的策略，尝试从上下文中提取
-                    if not strategy and current_record.context:
-                        # 一些常见的应对策略关键词
-                        strategy_keywords = {
-                            "运动": ["跑步", "健身", "散步", "锻炼", "运动"],
-                            "社交": ["聊天", "交流", "朋友", "社交", "通话"],
-                            "娱乐": ["电影", "音乐", "游戏", "娱乐", "看书", "阅读"],
-                            "放松": ["冥想", "休息", "睡觉", "放松", "休闲"],
-                            "工作": ["工作", "学习", "忙碌", "专注"],
-                            "表达": ["倾诉", "表达", "写作", "日记"]
-                        }
-                        
-                        for strat, keywords in strategy_keywords.items():
-                            if any(keyword in current_record.context for keyword in keywords):
-                                strategy = strat
-                                break
-                    
-                    # 如果找到策略，分析其效果
-                    if strategy:
-                        # 计算情绪变化
-                        if current_record.emotion_type in negative_emotions and next_record.emotion_type not in negative_emotions:
-                            # 从负面到正面：有效
-                            effect = 1.0
-                        elif current_record.intensity > next_record.intensity and current_record.emotion_type in negative_emotions:
-                            # 负面情绪强度降低：部分有效
-                            effect = (current_record.intensity - next_record.intensity) / current_record.intensity
-                        else:
-                            # 无效或负面情绪加剧
-                            effect = 0.0
-                            
-                        # 记录策略及其效果
-                        if strategy not in transitions:
-                            transitions[strategy] = []
-                        transitions[strategy].append(effect)
-        
-        # 汇总策略效果
-        result = {}
-        for strategy, effects in transitions.items():
-            if effects:
-                result[strategy] = sum(effects) / len(effects)
-                result[f"{strategy}_count"] = len(effects)
+        # 计算情绪变化频率（按时间顺序相邻记录的情绪类型不同即为一次变化）
+        sorted_codes = columns.emotion_codes[columns.chronological_order()]
+        emotion_changes = int(np.count_nonzero(sorted_codes[1:] != sorted_codes[:-1]))
         
-        return result
+        # 计算负面情绪的比例
+        negative_count = int(np.count_nonzero(columns.emotion_mask(NEGATIVE_EMOTIONS)))
+        
+        # 计算社交情境中的情绪
+        social_mask = columns.context_mask(is_social_context)
+        social_intensities = columns.intensities[social_mask]
+        social_intensity = sequential_sum(social_intensities) / len(social_intensities) if len(social_intensities) else 0.5
+        
+        return self._score_personality({
+            "total_records": total_records,
+            "emotion_change_rate": emotion_changes / (total_records - 1),
+            "emotion_variety": int(np.count_nonzero(emotion_counts)),
+            "std_intensity": np.std(columns.intensities),
+            "negative_ratio": negative_count / total_records,
+            "social_intensity": social_intensity,
+            "anger_ratio": int(emotion_counts[EMOTION_CODES["angry"]]) / total_records
+        })
     
-    def _analyze_personality(self, emotion_history: List[UserEmotionRecord]) -> Dict[str, float]:
-        """基于情绪历史分析用户性格特征"""
-        if not emotion_history or len(emotion_history) < 5:
+    def _score_personality(self, inputs: Optional[Dict[str, float]]) -> Dict[str, float]:
+        """由情绪统计量估计五大性格特质"""
+        if inputs is None:
             # 默认中等水平的性格特征
             return {
                 "openness": 0.5,
@@ -721,43 +813,12 @@ class UserProfileService:
                 "neuroticism": 0.5
             }
         
-        # 计算情绪类型分布
-        emotion_counts = {}
-        for record in emotion_history:
-            emotion_type = record.emotion_type
-            if emotion_type not in emotion_counts:
-                emotion_counts[emotion_type] = 0
-            emotion_counts[emotion_type] += 1
-        
-        total_records = len(emotion_history)
-        emotion_distribution = {k: v / total_records for k, v in emotion_counts.items()}
-        
-        # 计算情绪变化频率
-        sorted_history = sorted(emotion_history, key=lambda x: x.timestamp)
-        emotion_changes = sum(1 for i in range(len(sorted_history) - 1) 
-                            if sorted_history[i].emotion_type != sorted_history[i+1].emotion_type)
-        emotion_change_rate = emotion_changes / (len(sorted_history) - 1) if len(sorted_history) > 1 else 0
-        
-        # 计算情绪强度平均值和标准差
-        intensities = [record.intensity for record in emotion_history]
-        avg_intensity = sum(intensities) / len(intensities)
-        import numpy as np
-        std_intensity = np.std(intensities)
-        
-        # 计算负面情绪的比例
-        negative_emotions = ["sad", "angry", "anxious", "fear", "frustrated", "stressed"]
-        negative_count = sum(1 for record in emotion_history if record.emotion_type in negative_emotions)
-        negative_ratio = negative_count / total_records
-        
-        # 计算社交情境中的情绪
-        social_contexts = ["社交", "朋友", "聚会", "交流", "聊天", "群组", "团队", "会议"]
-        social_records = [r for r in emotion_history if r.context and any(context in r.context for context in social_contexts)]
-        social_intensity = sum(r.intensity for r in social_records) / len(social_records) if social_records else 0.5
+        std_intensity = inputs["std_intensity"]
+        negative_ratio = inputs["negative_ratio"]
         
-        # 基于以上指标估计五大性格特质
         # 开放性: 情绪变化率、情绪类型多样性
-        emotion_variety = len(emotion_counts) / 8  # 假设有8种可能的情绪类型
-        openness = (emotion_change_rate * 0.5 + emotion_variety * 0.5) * 0.8 + 0.1  # 归一化到0.1-0.9范围
+        emotion_variety = inputs["emotion_variety"] / 8  # 假设有8种可能的情绪类型
+        openness = (inputs["emotion_change_rate"] * 0.5 + emotion_variety * 0.5) * 0.8 + 0.1  # 归一化到0.1-0.9范围
         
         # 尽责性: 情绪稳定性、低负面情绪比例
         stability = 1 - std_intensity
@@ -765,10 +826,10 @@ class UserProfileService:
         
         # 外向性: 社交情境中的情绪强度、积极情绪占比
         positive_ratio = 1 - negative_ratio
-        extraversion = (social_intensity * 0.6 + positive_ratio * 0.4) * 0.8 + 0.1
+        extraversion = (inputs["social_intensity"] * 0.6 + positive_ratio * 0.4) * 0.8 + 0.1
         
         # 宜人性: 低愤怒情绪比例、积极社交情绪
-        anger_ratio = emotion_distribution.get("angry", 0)
+        anger_ratio = inputs["anger_ratio"]
         agreeableness = ((1 - anger_ratio * 3) * 0.5 + positive_ratio * 0.5) * 0.8 + 0.1
         agreeableness = max(0.1, min(0.9, agreeableness))  # 确保在合理范围
         
@@ -782,128 +843,3 @@ class UserProfileService:
             "agreeableness": round(agreeableness, 2),
             "neuroticism": round(neuroticism, 2)
         }
-    
-    def _analyze_interests(self, emotion_history: List[UserEmotionRecord]) -> Dict:
-        """分析用户兴趣偏好"""
-        if not emotion_history:
-            return {
-                "activities": [],
-                "preferences": {},
-                "emotional_responses": {}
-            }
-            
-        # 预定义的活动类别
-        activity_categories = {
-            "体育运动": ["跑步", "健身", "游泳", "篮球", "足球", "羽毛球", "乒乓球", "瑜伽", "骑行", "登山", "健走"],
-            "艺术文化": ["阅读", "写作", "绘画", "摄影", "音乐", "电影", "戏剧", "舞蹈", "手工", "博物馆", "展览"],
-            "社交活动": ["聚会", "聊天", "约会", "团建", "交友", "社区活动", "志愿服务"],
-            "休闲娱乐": ["游戏", "旅行", "购物", "烹饪", "美食", "园艺", "钓鱼", "宠物", "收藏", "冥想"],
-            "学习工作": ["学习", "工作", "研究", "讲座", "培训", "编程", "语言学习", "技能培训"]
-        }
-        
-        # 扁平化活动关键词列表
-        activity_keywords = {}
-        for category, activities in activity_categories.items():
-            for activity in activities:
-                activity_keywords[activity] = category
-                
-        # 从情绪记录上下文中提取活动
-        activities_found = {}
-        for record in emotion_history:
-            if not record.context:
-                continue
-                
-            # 检查上下文中是否包含活动关键词
-            for activity, category in activity_keywords.items():
-                if activity in record.context:
-                    if activity not in activities_found:
-                        activities_found[activity] = {
-                            "category": category,
-                            "count": 0,
-                            "total_intensity": 0,
-                            "emotions": {}
-                        }
-                    
-                    activities_found[activity]["count"] += 1
-                    activities_found[activity]["total_intensity"] += record.intensity
-                    
-                    # 记录该活动相关的情绪
-                    emotion = record.emotion_type
-                    if emotion not in activities_found[activity]["emotions"]:
-                        activities_found[activity]["emotions"][emotion] = 0
-                    activities_found[activity]["emotions"][emotion] += 1
-        
-        # 计算活动偏好和情绪响应
-        preferences = {}
-        emotional_responses = {}
-        activities = []
-        
-        for activity, data in activities_found.items():
-            if data["count"] >= 2:  # 只考虑出现至少两次的活动
-                # 计算活动偏好分数 (出现频率和情绪强度的加权平均)
-                frequency = data["count"] / len(emotion_history)
-                avg_intensity = data["total_intensity"] / data["count"]
-                preference_score = frequency * 0.4 + avg_intensity * 0.6
-                
-                # 保存结果
-                activities.append(activity)
-                preferences[activity] = round(preference_score, 2)
-                
-                # 计算情绪响应 (活动引起的主要情绪)
-                if data["emotions"]:
-                    main_emotion = max(data["emotions"].items(), key=lambda x: x[1])[0]
-                    emotional_responses[activity] = main_emotion
-        
-        return {
-            "activities": activities,
-            "preferences": preferences,
-            "emotional_responses": emotional_responses
-        }
-    
-    def _get_prediction_factors(self, features: np.ndarray) -> Dict[str, float]:
-        """获取影响情绪预测的关键因素及其权重"""
-        if not hasattr(self.emotion_classifier, 'feature_importances_'):
-            # 如果模型没有特征重要性，返回一个简化的版本
-            return {
-                "time_of_day": 0.2,
-                "recent_emotions": 0.3,
-                "personality": 0.2,
-                "context": 0.3
-            }
-        
-        # 获取模型特征重要性
-        importances = self.emotion_classifier.feature_importances_
-        
-        # 特征名称列表 (应与_prepare_prediction_features中的特征顺序一致)
-        feature_names = [
-            "time_sin", "time_cos",           # 时间特征
-            "recent_emotion_1", "recent_emotion_2", "recent_emotion_3",
-            "recent_emotion_4", "recent_emotion_5",  # 最近5次情绪
-            "openness", "conscientiousness", "extraversion",
-            "agreeableness", "neuroticism",   # 性格特征
-            "time_of_day", "day_of_week", "weather_score"  # 上下文特征
-        ]
-        
-        # 将特征重要性与特征名称匹配
-        raw_factors = {}
-        for i, importance in enumerate(importances):
-            if i < len(feature_names):
-                raw_factors[feature_names[i]] = importance
-        
-        # 对特征进行分组
-        grouped_factors = {
-            "time_of_day": raw_factors.get("time_sin", 0) + raw_factors.get("time_cos", 0),
-            "recent_emotions": sum(raw_factors.get(f"recent_emotion_{i}", 0) for i in range(1, 6)),
-            "personality": sum(raw_factors.get(trait, 0) for trait in ["openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism"]),
-            "context": sum(raw_factors.get(ctx, 0) for ctx in ["time_of_day", "day_of_week", "weather_score"])
-        }
-        
-        # 归一化因素权重
-        total_weight = sum(grouped_factors.values())
-        if total_weight > 0:
-            normalized_factors = {k: v / total_weight for k, v in grouped_factors.items()}
-        else:
-            normalized_factors = {k: 1.0 / len(grouped_factors) for k in grouped_factors}
-        
-        # 四舍五入到两位小数
-        return {k: round(v, 2) for k, v in normalized_factors.items()} 
\ No newline at end of file
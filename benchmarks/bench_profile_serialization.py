@@ -0,0 +1,84 @@
+"""
+用户画像加载与序列化性能对比
+
+对比以下两条路径在1k/10k条情绪记录画像上的耗时：
+* 加载：UserProfile.model_validate(doc) 校验构建 vs model_construct 免校验构建（仅顶层）
+* 输出：FastAPI默认（jsonable_encoder + json.dumps） vs model_dump_json
+
+运行方式：python -m benchmarks.bench_profile_serialization
+"""
+from datetime import datetime, timedelta
+import json
+import time
+from fastapi.encoders import jsonable_encoder
+from app.models.user_profile import EmotionType, UserProfile
+
+EMOTIONS = [emotion.value for emotion in EmotionType]
+
+
+def build_profile_document(num_records: int) -> dict:
+    """构造与数据库中存储格式一致的画像文档"""
+    start = datetime(2024, 1, 1)
+    history = [
+        {
+            "timestamp": start + timedelta(minutes=37 * i),
+            "emotion_type": EMOTIONS[i % len(EMOTIONS)],
+            "intensity": (i % 10) / 10,
+            "context": f"和朋友聊天后去跑步 {i % 50}",
+            "source": "chat",
+            "text": None,
+            "metadata": {"seq": i}
+        }
+        for i in range(num_records)
+    ]
+
+    return {
+        "_id": "mongo_object_id",
+        "user_id": "bench_user",
+        "personality": {
+            "openness": 0.5, "conscientiousness": 0.5, "extraversion": 0.5,
+            "agreeableness": 0.5, "neuroticism": 0.5, "last_updated": start
+        },
+        "interests": {
+            "topics": ["阅读"], "activities": ["跑步"],
+            "preferences": {"跑步": 0.8}, "last_updated": start
+        },
+        "emotion_pattern": {
+            "daily_pattern": {}, "weekly_pattern": {}, "triggers": {},
+            "coping_strategies": {}, "last_updated": start
+        },
+        "emotion_history": history,
+        "current_emotion": history[-1] if history else None,
+        "emotional_stability": 0.5,
+        "last_updated": start
+    }
+
+
+def timeit(func, repeat: int) -> float:
+    """返回单次调用的最佳耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - begin)
+    return best * 1000
+
+
+def main():
+    print(f"{'records':>8} | {'validate':>10} | {'construct':>10} | {'jsonable+json':>14} | {'dump_json':>10}")
+    for num_records in (1_000, 10_000):
+        document = build_profile_document(num_records)
+        repeat = 20 if num_records <= 1_000 else 5
+        profile = UserProfile(**document)
+
+        validate_ms = timeit(lambda: UserProfile.model_validate(document), repeat)
+        construct_ms = timeit(lambda: UserProfile.model_construct(**document), repeat)
+        default_ms = timeit(lambda: json.dumps(jsonable_encoder(profile)), repeat)
+        fast_ms = timeit(lambda: profile.model_dump_json(), repeat)
+
+        print(f"{num_records:>8} | {validate_ms:>8.2f}ms | {construct_ms:>8.2f}ms | "
+              f"{default_ms:>12.2f}ms | {fast_ms:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
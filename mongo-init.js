@@ -5,20 +5,41 @@ db = db.getSiblingDB('emotion_db');
 db.createCollection('users');
 db.createCollection('emotion_records');
 db.createCollection('user_profiles');
+db.createCollection('user_features');
+db.createCollection('comprehensive_profiles');
 db.createCollection('alerts');
 db.createCollection('social_emotion_records');
 db.createCollection('user_behaviors');
+db.createCollection('behavior_sessions');
+db.createCollection('behavior_sketches');
+db.createCollection('behavior_archive');
+db.createCollection('behavior_events');
+db.createCollection('social_contagion');
+db.createCollection('profile_invalidations');
 
 // 创建索引
 db.users.createIndex({ "username": 1 }, { unique: true });
 db.users.createIndex({ "email": 1 }, { unique: true });
 db.emotion_records.createIndex({ "user_id": 1, "timestamp": -1 });
 db.user_profiles.createIndex({ "user_id": 1 }, { unique: true });
-db.alerts.createIndex({ "user_id": 1, "created_at": -1 });
+db.user_features.createIndex({ "user_id": 1 }, { unique: true });
+db.comprehensive_profiles.createIndex({ "user_id": 1 }, { unique: true });
+db.alerts.createIndex({ "user_id": 1, "created_at": -1, "id": -1 });
+db.alerts.createIndex({ "user_id": 1, "status": 1, "created_at": -1, "id": -1 });
+db.alerts.createIndex({ "user_id": 1, "level": 1, "created_at": -1, "id": -1 });
 db.alerts.createIndex({ "status": 1 });
 db.social_emotion_records.createIndex({ "user_id": 1, "timestamp": -1 });
 db.social_emotion_records.createIndex({ "target_user_id": 1, "timestamp": -1 });
 db.user_behaviors.createIndex({ "user_id": 1, "timestamp": -1 });
+db.behavior_sessions.createIndex({ "session_id": 1 }, { unique: true });
+db.behavior_sessions.createIndex({ "user_id": 1, "start": -1 });
+db.behavior_sessions.createIndex({ "user_id": 1, "end": -1 });
+db.behavior_sketches.createIndex({ "sketch_id": 1 }, { unique: true });
+db.behavior_sketches.createIndex({ "hour": 1 });
+db.behavior_archive.createIndex({ "user_id": 1, "day": 1 }, { unique: true });
+db.behavior_events.createIndex({ "day": 1, "user_id": 1 }, { unique: true });
+db.social_contagion.createIndex({ "user_id": 1 }, { unique: true });
+db.profile_invalidations.createIndex({ "created_at": 1 }, { expireAfterSeconds: 86400 });
 
 // 添加管理员用户示例（密码需在生产环境中修改）
 // 默认密码：admin123
@@ -131,18 +131,34 @@ class EmotionSDK:
         response.raise_for_status()
         return response.json()
 
-    def get_alert_history(self) -> Dict:
+    def get_alert_history(self, cursor: Optional[str] = None, limit: int = 20,
+                          status: Optional[str] = None, level: Optional[str] = None) -> Dict:
         """
         获取预警历史
         
+        Args:
+            cursor: 分页游标（上一页返回的next_cursor）
+            limit: 每页数量
+            status: 按状态过滤（可选）
+            level: 按级别过滤（可选）
+            
         Returns:
             Dict: 预警历史数据
         """
         if not self._token:
             raise Exception("请先登录")
             
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if status:
+            params["status"] = status
+        if level:
+            params["level"] = level
+            
         response = self.session.get(
-            f"{self.base_url}/api/v1/alert/history"
+            f"{self.base_url}/api/v1/alert/history",
+            params=params
         )
         response.raise_for_status()
         return response.json()
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timedelta
+import base64
+
+from app.models.user_behavior import (
+    ActivityBitmap, BehaviorInsight, BehaviorPattern, UserBehavior, UserBehaviorProfile
+)
+from app.services.activity_bitmap import (
+    active_in_range, day_number, recent_event_count, retention_streak, to_int, update_activity
+)
+
+START = datetime(2024, 3, 1, 12)
+
+
+def _behaviors(days):
+    return [
+        UserBehavior(user_id="u1", behavior_type="chat", timestamp=START + timedelta(days=day), context={})
+        for day in days
+    ]
+
+
+def _profile(history):
+    now = datetime(2024, 4, 1)
+    profile = UserBehaviorProfile(
+        user_id="u1",
+        behavior_history=history,
+        behavior_pattern=BehaviorPattern(daily_pattern={}, weekly_pattern={}, behavior_sequence=[],
+                                         interaction_graph={}, last_updated=now),
+        behavior_insight=BehaviorInsight(active_hours=[], favorite_features=[], behavior_clusters=[],
+                                         engagement_score=0.0, retention_score=0.0, last_updated=now),
+        last_updated=now
+    )
+    profile.activity = update_activity(None, history)
+    return profile
+
+
+def test_profile_with_high_bits_serializes_to_json():
+    profile = _profile(_behaviors(range(8)))
+    assert profile.activity.bits == b"\xff"
+
+    data = json.loads(profile.model_dump_json())
+
+    assert base64.b64decode(data["activity"]["bits"]) == b"\xff"
+    # 写入数据库的字典仍保留二进制
+    assert profile.model_dump()["activity"]["bits"] == b"\xff"
+
+
+def test_update_activity_marks_days_and_is_incremental():
+    history = _behaviors([0, 1, 1, 3])
+    bitmap = update_activity(None, history[:2])
+    bitmap = update_activity(bitmap, history)
+
+    assert bitmap.first_day == day_number(START)
+    assert to_int(bitmap) == 0b1011
+    assert bitmap.record_count == 4
+
+
+def test_earlier_behavior_shifts_first_day():
+    bitmap = update_activity(None, _behaviors([5, -2]))
+
+    assert bitmap.first_day == day_number(START) - 2
+    assert to_int(bitmap) == 0b10000001
+
+
+def test_active_in_range():
+    bitmap = update_activity(None, _behaviors([0, 10]))
+    first = day_number(START)
+    bits = to_int(bitmap)
+
+    assert active_in_range(bits, bitmap.first_day, first + 5, first + 10)
+    assert not active_in_range(bits, bitmap.first_day, first + 1, first + 9)
+    assert not active_in_range(bits, bitmap.first_day, first - 10, first - 1)
+
+
+def test_retention_streak_counts_days_up_to_last_active_day():
+    assert retention_streak(update_activity(None, _behaviors([0, 2, 3, 4]))) == 3
+    assert retention_streak(update_activity(None, _behaviors(range(40))), limit=30) == 30
+    assert retention_streak(ActivityBitmap()) == 0
+
+
+def test_recent_event_count_uses_last_seven_days():
+    bitmap = update_activity(None, _behaviors([0, 5, 5, 9]))
+    today = day_number(START) + 9
+
+    assert recent_event_count(bitmap, today) == 3
+    assert recent_event_count(bitmap, today + 7) == 0
@@ -0,0 +1,116 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.user_behavior import UserBehavior
+from app.services.behavior_events import BehaviorEventStore
+from app.services.behavior_transitions import BEHAVIOR_CODES
+from app.services.funnel import evaluate_funnel_batch
+
+TYPES = ["search", "view_content", "save", "like"]
+BASE = datetime(2024, 3, 1)
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+
+    async def update_one(self, query, update, upsert=False):
+        document = self.documents.setdefault((query["day"], query["user_id"]), dict(query))
+        for field, value in update["$push"].items():
+            document.setdefault(field, []).append(value)
+
+    def find(self, query, projection):
+        day_range = query["day"]
+        return FakeCursor([
+            document for document in self.documents.values()
+            if day_range["$gte"] <= document["day"] <= day_range["$lte"]
+        ])
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = BehaviorEventStore()
+    collection = FakeCollection()
+    monkeypatch.setattr(store, "_get_collection", lambda: collection)
+    return store
+
+
+def brute_force_level(events, steps, window_seconds, start, end):
+    """按定义逐个起点贪心匹配，返回到达的最深步骤数"""
+    events = sorted(events, key=lambda event: event[1])
+    best = 0
+    for position, (behavior_type, first) in enumerate(events):
+        if behavior_type != steps[0] or not start <= first < end:
+            continue
+        level = 1
+        for other_type, timestamp in events[position + 1:]:
+            if (level < len(steps) and other_type == steps[level]
+                    and (timestamp - first).total_seconds() <= window_seconds):
+                level += 1
+        best = max(best, level)
+    return best
+
+
+def test_load_filters_range_and_types(store):
+    behaviors = [
+        UserBehavior(user_id="u1", behavior_type="search", timestamp=BASE + timedelta(hours=23), context={}),
+        UserBehavior(user_id="u1", behavior_type="save", timestamp=BASE + timedelta(hours=25), context={}),
+        UserBehavior(user_id="u1", behavior_type="like", timestamp=BASE + timedelta(hours=26), context={}),
+        UserBehavior(user_id="u2", behavior_type="search", timestamp=BASE + timedelta(days=3), context={}),
+    ]
+    for behavior in behaviors:
+        asyncio.run(store.record(behavior))
+
+    users = asyncio.run(store.load(BASE, BASE + timedelta(days=2),
+                                   [BEHAVIOR_CODES["search"], BEHAVIOR_CODES["save"]]))
+
+    assert list(users) == ["u1"]
+    codes, seconds = users["u1"]
+    assert sorted(codes.tolist()) == sorted([BEHAVIOR_CODES["search"], BEHAVIOR_CODES["save"]])
+    epoch = datetime(1970, 1, 1)
+    assert sorted(seconds.tolist()) == [
+        int((behaviors[0].timestamp - epoch).total_seconds()),
+        int((behaviors[1].timestamp - epoch).total_seconds())
+    ]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_funnel_over_event_index_matches_brute_force(store, seed):
+    rng = random.Random(seed)
+    steps = [rng.choice(TYPES) for _ in range(rng.randint(2, 4))]
+    start = BASE + timedelta(hours=rng.randint(0, 72))
+    end = start + timedelta(hours=rng.randint(1, 48))
+    window_seconds = rng.choice([600, 3600, 36000])
+    events_end = end + timedelta(seconds=window_seconds)
+
+    expected = [0] * len(steps)
+    for user in range(8):
+        events = [(rng.choice(TYPES), BASE + timedelta(seconds=rng.randint(0, 6 * 86400)))
+                  for _ in range(rng.randint(0, 30))]
+        for behavior_type, timestamp in events:
+            asyncio.run(store.record(UserBehavior(
+                user_id=f"u{user}", behavior_type=behavior_type, timestamp=timestamp, context={}
+            )))
+        in_range = [event for event in events if start <= event[1] < events_end]
+        for step in range(brute_force_level(in_range, steps, window_seconds, start, end)):
+            expected[step] += 1
+
+    step_codes = [BEHAVIOR_CODES[step] for step in steps]
+    users = asyncio.run(store.load(start, events_end, step_codes))
+    start_before = int((end - datetime(1970, 1, 1)).total_seconds())
+    assert evaluate_funnel_batch(list(users.values()), step_codes, window_seconds, start_before) == expected
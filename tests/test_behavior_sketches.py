@@ -0,0 +1,96 @@
+import random
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.models.user_behavior import BehaviorType, UserBehavior
+from app.services.behavior_sketches import (
+    CMS_WIDTH, CountMinSketch, HourlySketch, HyperLogLog, TDigest, _hash64
+)
+
+HOUR = datetime(2024, 1, 1, 9)
+
+
+def _behavior(user_id, feature, duration):
+    return UserBehavior(user_id=user_id, behavior_type=BehaviorType.CLICK, timestamp=HOUR,
+                        duration=duration, context={"feature": feature})
+
+
+@pytest.mark.parametrize("size", [50, 5_000, 100_000])
+def test_hyperloglog_counts_distinct_users(size):
+    sketch = HyperLogLog()
+    for i in range(size):
+        # 重复添加不影响计数
+        sketch.add_hash(_hash64(f"user_{i}"))
+        sketch.add_hash(_hash64(f"user_{i}"))
+
+    assert sketch.count() == pytest.approx(size, rel=0.05)
+
+
+def test_hyperloglog_merge_equals_union():
+    left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(30_000):
+        hashed = _hash64(f"user_{i}")
+        (left if i < 20_000 else right).add_hash(hashed)
+        if 10_000 <= i < 20_000:
+            right.add_hash(hashed)
+        union.add_hash(hashed)
+
+    left.merge(right)
+
+    assert np.array_equal(left.registers, union.registers)
+
+
+def test_count_min_finds_heavy_hitters_without_underestimating():
+    rng = random.Random(0)
+    keys = [f"feature_{i}" for i in range(2_000)]
+    # 长尾分布：少数功能占大部分使用
+    stream = [keys[min(int(rng.paretovariate(1.2)) - 1, len(keys) - 1)] for _ in range(50_000)]
+    exact = Counter(stream)
+    sketch = CountMinSketch()
+    for key in stream:
+        sketch.add(key)
+
+    for key, count in exact.items():
+        assert count <= sketch.estimate(key) <= count + 3 * len(stream) / CMS_WIDTH
+    top = [item["feature"] for item in sketch.top(5)]
+    assert top == [key for key, _ in exact.most_common(5)]
+
+
+def test_tdigest_quantiles_track_exact_values():
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=3.0, sigma=1.0, size=50_000)
+    digest = TDigest()
+    for value in values:
+        digest.add(float(value))
+
+    for q in (0.5, 0.9, 0.99):
+        # 比较排名误差：估计值在真实分布中的分位与q相差不超过1%
+        rank = np.searchsorted(np.sort(values), digest.quantile(q)) / len(values)
+        assert rank == pytest.approx(q, abs=0.01)
+    assert len(digest.means) < 500
+
+
+def test_hourly_sketches_merge_through_documents():
+    rng = random.Random(1)
+    behaviors = [
+        _behavior(f"user_{rng.randint(0, 999)}", rng.choice(["chat", "search", "diary"]), rng.uniform(1, 600))
+        for _ in range(6_000)
+    ]
+    # 两个进程各自记录一部分，写入后按文档合并
+    first, second, whole = HourlySketch(), HourlySketch(), HourlySketch()
+    for i, behavior in enumerate(behaviors):
+        (first if i % 2 else second).add(behavior)
+        whole.add(behavior)
+
+    merged = HourlySketch.from_document(first.to_document())
+    merged.merge(HourlySketch.from_document(second.to_document()))
+
+    assert merged.events == whole.events == 6_000
+    assert merged.users.count() == whole.users.count()
+    assert np.array_equal(merged.features.table, whole.features.table)
+    assert merged.features.top(3) == whole.features.top(3)
+    durations = sorted(behavior.duration for behavior in behaviors)
+    assert merged.durations.quantile(0.5) == pytest.approx(durations[3_000], rel=0.03)
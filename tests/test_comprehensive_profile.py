@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("motor")
+
+from app.models.user_behavior import BehaviorInsight, BehaviorPattern, UserBehaviorProfile
+from app.models.user_profile import UserEmotionPattern, UserInterests, UserPersonality, UserProfile
+from app.services.comprehensive_profile_service import ComprehensiveProfileService
+
+NOW = datetime(2024, 4, 1)
+
+
+def _profile():
+    return UserProfile(
+        user_id="u1",
+        emotional_stability=0.5,
+        emotion_history=[],
+        emotion_pattern=UserEmotionPattern(daily_pattern={}, weekly_pattern={}, triggers={},
+                                           coping_strategies={}, last_updated=NOW),
+        personality=UserPersonality(openness=0.5, conscientiousness=0.5, extraversion=0.5,
+                                    agreeableness=0.5, neuroticism=0.5, last_updated=NOW),
+        interests=UserInterests(activities=[], topics=[], preferences={}, last_updated=NOW),
+        last_updated=NOW
+    )
+
+
+def _behavior_profile():
+    return UserBehaviorProfile(
+        user_id="u1",
+        behavior_pattern=BehaviorPattern(daily_pattern={"9": 3}, weekly_pattern={"monday": 3},
+                                         behavior_sequence=[], interaction_graph={"chat": {"search": 0.5}},
+                                         last_updated=NOW),
+        behavior_insight=BehaviorInsight(active_hours=[9, 21], favorite_features=["chat"],
+                                         behavior_clusters=[], engagement_score=0.4,
+                                         retention_score=0.2, last_updated=NOW),
+        behavior_history=[],
+        last_updated=NOW
+    )
+
+
+class ProfileService:
+    async def _get_user_profile(self, user_id):
+        return _profile()
+
+    async def generate_recommendations(self, user_id, context, profile):
+        self.context = context
+        return []
+
+
+class SocialService:
+    async def _get_recent_interactions(self, user_id):
+        raise RuntimeError("社交数据不可用")
+
+
+class AlertService:
+    async def get_user_alerts(self, user_id):
+        return []
+
+    def calculate_user_risk_level(self, alerts):
+        return "low"
+
+
+class BehaviorService:
+    def __init__(self, behavior=None):
+        self.behavior = behavior
+
+    async def _get_user_behavior_profile(self, user_id):
+        if self.behavior is None:
+            raise RuntimeError("行为数据不可用")
+        return self.behavior
+
+
+def test_behavior_section_maps_stored_behavior_profile():
+    profile_service = ProfileService()
+    service = ComprehensiveProfileService(profile_service, SocialService(), AlertService(),
+                                          BehaviorService(_behavior_profile()))
+
+    result = asyncio.run(service.get_comprehensive_profile("u1"))
+
+    assert result["behavior_profile"] == {
+        "active_hours": [9, 21],
+        "preferred_activities": ["chat"],
+        "interaction_patterns": {"chat": {"search": 0.5}}
+    }
+    assert result["sections"]["behavior"]["status"] == "ok"
+    assert result["social_profile"] is None
+    assert profile_service.context == {"risk_level": "low", "active_hours": [9, 21]}
+
+
+def test_failed_behavior_section_returns_other_sections():
+    service = ComprehensiveProfileService(ProfileService(), SocialService(), AlertService(), BehaviorService())
+
+    result = asyncio.run(service.get_comprehensive_profile("u1"))
+
+    assert result["behavior_profile"] is None
+    assert result["sections"]["behavior"]["status"] == "error"
+    assert result["risk_profile"]["alert_level"] == "low"
@@ -0,0 +1,126 @@
+import asyncio
+import random
+
+from app.core.concurrency import KeyedDebouncer, ShardedKeyExecutor, gather_sections
+
+
+def test_same_key_tasks_run_in_submission_order():
+    executor = ShardedKeyExecutor(num_shards=4, name="test")
+    rng = random.Random(0)
+    order = {f"user_{i}": [] for i in range(8)}
+
+    async def task(key, position):
+        # 随机让出事件循环，若同一key的任务并发执行就会乱序
+        for _ in range(rng.randint(0, 3)):
+            await asyncio.sleep(0)
+        order[key].append(position)
+        return position
+
+    async def scenario():
+        submissions = [
+            executor.submit(key, lambda key=key, position=position: task(key, position))
+            for position in range(20)
+            for key in order
+        ]
+        return await asyncio.gather(*submissions)
+
+    results = asyncio.run(scenario())
+
+    assert results == [position for position in range(20) for _ in order]
+    assert all(positions == list(range(20)) for positions in order.values())
+    metrics = executor.get_metrics()
+    assert sum(shard["processed"] for shard in metrics["shards"]) == 160
+    assert metrics["total_queue_depth"] == 0
+
+
+def test_failed_task_does_not_block_its_shard():
+    executor = ShardedKeyExecutor(num_shards=1, name="test")
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def succeed():
+        return "ok"
+
+    async def scenario():
+        failed, succeeded = await asyncio.gather(
+            executor.submit("u1", fail), executor.submit("u1", succeed), return_exceptions=True
+        )
+        return failed, succeeded
+
+    failed, succeeded = asyncio.run(scenario())
+
+    assert isinstance(failed, ValueError)
+    assert succeeded == "ok"
+    assert executor.get_metrics()["shards"][0]["failed"] == 1
+
+
+def test_debouncer_coalesces_within_window():
+    debouncer = KeyedDebouncer(delay_seconds=0.01, name="test")
+    fired = []
+
+    async def callback(key):
+        fired.append(key)
+
+    async def scenario():
+        for _ in range(5):
+            debouncer.schedule("a", lambda: callback("a"))
+        debouncer.schedule("b", lambda: callback("b"))
+        assert debouncer.is_pending("a")
+        await asyncio.sleep(0.05)
+        # 窗口结束后再次调度开启新的窗口
+        debouncer.schedule("a", lambda: callback("a"))
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+
+    assert sorted(fired) == ["a", "a", "b"]
+    metrics = debouncer.get_metrics()
+    assert metrics["scheduled"] == 3
+    assert metrics["coalesced"] == 4
+    assert metrics["fired"] == 3
+    assert metrics["pending"] == 0
+
+
+def test_debouncer_cancel_skips_callback():
+    debouncer = KeyedDebouncer(delay_seconds=0.01, name="test")
+    fired = []
+
+    async def callback():
+        fired.append("a")
+
+    async def scenario():
+        debouncer.schedule("a", callback)
+        assert debouncer.cancel("a")
+        assert not debouncer.cancel("a")
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+
+    assert fired == []
+    assert debouncer.get_metrics()["cancelled"] == 1
+
+
+def test_gather_sections_reports_timeouts_and_errors():
+    async def fast():
+        return 1
+
+    async def slow():
+        await asyncio.sleep(1)
+        return 2
+
+    async def broken():
+        raise RuntimeError("数据库不可用")
+
+    async def scenario():
+        return await gather_sections({"fast": fast(), "slow": slow(), "broken": broken()}, timeout_seconds=0.05)
+
+    results, statuses = asyncio.run(scenario())
+
+    assert results == {"fast": 1}
+    assert statuses["fast"]["status"] == "ok"
+    assert statuses["slow"]["status"] == "timeout"
+    assert statuses["broken"] == {"status": "error", "error": "数据库不可用",
+                                  "elapsed_ms": statuses["broken"]["elapsed_ms"]}
+    # 各部分并发执行，超时的部分不会拖慢整体
+    assert statuses["slow"]["elapsed_ms"] < 500
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app.services.emotion_contagion import propagate
+
+
+def _random_graph(seed, n=60, edges=240):
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(0, n, size=edges)
+    targets = rng.integers(0, n, size=edges)
+    # 少量负权重（例如取消关注），传播时忽略
+    weights = np.where(rng.random(edges) < 0.1, -0.5, rng.uniform(0.1, 1.0, size=edges))
+    order = np.argsort(sources, kind="stable")
+    sources, targets, weights = sources[order], targets[order], weights[order]
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=n))])
+    signal = rng.uniform(-1, 1, size=n)
+    return indptr, targets, weights, signal
+
+
+def _dense_solution(indptr, indices, weights, signal, damping):
+    n = len(signal)
+    matrix = np.zeros((n, n))
+    for u in range(n):
+        for position in range(indptr[u], indptr[u + 1]):
+            matrix[indices[position], u] += max(weights[position], 0.0)
+    incoming = matrix.sum(axis=1)
+    matrix = np.divide(matrix, incoming[:, None], out=np.zeros_like(matrix), where=incoming[:, None] > 0)
+    d = np.where(incoming > 0, damping, 0.0)
+    # 暴露度对自身信号的雅可比矩阵
+    jacobian = np.linalg.solve(np.eye(n) - d[:, None] * matrix, np.diag(1 - d))
+    return jacobian @ signal, jacobian.sum(axis=0)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_propagate_matches_dense_solve(seed):
+    indptr, indices, weights, signal = _random_graph(seed)
+
+    exposure, influence, iterations = propagate(indptr, indices, weights, signal, tolerance=1e-10, max_iterations=500)
+    expected_exposure, expected_influence = _dense_solution(indptr, indices, weights, signal, 0.85)
+
+    assert iterations < 500
+    assert exposure == pytest.approx(expected_exposure, abs=1e-8)
+    assert influence == pytest.approx(expected_influence, abs=1e-8)
+    assert influence.sum() == pytest.approx(len(signal))
+    assert np.all(np.abs(exposure) <= 1)
+
+
+def test_isolated_users_keep_their_own_signal():
+    signal = np.array([0.5, -0.2, 0.9])
+    indptr = np.zeros(4, dtype=np.int64)
+    indices = np.array([], dtype=np.int64)
+    weights = np.array([], dtype=np.float64)
+
+    exposure, influence, _ = propagate(indptr, indices, weights, signal)
+
+    assert exposure == pytest.approx(signal)
+    assert influence == pytest.approx(np.ones(3))
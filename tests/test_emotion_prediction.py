@@ -0,0 +1,35 @@
+import asyncio
+
+import numpy as np
+
+from app.services import user_profile_service
+from app.services.emotion_features import STORED_FEATURE_NAMES
+from app.services.user_profile_service import UserProfileService
+
+
+def test_batch_prediction_skips_users_without_profiles(monkeypatch):
+    service = UserProfileService()
+    stored = {"known": np.zeros(len(STORED_FEATURE_NAMES), dtype=np.float32)}
+    created = []
+
+    async def get_many(user_ids):
+        return {user_id: stored[user_id] for user_id in user_ids if user_id in stored}
+
+    async def find(user_id):
+        return None
+
+    async def get_or_create(user_id):
+        created.append(user_id)
+
+    def predict(features):
+        return [{"emotion": "calm", "confidence": 0.5, "factors": {}} for _ in range(len(features))]
+
+    monkeypatch.setattr(user_profile_service.feature_store, "get_many", get_many)
+    monkeypatch.setattr(user_profile_service.emotion_predictor, "predict", predict)
+    monkeypatch.setattr(service, "_find_user_profile", find)
+    monkeypatch.setattr(service, "_get_user_profile", get_or_create)
+
+    predictions = asyncio.run(service.predict_emotions(["known", "unknown", "known"], {}))
+
+    assert list(predictions) == ["known"]
+    assert created == []
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.user_profile import UserEmotionRecord
+from app.services import profile_keywords
+from app.services.keyword_index import build_keyword_index, interest_summary, is_current
+
+START = datetime(2024, 1, 1)
+
+
+def _record(i, context):
+    return UserEmotionRecord(timestamp=START + timedelta(hours=i), emotion_type="happy",
+                             intensity=0.6, context=context, source="chat")
+
+
+def _clear_caches():
+    for cached in (profile_keywords.get_activity_matcher, profile_keywords.get_coping_matcher,
+                   profile_keywords.keyword_config_fingerprint):
+        cached.cache_clear()
+
+
+@pytest.fixture
+def keyword_config(monkeypatch):
+    _clear_caches()
+    yield monkeypatch
+    monkeypatch.undo()
+    _clear_caches()
+
+
+def test_removed_keyword_is_skipped_and_index_is_stale(keyword_config):
+    records = [_record(i, context) for i, context in enumerate(["早上跑步", "晚上跑步后看电影", "周末看电影"])]
+    index = build_keyword_index(records)
+    assert is_current(index)
+    assert interest_summary(index)["activities"] == ["跑步", "电影"]
+
+    # 关键词表中删除“跑步”
+    sports = [keyword for keyword in profile_keywords.ACTIVITY_CATEGORIES["体育运动"] if keyword != "跑步"]
+    keyword_config.setitem(profile_keywords.ACTIVITY_CATEGORIES, "体育运动", sports)
+    _clear_caches()
+
+    assert not is_current(index)
+    summary = interest_summary(index)
+    assert summary["activities"] == ["电影"]
+    assert summary["topics"] == ["艺术文化"]
+
+    rebuilt = build_keyword_index(records)
+    assert is_current(rebuilt)
+    assert "跑步" not in rebuilt.activities
@@ -0,0 +1,125 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.cache import LRUTTLCache, ReadThroughCache
+from app.models.user_profile import (
+    EmotionType, UserEmotionPattern, UserEmotionRecord, UserInterests, UserPersonality, UserProfile
+)
+from app.services.user_profile_service import UserProfileService
+
+START = datetime(2024, 1, 1)
+CONTEXTS = ["和朋友聊天后去跑步", "加班到很晚，压力很大", "听音乐放松", "一个人在家看书", "", "开会被领导批评"]
+
+
+def _empty_profile():
+    return UserProfile(
+        user_id="u1",
+        emotional_stability=0.5,
+        emotion_history=[],
+        emotion_pattern=UserEmotionPattern(daily_pattern={}, weekly_pattern={}, triggers={},
+                                           coping_strategies={}, last_updated=START),
+        personality=UserPersonality(openness=0.5, conscientiousness=0.5, extraversion=0.5,
+                                    agreeableness=0.5, neuroticism=0.5, last_updated=START),
+        interests=UserInterests(activities=[], topics=[], preferences={}, last_updated=START),
+        last_updated=START
+    )
+
+
+def _history(seed, size=300):
+    rng = random.Random(seed)
+    emotions = [emotion.value for emotion in EmotionType]
+    records = []
+    for i in range(size):
+        # 约一成记录乱序到达
+        offset = i * 97 - (rng.randint(60, 600) if rng.random() < 0.1 else 0)
+        records.append(UserEmotionRecord(
+            timestamp=START + timedelta(minutes=offset),
+            emotion_type=rng.choice(emotions),
+            intensity=round(rng.random(), 3),
+            context=rng.choice(CONTEXTS),
+            source="chat"
+        ))
+    return records
+
+
+def _assert_same(incremental, expected):
+    if isinstance(expected, dict):
+        assert incremental.keys() == expected.keys()
+        for key in expected:
+            _assert_same(incremental[key], expected[key])
+    elif isinstance(expected, float):
+        assert incremental == pytest.approx(expected, abs=1e-9)
+    else:
+        assert incremental == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_incremental_accumulators_match_full_recompute(seed):
+    service = UserProfileService()
+    history = _history(seed)
+
+    incremental = _empty_profile()
+    for record in history:
+        incremental.emotion_history.append(record)
+        service._recompute_derived_sections(incremental)
+
+    full = _empty_profile()
+    full.emotion_history = list(history)
+    service._recompute_derived_sections(full)
+
+    for field in ("emotion_pattern", "personality", "interests"):
+        _assert_same(getattr(incremental, field).model_dump(exclude={"last_updated"}),
+                     getattr(full, field).model_dump(exclude={"last_updated"}))
+    assert incremental.emotional_stability == pytest.approx(full.emotional_stability, abs=1e-9)
+
+
+def test_cached_profile_copies_are_independent(monkeypatch):
+    from app.services import user_profile_service
+
+    cache = ReadThroughCache(LRUTTLCache(max_size=10, ttl_seconds=60))
+    monkeypatch.setattr(user_profile_service, "profile_cache", cache)
+    service = UserProfileService()
+    loaded = _empty_profile()
+
+    async def load(user_id):
+        return loaded
+
+    monkeypatch.setattr(service, "_load_user_profile", load)
+
+    async def scenario():
+        first = await service._get_user_profile("u1")
+        first.emotion_history.append(_history(0, size=1)[0])
+        first.emotion_pattern.triggers["工作"] = 1.0
+        return await service._get_user_profile("u1")
+
+    second = asyncio.run(scenario())
+    assert second.emotion_history == []
+    assert second.emotion_pattern.triggers == {}
+
+
+def test_cache_versions_do_not_grow_with_invalidated_keys():
+    cache = ReadThroughCache(LRUTTLCache(max_size=10, ttl_seconds=60))
+
+    async def scenario():
+        for i in range(100):
+            await cache.invalidate(f"user_{i}")
+
+        # 加载期间失效：旧值不写回缓存
+        release = asyncio.Event()
+
+        async def slow_loader():
+            await release.wait()
+            return "stale"
+
+        task = asyncio.create_task(cache.get_or_load("u", slow_loader))
+        await asyncio.sleep(0)
+        await cache.invalidate("u")
+        release.set()
+        assert await task == "stale"
+        assert cache.local.get("u") is None
+
+    asyncio.run(scenario())
+    assert cache._versions == {}
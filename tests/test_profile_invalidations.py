@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.profile_invalidations import ProfileInvalidationFeed
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append({"_id": len(self.documents) + 1, **document})
+
+    def find(self, query, projection):
+        since = query["created_at"]["$gte"]
+        return FakeCursor([document for document in self.documents if document["created_at"] >= since])
+
+
+@pytest.fixture
+def feed_and_collection(monkeypatch):
+    feed = ProfileInvalidationFeed()
+    collection = FakeCollection()
+    monkeypatch.setattr(feed, "_get_collection", lambda: collection)
+    return feed, collection
+
+
+def test_poll_invalidates_each_published_user_once(feed_and_collection):
+    feed, collection = feed_and_collection
+    invalidated = []
+
+    async def invalidate(user_id):
+        invalidated.append(user_id)
+
+    async def scenario():
+        # 启动前的通知不需要处理
+        await collection.insert_one({"user_ids": ["old"], "created_at": datetime.utcnow() - timedelta(hours=1)})
+        assert await feed.poll(invalidate) == 0
+
+        await feed.publish(["u1", "u2"])
+        await feed.publish(["u2", "u3"])
+        assert await feed.poll(invalidate) == 3
+        # 回看窗口内已处理的通知不会重复失效
+        assert await feed.poll(invalidate) == 0
+
+        await feed.publish(["u4"])
+        assert await feed.poll(invalidate) == 1
+
+    asyncio.run(scenario())
+    assert sorted(invalidated) == ["u1", "u2", "u3", "u4"]
+
+
+def test_late_visible_notice_within_overlap_is_processed(feed_and_collection):
+    feed, collection = feed_and_collection
+    invalidated = []
+
+    async def invalidate(user_id):
+        invalidated.append(user_id)
+
+    async def scenario():
+        await feed.poll(invalidate)
+        await feed.publish(["u1"])
+        await feed.poll(invalidate)
+        # 时钟稍慢的写入方发布的通知早于当前水位
+        await collection.insert_one({"user_ids": ["u2"], "created_at": feed._watermark - timedelta(seconds=5)})
+        await feed.poll(invalidate)
+
+    asyncio.run(scenario())
+    assert invalidated == ["u1", "u2"]
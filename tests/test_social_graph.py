@@ -0,0 +1,150 @@
+import asyncio
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.services.social_graph import SocialGraphIndex
+
+WEIGHTS = {"chat": 0.3, "comment": 0.2, "unfollow": -0.1}
+NOW = 1_700_000_000.0
+
+
+class FakeCursor:
+    def __init__(self, documents, fail_after=None):
+        self.documents = documents
+        self.fail_after = fail_after
+
+    def sort(self, *args):
+        return self
+
+    async def _iterate(self):
+        for position, document in enumerate(self.documents):
+            if self.fail_after is not None and position == self.fail_after:
+                raise asyncio.CancelledError()
+            yield document
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.fail_after = None
+
+    def add(self, user_id, target_user_id, interaction_type="chat", intensity=1.0):
+        self.documents.append({
+            "_id": len(self.documents) + 1,
+            "user_id": user_id,
+            "target_user_id": target_user_id,
+            "interaction_type": interaction_type,
+            "intensity": intensity,
+            "timestamp": datetime.now() - timedelta(minutes=1)
+        })
+
+    def find(self, query, projection):
+        id_range = query["_id"]
+        documents = [
+            document for document in self.documents
+            if document["_id"] < id_range["$lt"] and document["_id"] > id_range.get("$gt", 0)
+        ]
+        fail_after, self.fail_after = self.fail_after, None
+        return FakeCursor(documents, fail_after)
+
+
+@pytest.fixture
+def graph_and_collection(monkeypatch):
+    monkeypatch.setattr(settings, "SOCIAL_GRAPH_REFRESH_SECONDS", 0.0)
+    graph = SocialGraphIndex()
+    collection = FakeCollection()
+    graph._get_collection = lambda: collection
+    graph._visible_before = lambda: 10 ** 9
+    return graph, collection
+
+
+def test_cancelled_refresh_does_not_skip_records(graph_and_collection):
+    graph, collection = graph_and_collection
+    for target in ["b", "c", "d"]:
+        collection.add("a", target)
+    collection.fail_after = 2
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(graph.ensure_fresh(WEIGHTS))
+    assert graph.degree("a")["out_degree"] == 0
+    assert not graph.is_ready
+
+    asyncio.run(graph.ensure_fresh(WEIGHTS))
+    collection.add("b", "a")
+    asyncio.run(graph.ensure_fresh(WEIGHTS))
+
+    assert graph.is_ready
+    assert graph.degree("a") == {"out_degree": 3, "in_degree": 1, "mutual": 1}
+    assert graph.get_metrics()["records_loaded"] == 4
+
+
+def test_schedule_refresh_runs_in_background(graph_and_collection):
+    graph, collection = graph_and_collection
+    collection.add("a", "b")
+
+    async def scenario():
+        graph.schedule_refresh(WEIGHTS)
+        assert not graph.is_ready
+        await graph._refresh_task
+
+    asyncio.run(scenario())
+    assert graph.degree("a")["out_degree"] == 1
+
+
+def test_add_edges_matches_brute_force():
+    half_life = settings.SOCIAL_GRAPH_HALF_LIFE_DAYS * 86400
+    for seed in range(30):
+        rng = random.Random(seed)
+        graph = SocialGraphIndex()
+        records = []
+        now = NOW
+        for _ in range(rng.randint(1, 5)):
+            now += rng.randint(0, 10 ** 6)
+            batch = []
+            for _ in range(rng.randint(0, 25)):
+                source = graph._node(f"u{rng.randint(0, 8)}")
+                target = graph._node(f"u{rng.randint(0, 8)}")
+                batch.append((source, target, rng.choice([0.3, 0.2, -0.1]) * rng.random(),
+                              now - rng.randint(0, 10 ** 6)))
+            records.extend(batch)
+            graph.add_edges([r[0] for r in batch], [r[1] for r in batch],
+                            [r[2] for r in batch], [r[3] for r in batch], now)
+
+        edges = {}
+        for source, target, weight, timestamp in records:
+            edge = edges.setdefault((source, target), [0.0, 0])
+            edge[0] += weight * 0.5 ** (max(now - timestamp, 0.0) / half_life)
+            edge[1] += 1
+
+        for node, user_id in enumerate(graph._users):
+            outgoing = {target: edge for (source, target), edge in edges.items() if source == node}
+            assert graph.degree(user_id) == {
+                "out_degree": len(outgoing),
+                "in_degree": sum(1 for (_, target) in edges if target == node),
+                "mutual": sum(1 for target in outgoing if (target, node) in edges)
+            }
+            contacts = graph.relationships(user_id, now)
+            qualities = [contact["quality"] for contact in contacts]
+            assert qualities == sorted(qualities, reverse=True)
+            for contact in contacts:
+                target = graph._user_ids[contact["user_id"]]
+                out_weight = max(outgoing[target][0], 0.0)
+                in_weight = max(edges.get((target, node), [0.0])[0], 0.0)
+                stronger = max(out_weight, in_weight)
+                reciprocity = min(out_weight, in_weight) / stronger if stronger > 0 else 0.0
+                expected = 0.7 * (1 - math.exp(-(out_weight + in_weight))) + 0.3 * reciprocity
+                assert contact["quality"] == pytest.approx(expected, abs=1e-3)
+                assert contact["outgoing_interactions"] == outgoing[target][1]
+
+
+def test_unknown_user_has_no_relationships():
+    graph = SocialGraphIndex()
+    assert graph.degree("nobody") == {"out_degree": 0, "in_degree": 0, "mutual": 0}
+    assert graph.relationships("nobody", NOW) == []
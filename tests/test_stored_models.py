@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from app.models.user_behavior import BehaviorInsight
+from app.models.user_profile import UserEmotionPattern
+
+NOW = datetime(2024, 4, 1)
+
+
+def test_emotion_pattern_keeps_mixed_values():
+    stored = {
+        "daily_pattern": {"morning": 0.6, "morning_dominant": "happy"},
+        "weekly_pattern": {"monday": 0.4, "best_day": "tuesday", "worst_day": "monday"},
+        "triggers": {"跑步": 0.5, "跑步_emotion": "happy", "跑步_strength": 1.0},
+        "coping_strategies": {"运动": 0.2},
+        "last_updated": NOW
+    }
+
+    pattern = UserEmotionPattern.model_validate(stored)
+
+    assert pattern.model_dump() == stored
+
+
+def test_behavior_insight_accepts_legacy_count_pairs():
+    stored = {
+        "active_hours": [[9, 12], [21, 7]],
+        "favorite_features": [["chat", 30], ["search", 4]],
+        "behavior_clusters": [],
+        "engagement_score": 0.5,
+        "retention_score": 0.1,
+        "last_updated": NOW
+    }
+
+    insight = BehaviorInsight.model_validate(stored)
+
+    assert insight.active_hours == [9, 21]
+    assert insight.favorite_features == ["chat", "search"]
+    assert BehaviorInsight.model_validate(insight.model_dump()) == insight
@@ -0,0 +1,46 @@
+import random
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.models.user_profile import TriggerIndex, TriggerTermStats, UserEmotionRecord
+from app.services.trigger_index import add_record, build_trigger_index, trigger_stats
+
+START = datetime(2024, 1, 1)
+# 词典外的汉字，组成的未登录串按相邻两字切分
+RARE_CHARS = "甲乙丙丁戊己庚辛壬癸子丑寅卯辰巳午未申酉戌亥"
+
+
+def _record(i, context, emotion="sad"):
+    return UserEmotionRecord(timestamp=START + timedelta(hours=i), emotion_type=emotion,
+                             intensity=0.5, context=context, source="chat")
+
+
+def test_term_stats_count_records_once():
+    index = build_trigger_index([_record(0, "加班加班，压力大"), _record(1, "又加班"), _record(2, "")])
+
+    stats = index.terms["加班"]
+    assert stats.term_count == 3
+    assert stats.records == 2
+    assert trigger_stats(index)["加班"] == 2 / 3
+
+
+def test_vocabulary_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "TRIGGER_INDEX_MAX_TERMS", 20)
+    rng = random.Random(0)
+    index = TriggerIndex()
+    for i in range(500):
+        noise = "".join(rng.choice(RARE_CHARS) for _ in range(12))
+        add_record(index, _record(i, f"加班 {noise}"))
+
+        assert len(index.terms) <= 40
+
+    # 高频词不会被淘汰
+    assert index.terms["加班"].records == 500
+    assert next(iter(trigger_stats(index))) == "加班"
+
+
+def test_legacy_postings_are_converted_to_counts():
+    stats = TriggerTermStats.model_validate({"term_count": 4, "postings": [0, 3, 7], "intensity_sum": 1.5})
+
+    assert stats.records == 3
+    assert "postings" not in stats.model_dump()